@@ -1,11 +1,32 @@
 import os
+import re
+import json
+import time
+import sqlite3
 import logging
 import uuid
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session
+from collections import OrderedDict
+from urllib.parse import urlparse, quote, unquote
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, flash, session, stream_with_context, send_file
 from werkzeug.utils import secure_filename
 import threading
 
+from blobstore import BlobStore
+from distributed import REDIS_SCHEMES, DistributedFrontier, open_lease_store
+from export import EXPORT_FORMATS, stream_bundle
+from frontier import read_errors
+from jobs import JobScheduler, run_task
+from manifest import Manifest
+from metrics import PROCESS_METRICS, render_prometheus
+from postprocess import OptimizedStore, PostProcessor
+from rewrite import ParsePool
 from scraper import WebsiteScraper
+from searchindex import SearchIndex
+from snapshotdiff import diff_manifests, text_diff
+from sidecars import SidecarStore
+from tasks import TaskStore, UNFINISHED_STATUSES
+from urlnorm import DEFAULT_CACHE_SIZE, UrlNormalizer, PathMapper, load_rewrite_rules
+from warc import WARC_FILENAME, WACZ_FILENAME
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,8 +36,201 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "default_secret_key")
 
+# Optional per-file download cap in bytes (unset means no limit)
+MAX_FILE_SIZE = int(os.environ['ARCHIVER_MAX_FILE_SIZE']) if os.environ.get('ARCHIVER_MAX_FILE_SIZE') else None
+
+# BeautifulSoup backend: 'html.parser', 'lxml' or 'auto' (lxml when installed)
+HTML_PARSER = os.environ.get('ARCHIVER_HTML_PARSER', 'html.parser')
+
+# URL canonicalization: a JSON file of {"host", "pattern", "replacement"} path
+# rewrites (default: the built-in Webflow rules), what to do with query strings
+# ('drop', 'keep' or 'sort') and the size of the URL and path caches
+REWRITE_RULES = load_rewrite_rules(os.environ['ARCHIVER_REWRITE_RULES']) if os.environ.get('ARCHIVER_REWRITE_RULES') else None
+QUERY_POLICY = os.environ.get('ARCHIVER_QUERY_POLICY', 'drop')
+URL_CACHE_SIZE = int(os.environ.get('ARCHIVER_URL_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+
+# Expected URLs per crawl: when set, dedup lookups go to the frontier file behind a
+# Bloom filter of that size instead of keeping every URL's fingerprint in memory
+BLOOM_CAPACITY = int(os.environ['ARCHIVER_BLOOM_CAPACITY']) if os.environ.get('ARCHIVER_BLOOM_CAPACITY') else None
+
+# robots.txt handling: 'ignore' it, honor its Crawl-delay ('delay'), or also
+# skip the URLs it disallows ('obey')
+ROBOTS = os.environ.get('ARCHIVER_ROBOTS', 'delay')
+
+# Worker processes shared by every crawl to parse and rewrite pages, so
+# parsing is not bound to one core by the GIL; 0 parses on the crawl threads
+PARSE_WORKERS = int(os.environ.get('ARCHIVER_PARSE_WORKERS', 0))
+parse_pool = ParsePool(PARSE_WORKERS) if PARSE_WORKERS > 0 else None
+
+# Frontier that other processes can help crawl from (`python worker.py --join
+# TASK_ID`): 'sqlite' shares each task's frontier file between processes on
+# this machine, a redis:// URL shares it across machines. WARC/WACZ tasks
+# are always crawled by one process.
+SHARED_FRONTIER = os.environ.get('ARCHIVER_SHARED_FRONTIER')
+
+# Crawl state (task records and frontiers) lives outside static/ so it is never served
+STATE_DIR = os.environ.get('ARCHIVER_STATE_DIR', app.instance_path)
+
+# Persistent record of every task, used to resume crawls after a restart
+task_store = TaskStore(os.path.join(STATE_DIR, 'tasks.sqlite'))
+
+# Files are deduplicated across tasks through a shared content-addressed store
+# unless ARCHIVER_DEDUPLICATE=0
+blob_store = BlobStore(os.path.join(STATE_DIR, 'blobs')) if os.environ.get('ARCHIVER_DEDUPLICATE', '1') != '0' else None
+
+# Gzip and Brotli copies of archived text files, made while crawling and served
+# by /replay to clients that accept them, unless ARCHIVER_SIDECARS=0
+sidecar_store = SidecarStore(os.path.join(STATE_DIR, 'sidecars')) if os.environ.get('ARCHIVER_SIDECARS', '1') != '0' else None
+
+# Full-text index of every archived page, filled while crawling and queried by
+# /search, unless ARCHIVER_SEARCH=0 or this SQLite build lacks FTS5
+search_index = None
+if os.environ.get('ARCHIVER_SEARCH', '1') != '0':
+    try:
+        search_index = SearchIndex(os.path.join(STATE_DIR, 'search.sqlite'))
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Search disabled: {e}")
+
+# Minify HTML/CSS/JS and losslessly recompress images of finished 'files'
+# archives in ARCHIVER_OPTIMIZE_WORKERS processes (0, the default, turns this
+# off). Results are cached by content hash in STATE_DIR/optimized for all tasks.
+OPTIMIZE_WORKERS = int(os.environ.get('ARCHIVER_OPTIMIZE_WORKERS', 0))
+postprocessor = (PostProcessor(OptimizedStore(os.path.join(STATE_DIR, 'optimized')), OPTIMIZE_WORKERS)
+                 if OPTIMIZE_WORKERS > 0 else None)
+
+# Manifests of replayed archives kept open between requests, and the URL
+# normalization the crawler stored their URLs with
+REPLAY_MANIFESTS = 64
+_replay_manifests = OrderedDict()
+_replay_lock = threading.Lock()
+replay_urls = UrlNormalizer(REWRITE_RULES, QUERY_POLICY, URL_CACHE_SIZE)
+replay_paths = PathMapper('', URL_CACHE_SIZE)
+
+# Crawls run on a bounded pool of ARCHIVER_WORKERS threads, or in a separate
+# `python worker.py` process when ARCHIVER_EXTERNAL_WORKER=1
+WORKERS = int(os.environ.get('ARCHIVER_WORKERS', 2))
+EXTERNAL_WORKER = os.environ.get('ARCHIVER_EXTERNAL_WORKER') == '1'
+scheduler = None if EXTERNAL_WORKER else JobScheduler(WORKERS)
+
+# Keep each exported ZIP/tar.gz once built, so later downloads are served
+# from disk with Range support; ARCHIVER_EXPORT_CACHE=0 streams every download
+# instead, without Range (interrupted downloads cannot resume)
+EXPORT_CACHE = os.environ.get('ARCHIVER_EXPORT_CACHE', '1') == '1'
+
+# How often /events checks a task for changes, how many errors one event carries,
+# and how long an idle stream waits before sending a keep-alive comment
+EVENT_INTERVAL = float(os.environ.get('ARCHIVER_EVENT_INTERVAL', 0.5))
+EVENT_ERROR_BATCH = 100
+EVENT_KEEPALIVE = 15
+
 # Dictionary to store active scraping tasks
 scraping_tasks = {}
+_resume_lock = threading.Lock()
+_resumed = False
+
+def manifest_path(task_id):
+    return os.path.join(STATE_DIR, 'manifests', f'{task_id}.sqlite')
+
+def frontier_path(task_id):
+    return os.path.join(STATE_DIR, 'frontiers', f'{task_id}.sqlite')
+
+def shared_frontier_spec(task_id, options):
+    """Lease store of a task crawled through a shared frontier, or None"""
+    if SHARED_FRONTIER and options.get('archive_format', 'files') == 'files':
+        return frontier_path(task_id) if SHARED_FRONTIER == 'sqlite' else SHARED_FRONTIER
+    return None
+
+def create_scraper(task_id, url, options, join=False):
+    """Build the scraper for a task; its frontier file lets a restarted task pick up where it stopped.
+    
+    join builds one more worker for a task already running, which needs a shared frontier.
+    """
+    base_dir = os.path.join('static', 'downloads', task_id)
+    previous_task_id = options.get('previous_task_id')
+    frontier = None
+    store_spec = shared_frontier_spec(task_id, options)
+    if store_spec is not None:
+        frontier = DistributedFrontier(open_lease_store(store_spec, task_id))
+    elif join:
+        raise ValueError(f"Task {task_id} does not use a shared frontier")
+    return WebsiteScraper(url, base_dir, options['max_depth'], options['download_assets'],
+                          concurrency=options.get('concurrency', 1),
+                          max_file_size=MAX_FILE_SIZE, parser=HTML_PARSER,
+                          state_path=frontier_path(task_id),
+                          manifest_path=manifest_path(task_id),
+                          previous_manifest_path=manifest_path(previous_task_id) if previous_task_id else None,
+                          blob_store=blob_store,
+                          archive_format=options.get('archive_format', 'files'),
+                          rewrite_rules=REWRITE_RULES, query_policy=QUERY_POLICY,
+                          url_cache_size=URL_CACHE_SIZE, bloom_capacity=BLOOM_CAPACITY,
+                          robots=ROBOTS, use_sitemaps=options.get('use_sitemaps', False),
+                          parse_pool=parse_pool, frontier=frontier, sidecars=sidecar_store,
+                          search_index=search_index.writer(task_id) if search_index is not None else None,
+                          postprocessor=postprocessor)
+
+def enqueue_task(task_id, url, options, priority=0):
+    """Queue a task on the scheduler; its scraper is only built once a worker picks it up"""
+    # Store task info
+    task = scraping_tasks[task_id] = {
+        'scraper': None,
+        'url': url,
+        'options': options,
+        'status': 'queued',
+        'stats': {},
+    }
+    
+    def build():
+        task['scraper'] = create_scraper(task_id, url, options)
+        return task['scraper']
+    
+    def run():
+        run_task(task_id, build, set_status, set_stats)
+    
+    def cancel():
+        if task['scraper'] is not None:
+            task['scraper'].cancel()
+    
+    scheduler.submit(task_id, run, cancel=cancel, priority=priority)
+
+def set_status(task_id, status):
+    scraping_tasks[task_id]['status'] = status
+    task_store.set_status(task_id, status)
+
+def set_stats(task_id, stats):
+    scraping_tasks[task_id]['stats'] = stats
+    task_store.set_stats(task_id, stats)
+
+def get_task(task_id):
+    """Look up a task: live ones in memory, others (finished before a restart,
+    or run by an external worker) from the task store"""
+    task = scraping_tasks.get(task_id)
+    if task is not None:
+        return task
+    record = task_store.get(task_id)
+    if record is None:
+        return None
+    return {
+        'scraper': None,
+        'url': record['url'],
+        'options': record['options'],
+        'status': record['status'],
+        'stats': record['stats'] or {},
+    }
+
+@app.before_request
+def resume_unfinished_tasks():
+    """Requeue crawls that were interrupted, once, in the process that serves requests.
+    
+    An external worker resumes its own tasks instead.
+    """
+    global _resumed
+    with _resume_lock:
+        if _resumed or EXTERNAL_WORKER:
+            return
+        _resumed = True
+        for record in task_store.unfinished():
+            logger.info(f"Resuming task {record['task_id']} for {record['url']}")
+            enqueue_task(record['task_id'], record['url'], record['options'], record['priority'])
 
 @app.route('/')
 def index():
@@ -27,74 +241,371 @@ def scrape():
     url = request.form.get('url')
     max_depth = int(request.form.get('max_depth', 1))
     download_assets = request.form.get('download_assets') == 'on'
+    concurrency = int(request.form.get('concurrency', 1))
+    incremental = request.form.get('incremental') == 'on'
+    use_sitemaps = request.form.get('use_sitemaps') == 'on'
+    archive_format = request.form.get('archive_format', 'files')
+    priority = int(request.form.get('priority', 0))
     
     if not url:
         flash('Please enter a URL to scrape', 'danger')
         return redirect(url_for('index'))
     
+    if archive_format not in ('files', 'warc', 'wacz'):
+        flash('Unknown archive format', 'danger')
+        return redirect(url_for('index'))
+    
     # Create a unique task ID for this scraping job
     task_id = str(uuid.uuid4())
     
-    # Create base directory for this scrape
-    base_dir = os.path.join('static', 'downloads', task_id)
-    os.makedirs(base_dir, exist_ok=True)
-    
-    # Initialize the scraper
-    scraper = WebsiteScraper(url, base_dir, max_depth, download_assets)
-    
-    # Store task info
-    scraping_tasks[task_id] = {
-        'scraper': scraper,
-        'url': url,
-        'status': 'starting',
-        'progress': 0,
-        'files_downloaded': 0,
-        'total_size': 0,
-        'errors': []
+    # Record the task so it can be resumed after a restart, then queue it
+    options = {
+        'max_depth': max_depth,
+        'download_assets': download_assets,
+        'concurrency': concurrency,
+        'archive_format': archive_format,
+        'use_sitemaps': use_sitemaps,
     }
-    
-    # Start scraping in a background thread
-    def run_scraper():
-        try:
-            scraping_tasks[task_id]['status'] = 'running'
-            scraper.start_scraping()
-            scraping_tasks[task_id]['status'] = 'completed'
-        except Exception as e:
-            logger.error(f"Error in scraping task: {e}")
-            scraping_tasks[task_id]['status'] = 'failed'
-            scraping_tasks[task_id]['errors'].append(str(e))
-    
-    thread = threading.Thread(target=run_scraper)
-    thread.daemon = True
-    thread.start()
+    if incremental:
+        # Re-archive against the last completed snapshot of the same URL
+        previous = task_store.latest_completed(url)
+        if previous is not None:
+            options['previous_task_id'] = previous['task_id']
+    task_store.add(task_id, url, options, priority=priority)
+    if scheduler is not None:
+        enqueue_task(task_id, url, options, priority)
     
     return redirect(url_for('results', task_id=task_id))
 
 @app.route('/results/<task_id>')
 def results(task_id):
-    if task_id not in scraping_tasks:
+    task_info = get_task(task_id)
+    if task_info is None:
         flash('Task not found', 'danger')
         return redirect(url_for('index'))
     
-    task_info = scraping_tasks[task_id]
     download_path = os.path.join('static', 'downloads', task_id)
-    return render_template('results.html', task_id=task_id, task_info=task_info, download_path=download_path)
+    record = task_store.get(task_id)
+    archive_format = record['options'].get('archive_format', 'files') if record else 'files'
+    if archive_format == 'warc':
+        download_path = os.path.join(download_path, WARC_FILENAME)
+    elif archive_format == 'wacz':
+        download_path = os.path.join(download_path, WACZ_FILENAME)
+    if archive_format == 'files' and record:
+        browse_url = url_for('replay', task_id=task_id, url=record['url'])
+    else:
+        browse_url = '/' + download_path
+    return render_template('results.html', task_id=task_id, task_info=task_info, browse_url=browse_url)
 
 @app.route('/status/<task_id>')
 def status(task_id):
-    if task_id not in scraping_tasks:
+    task = get_task(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    return jsonify(task_snapshot(task_id, task))
+
+@app.route('/errors/<task_id>')
+def errors(task_id):
+    """Page through a task's errors: pass the returned next_cursor back as cursor"""
+    task = get_task(task_id)
+    if task is None:
         return jsonify({'error': 'Task not found'}), 404
     
-    task = scraping_tasks[task_id]
-    scraper = task['scraper']
+    cursor = max(0, request.args.get('cursor', 0, type=int))
+    limit = min(max(1, request.args.get('limit', 100, type=int)), 1000)
+    page = task_errors(task_id, task, cursor, limit)
+    return jsonify({'errors': page, 'next_cursor': cursor + len(page)})
+
+@app.route('/events/<task_id>')
+def events(task_id):
+    """Server-Sent Events stream of a task's progress.
+    
+    A 'progress' event (the /status payload) is sent whenever it changes and
+    an 'errors' event carries only the errors added since the last one; its
+    id is the error cursor, so a reconnecting EventSource resumes from there.
+    The stream ends once the task is finished and all errors have been sent.
+    """
+    if get_task(task_id) is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    cursor = request.headers.get('Last-Event-ID', type=int) or request.args.get('cursor', 0, type=int)
+    
+    def stream():
+        nonlocal cursor
+        last_snapshot = None
+        last_sent = time.monotonic()
+        while True:
+            task = get_task(task_id)
+            snapshot = task_snapshot(task_id, task)
+            if snapshot != last_snapshot:
+                yield sse_event('progress', snapshot, cursor)
+                last_snapshot = snapshot
+                last_sent = time.monotonic()
+            
+            new_errors = task_errors(task_id, task, cursor, EVENT_ERROR_BATCH)
+            if new_errors:
+                cursor += len(new_errors)
+                yield sse_event('errors', new_errors, cursor)
+                last_sent = time.monotonic()
+                if len(new_errors) == EVENT_ERROR_BATCH:
+                    # More are waiting: send them without sleeping
+                    continue
+            
+            if snapshot['status'] not in UNFINISHED_STATUSES:
+                return
+            if time.monotonic() - last_sent > EVENT_KEEPALIVE:
+                # Lets the server notice clients that went away
+                yield ': keep-alive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(EVENT_INTERVAL)
     
-    return jsonify({
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def sse_event(event, data, event_id):
+    return f"event: {event}\nid: {event_id}\ndata: {json.dumps(data)}\n\n"
+
+def task_snapshot(task_id, task):
+    """Counters and state of a task; errors are only counted, see task_errors"""
+    stats = task['scraper'].stats() if task['scraper'] is not None else task['stats']
+    return {
         'status': task['status'],
-        'progress': scraper.progress,
-        'files_downloaded': scraper.files_downloaded,
-        'total_size': scraper.total_size,
-        'errors': scraper.errors
-    })
+        'queue_position': queue_position(task_id, task['status']),
+        'progress': stats.get('progress', 0),
+        'files_downloaded': stats.get('files_downloaded', 0),
+        'total_size': stats.get('total_size', 0),
+        'physical_size': stats.get('physical_size', 0),
+        'connections': stats.get('connections'),
+        'changes': stats.get('changes'),
+        'optimization': stats.get('optimization'),
+        'error': stats.get('error'),
+        'error_count': stats.get('error_count', 0),
+        'metrics': stats.get('metrics'),
+        'caches': stats.get('caches'),
+        'frontier': stats.get('frontier'),
+        'assets_queued': stats.get('assets_queued', 0),
+        'rate_limits': stats.get('rate_limits'),
+        'sitemap_urls': stats.get('sitemap_urls', 0)
+    }
+
+def task_errors(task_id, task, cursor, limit):
+    """Up to limit of a task's errors, starting at index cursor.
+    
+    Shared tasks read them from the lease store, which holds the errors of
+    every worker of the crawl and outlives this process's scraper.
+    """
+    start_error = task['stats'].get('error')
+    if start_error is not None:
+        # The scraper could not be built, so this is the only error
+        return [start_error][cursor:cursor + limit]
+    store_spec = shared_frontier_spec(task_id, task['options'])
+    if store_spec is not None:
+        if not store_spec.startswith(REDIS_SCHEMES):
+            # Read-only, and without creating the file of a task that never started
+            return read_errors(store_spec, cursor, limit)
+        store = open_lease_store(store_spec, task_id)
+        try:
+            return store.errors(cursor, limit)
+        finally:
+            store.close()
+    if task['scraper'] is not None:
+        # The list is only ever appended to, so slicing it is safe while the crawl runs
+        return task['scraper'].errors[cursor:cursor + limit]
+    return read_errors(frontier_path(task_id), cursor, limit)
+
+def queue_position(task_id, status):
+    if status != 'queued':
+        return None
+    if scheduler is not None:
+        return scheduler.position(task_id)
+    return task_store.queue_position(task_id)
+
+@app.route('/cancel/<task_id>', methods=['POST'])
+def cancel(task_id):
+    task = get_task(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    if scheduler is not None:
+        # Queued tasks are dropped at once; running ones stop after their in-flight pages
+        if scheduler.cancel(task_id) == 'queued':
+            set_status(task_id, 'cancelled')
+        status = task['status']
+    else:
+        status = task_store.request_cancel(task_id)
+    
+    return jsonify({'status': status})
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for the crawls run by this process"""
+    running = {task_id: task['scraper'] for task_id, task in list(scraping_tasks.items())
+               if task['scraper'] is not None and task['status'] == 'running'}
+    jobs = scheduler.stats() if scheduler is not None else None
+    return Response(render_prometheus(PROCESS_METRICS, running, jobs),
+                    mimetype='text/plain; version=0.0.4')
+
+@app.route('/download/<task_id>/<fmt>')
+def download(task_id, fmt):
+    """Download a finished archive as one ZIP or tar.gz, streamed as it is built.
+    
+    The first download also saves the bundle to the export cache, which
+    serves later downloads with Range support. Until then Range is ignored:
+    the whole bundle is streamed with 200 and Accept-Ranges: none, as a
+    rebuilt bundle need not have the same bytes. Without the cache there
+    is no Range support.
+    """
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unknown export format'}), 404
+    task = get_task(task_id)
+    directory = os.path.join('static', 'downloads', task_id)
+    if task is None or not os.path.isdir(directory):
+        return jsonify({'error': 'Task not found'}), 404
+    if task['status'] in UNFINISHED_STATUSES:
+        return jsonify({'error': 'Task is still running'}), 409
+    
+    filename = f'{task_id}.{fmt}'
+    cache_path = os.path.join(STATE_DIR, 'exports', filename) if EXPORT_CACHE else None
+    if cache_path and os.path.exists(cache_path):
+        return send_file(os.path.abspath(cache_path), mimetype=EXPORT_FORMATS[fmt], as_attachment=True,
+                         download_name=filename, conditional=True)
+    
+    return Response(stream_bundle(directory, fmt, task_id, cache_path), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"', 'Accept-Ranges': 'none'})
+
+@app.route('/diff/<old_task_id>/<new_task_id>')
+def diff(old_task_id, new_task_id):
+    """URLs added, removed and changed between two snapshots, or with ?url= the diff of one page"""
+    paths = [manifest_path(old_task_id), manifest_path(new_task_id)]
+    if not all(os.path.exists(path) for path in paths):
+        return jsonify({'error': 'Snapshot not found'}), 404
+    
+    old, new = Manifest(paths[0]), Manifest(paths[1])
+    try:
+        url = request.args.get('url')
+        if url:
+            page_diff = text_diff(old, new, url, old_task_id, new_task_id)
+            if page_diff is None:
+                return jsonify({'error': 'Not a saved HTML page in both snapshots'}), 404
+            return jsonify({'url': url, 'diff': page_diff})
+        
+        start = time.perf_counter()
+        report = diff_manifests(old, new)
+        report['took_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return jsonify(report)
+    finally:
+        old.close()
+        new.close()
+
+@app.route('/search')
+def search():
+    """Ranked full-text search of archived pages, in the tasks given as task= or all of them"""
+    if search_index is None:
+        return jsonify({'error': 'Search is disabled'}), 503
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing query'}), 400
+    task_ids = [task_id for value in request.args.getlist('task') for task_id in value.split(',') if task_id]
+    limit = min(max(1, request.args.get('limit', 20, type=int)), 100)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    
+    start = time.perf_counter()
+    results = search_index.search(query, task_ids, limit, offset)
+    took = time.perf_counter() - start
+    
+    # Pages of browsable archives link to their replay
+    formats = {}
+    for result in results:
+        task_id = result['task_id']
+        if task_id not in formats:
+            record = task_store.get(task_id)
+            formats[task_id] = record['options'].get('archive_format', 'files') if record else None
+        if formats[task_id] == 'files':
+            result['replay_url'] = url_for('replay', task_id=task_id, url=result['url'])
+    return jsonify({'query': query, 'results': results, 'took_ms': round(took * 1000, 2)})
+
+def replay_manifest(task_id):
+    """The manifest of a files-format task's archive, opened once for many requests; None if there is none"""
+    with _replay_lock:
+        manifest = _replay_manifests.get(task_id)
+        if manifest is not None:
+            _replay_manifests.move_to_end(task_id)
+            return manifest
+    
+    record = task_store.get(task_id)
+    if record is None or record['options'].get('archive_format', 'files') != 'files':
+        return None
+    path = manifest_path(task_id)
+    if not os.path.exists(path):
+        return None
+    manifest = Manifest(path)
+    with _replay_lock:
+        manifest = _replay_manifests.setdefault(task_id, manifest)
+        if len(_replay_manifests) > REPLAY_MANIFESTS:
+            # Its connection closes once no request is using it
+            _replay_manifests.popitem(last=False)
+    return manifest
+
+@app.route('/replay/<task_id>/<path:url>')
+def replay(task_id, url):
+    """Serve an archived URL, looked up in the archive's manifest.
+    
+    The file's SHA-256 is its strong ETag, so revalidations get a 304, and
+    clients that accept it get a Brotli or gzip sidecar made at crawl time.
+    """
+    manifest = replay_manifest(task_id)
+    if manifest is None:
+        return jsonify({'error': 'Archive not found'}), 404
+    
+    # The path arrives decoded, and with the slashes after the scheme merged
+    url = quote(re.sub(r'^(https?):/+', r'\1://', url), safe="/:@!$&'()*+,;=~%")
+    if request.query_string:
+        url += '?' + request.query_string.decode('utf-8', 'replace')
+    clean_url = replay_urls.clean(url)
+    netloc, site_path = replay_paths.locate(clean_url)
+    local_url = replay_urls.clean(f"{urlparse(clean_url).scheme}://{netloc}/{site_path}")
+    
+    # Other URLs of the same file, such as /about for about/index.html, share its entry
+    entry = manifest.get(clean_url) or manifest.get_by_path(unquote(site_path))
+    if entry is None:
+        return jsonify({'error': 'URL not archived'}), 404
+    
+    content_type = entry['content_type'] or 'application/octet-stream'
+    if content_type.split(';')[0].strip().lower() == 'text/html':
+        if os.path.dirname(urlparse(clean_url).path.lstrip('/')) != os.path.dirname(site_path):
+            # A page's relative links only resolve from its own directory
+            return redirect(url_for('replay', task_id=task_id, url=local_url))
+        # Pages are saved as UTF-8 once their links are rewritten
+        content_type = 'text/html; charset=utf-8'
+    
+    file_path = manifest.file_path(entry)
+    if not os.path.isfile(file_path):
+        return jsonify({'error': 'Archived file is missing'}), 404
+    
+    # Post-processing may have replaced the file with a smaller one
+    digest = entry['stored_sha256'] or entry['sha256']
+    encoding = None
+    if sidecar_store is not None and digest:
+        for candidate in sidecar_store.encodings:
+            sidecar = sidecar_store.find(digest, candidate) if request.accept_encodings[candidate] else None
+            if sidecar is not None:
+                file_path, encoding = sidecar, candidate
+                break
+    
+    response = send_file(os.path.abspath(file_path), mimetype=content_type, conditional=True,
+                         etag=f'{digest}-{encoding}' if encoding else digest)
+    # send_file appends its own charset to text types
+    response.headers['Content-Type'] = content_type
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    # Revalidate every time; an unchanged file costs a 304
+    response.cache_control.no_cache = True
+    if entry['status'] and entry['status'] != 200 and response.status_code == 200:
+        # Placeholder pages stand in for error responses
+        response.status_code = entry['status']
+    return response
 
 @app.errorhandler(404)
 def page_not_found(e):
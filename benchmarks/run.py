@@ -0,0 +1,206 @@
+"""Crawl synthetic sites end to end with WebsiteScraper and track the results per commit.
+
+    python benchmarks/run.py small medium --repeat 3
+    python benchmarks/run.py --all --record      # append the results to benchmarks/history.jsonl
+    python benchmarks/run.py medium --compare    # exit 1 if slower than the last recorded commit
+
+Each crawl runs in a fresh process, so peak RSS and CPU time are the
+crawler's alone; the site is served from this process.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from sitegen import SiteServer  # noqa: E402
+
+PRESETS_PATH = os.path.join(BENCHMARK_DIR, 'presets.json')
+HISTORY_PATH = os.path.join(BENCHMARK_DIR, 'history.jsonl')
+
+# The synthetic server is local, so the politeness delay would only measure itself
+DEFAULT_CRAWL = {'max_depth': 3, 'download_assets': True, 'delay': 0}
+
+# Metric -> True when higher is better
+TRACKED = {
+    'pages_per_second': True,
+    'mb_per_second': True,
+    'cpu_seconds': False,
+    'peak_rss_mb': False,
+}
+
+def _crawl(url, output_dir, options, results):
+    """Child process: run one crawl and report what it cost"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    from scraper import WebsiteScraper
+
+    options = dict(options)
+    max_depth = options.pop('max_depth')
+    download_assets = options.pop('download_assets')
+    scraper = WebsiteScraper(url, output_dir, max_depth, download_assets, **options)
+
+    start = time.perf_counter()
+    scraper.start_scraping()
+    seconds = time.perf_counter() - start
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    summary = scraper.metrics.summary()
+    results.put({
+        'seconds': round(seconds, 3),
+        'pages': summary['pages'],
+        'assets': summary['assets'],
+        'files': scraper.files_downloaded,
+        'errors': len(scraper.errors),
+        'mb_downloaded': round(summary['bytes'] / 1e6, 3),
+        'pages_per_second': round(summary['pages'] / seconds, 2),
+        'mb_per_second': round(summary['bytes'] / 1e6 / seconds, 3),
+        'cpu_seconds': round(usage.ru_utime + usage.ru_stime, 3),
+        # ru_maxrss is in kilobytes on Linux, bytes on macOS
+        'peak_rss_mb': round(usage.ru_maxrss / (1e6 if sys.platform == 'darwin' else 1e3), 1),
+        'bound_by': summary['bound_by'],
+        'time_by_resource': summary['time_by_resource'],
+    })
+
+def run_preset(name, preset, repeat=1, keep=False):
+    """Crawl a preset's site repeat times and return the median of each measurement"""
+    options = {**DEFAULT_CRAWL, **preset.get('crawl', {})}
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    with SiteServer(preset.get('site')) as server:
+        for _ in range(repeat):
+            output_dir = tempfile.mkdtemp(prefix=f'bench-{name}-')
+            try:
+                results = context.Queue()
+                process = context.Process(target=_crawl, args=(server.url, output_dir, options, results))
+                process.start()
+                runs.append(results.get())
+                process.join()
+            finally:
+                if not keep:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+    summary = {}
+    for key, value in runs[0].items():
+        if isinstance(value, (int, float)):
+            summary[key] = round(statistics.median(run[key] for run in runs), 3)
+        else:
+            summary[key] = value
+    summary['runs'] = len(runs)
+    return summary
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+def load_history():
+    if not os.path.exists(HISTORY_PATH):
+        return []
+    with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def baseline_for(history, preset, commit):
+    """The latest recorded result for preset from a commit other than commit"""
+    for record in reversed(history):
+        if record['preset'] == preset and record['commit'] != commit:
+            return record
+    return None
+
+def compare(result, baseline, threshold):
+    """Relative change of each tracked metric and the names of those that regressed"""
+    changes, regressions = {}, []
+    for metric, higher_is_better in TRACKED.items():
+        old, new = baseline['results'].get(metric), result.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        changes[metric] = change
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append(metric)
+    return changes, regressions
+
+def print_table(rows):
+    columns = ('preset', 'pages', 'files', 'errors', 'seconds', 'pages_per_second', 'mb_per_second',
+               'cpu_seconds', 'peak_rss_mb', 'bound_by')
+    table = [columns] + [tuple(str(row.get(column, '')) for column in columns) for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    for line in table:
+        print('  '.join(value.rjust(width) for value, width in zip(line, widths)))
+
+def main():
+    with open(PRESETS_PATH, 'r', encoding='utf-8') as f:
+        presets = json.load(f)
+
+    parser = argparse.ArgumentParser(description='Benchmark the crawler against local synthetic sites')
+    parser.add_argument('presets', nargs='*', help=f"presets to run: {', '.join(presets)}")
+    parser.add_argument('--all', action='store_true', help='run every preset')
+    parser.add_argument('--repeat', type=int, default=1, help='crawls per preset; the median is reported')
+    parser.add_argument('--crawl', help='JSON object of WebsiteScraper options applied to every preset')
+    parser.add_argument('--record', action='store_true', help=f'append results to {os.path.relpath(HISTORY_PATH)}')
+    parser.add_argument('--compare', action='store_true', help='compare with the last recorded other commit')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change counted as a regression')
+    parser.add_argument('--keep', action='store_true', help='keep the crawled output directories')
+    args = parser.parse_args()
+
+    names = list(presets) if args.all else args.presets
+    unknown = [name for name in names if name not in presets]
+    if not names or unknown:
+        parser.error(f"choose presets from: {', '.join(presets)}" + (f" (unknown: {', '.join(unknown)})" if unknown else ''))
+
+    commit, dirty = git_commit()
+    history = load_history()
+    rows, failed = [], False
+    for name in names:
+        preset = presets[name]
+        if args.crawl:
+            preset = {**preset, 'crawl': {**preset.get('crawl', {}), **json.loads(args.crawl)}}
+        result = run_preset(name, preset, args.repeat, args.keep)
+        rows.append({'preset': name, **result})
+
+        if args.compare:
+            baseline = baseline_for(history, name, commit)
+            if baseline is None:
+                print(f'{name}: no recorded result from another commit to compare with')
+            else:
+                changes, regressions = compare(result, baseline, args.threshold)
+                summary = ', '.join(f'{metric} {change:+.1%}' for metric, change in changes.items())
+                print(f"{name} vs {baseline['commit']}: {summary}")
+                if regressions:
+                    print(f"{name}: regression in {', '.join(regressions)}")
+                    failed = True
+
+        if args.record:
+            record = {
+                'preset': name,
+                'commit': commit,
+                'dirty': dirty,
+                'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'config': preset,
+                'results': result,
+            }
+            with open(HISTORY_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+
+    print_table(rows)
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""Synthetic website served from memory for benchmarking the crawler offline.
+
+Every page, link and asset is derived from the configuration and its seed,
+so the same configuration always produces the same site.
+"""
+import gzip
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_CONFIG = {
+    'pages': 200,            # number of HTML pages
+    'fanout': 5,             # tree links per page, so every page is reachable
+    'cross_links': 5,        # extra links per page to random other pages
+    'page_bytes': 8000,      # approximate HTML size
+    'assets': {'css': 2, 'js': 2, 'img': 4},  # assets referenced by each page
+    'asset_pool': 50,        # distinct assets of each type shared by all pages
+    'asset_bytes': {'css': 4000, 'js': 8000, 'img': 20000, 'font': 30000},
+    'css_urls': 2,           # url() references (images, fonts) inside each stylesheet
+    'latency_ms': 0,         # added before every response
+    'jitter_ms': 0,          # random extra latency, up to this much
+    'error_rate': 0.0,       # share of URLs answered with errors
+    'max_rps': 0,            # answer 429 with Retry-After above this many requests per second
+    'crawl_delay': 0,        # Crawl-delay announced in robots.txt
+    'sitemap': False,        # list every page in gzipped sitemaps behind a sitemap index
+    'sitemap_size': 100,     # URLs per sitemap file
+    'seed': 1,
+}
+
+CONTENT_TYPES = {
+    'css': 'text/css',
+    'js': 'application/javascript',
+    'img': 'image/png',
+    'font': 'font/woff2',
+}
+
+EXTENSIONS = {'css': 'css', 'js': 'js', 'img': 'png', 'font': 'woff2'}
+
+def merged_config(overrides=None):
+    config = dict(DEFAULT_CONFIG)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key] = {**config[key], **value}
+        else:
+            config[key] = value
+    return config
+
+class SyntheticSite:
+    """Deterministic pages and assets for a configuration"""
+    def __init__(self, config=None):
+        self.config = merged_config(config)
+        self._body_cache = {}
+
+    def _rng(self, *key):
+        digest = hashlib.sha256(repr((self.config['seed'],) + key).encode()).digest()
+        return random.Random(digest)
+
+    def page_path(self, index):
+        return '/' if index == 0 else f'/p/{index}/'
+
+    def asset_path(self, kind, index):
+        return f'/assets/{kind}/{index}.{EXTENSIONS[kind]}'
+
+    def is_error(self, path):
+        """Whether path is one of the URLs answered with an error, and which status"""
+        if not self.config['error_rate'] or path == '/':
+            return None
+        rng = self._rng('error', path)
+        if rng.random() < self.config['error_rate']:
+            return rng.choice((404, 404, 404, 500))
+        return None
+
+    def page(self, index):
+        config = self.config
+        rng = self._rng('page', index)
+        pages = config['pages']
+        children = [index * config['fanout'] + i for i in range(1, config['fanout'] + 1)]
+        links = [i for i in children if i < pages]
+        links += [rng.randrange(pages) for _ in range(config['cross_links'])]
+
+        head = []
+        body = [f'<h1>Page {index}</h1>', '<nav>']
+        for kind, count in config['assets'].items():
+            for _ in range(count):
+                path = self.asset_path(kind, rng.randrange(config['asset_pool']))
+                if kind == 'css':
+                    head.append(f'<link rel="stylesheet" href="{path}">')
+                elif kind == 'js':
+                    head.append(f'<script src="{path}"></script>')
+                else:
+                    body.append(f'<img src="{path}" alt="">')
+        body += [f'<a href="{self.page_path(i)}">Page {i}</a>' for i in links]
+        body.append('</nav>')
+
+        html = (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Page {index}</title>'
+                f'{"".join(head)}</head><body>{"".join(body)}')
+        filler = config['page_bytes'] - len(html)
+        paragraph = '<p>' + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4 + '</p>'
+        if filler > 0:
+            html += paragraph * (filler // len(paragraph) + 1)
+        return (html + '</body></html>').encode('utf-8')
+
+    def asset(self, kind, index):
+        config = self.config
+        rng = self._rng('asset', kind, index)
+        size = config['asset_bytes'][kind]
+        if kind == 'css':
+            rules = [f'.c{index} {{ color: #{rng.randrange(0xffffff):06x}; }}']
+            for _ in range(config['css_urls']):
+                target = rng.choice(('img', 'font'))
+                rules.append(f'.u{rng.randrange(1000)} {{ background: url("{self.asset_path(target, rng.randrange(config["asset_pool"]))}"); }}')
+            text = '\n'.join(rules) + '\n'
+            return (text + '/* padding */ ' * max(0, (size - len(text)) // 14)).encode('utf-8')
+        if kind == 'js':
+            text = f'var asset{index} = {rng.randrange(10 ** 6)};\n'
+            return (text + '// padding\n' * max(0, (size - len(text)) // 11)).encode('utf-8')
+        return rng.randbytes(size)
+
+    def robots_txt(self, base):
+        lines = ['User-agent: *', 'Disallow:']
+        if self.config['crawl_delay']:
+            lines.append(f"Crawl-delay: {self.config['crawl_delay']}")
+        if self.config['sitemap']:
+            lines.append(f'Sitemap: {base}/sitemap-index.xml')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def page_depth(self, index):
+        depth = 0
+        while index:
+            index = (index - 1) // self.config['fanout']
+            depth += 1
+        return depth
+
+    def sitemap_index(self, base):
+        count = -(-self.config['pages'] // self.config['sitemap_size'])
+        entries = ''.join(f'<sitemap><loc>{base}/sitemap-{i}.xml.gz</loc></sitemap>' for i in range(count))
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                f'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>').encode('utf-8')
+
+    def sitemap(self, base, number):
+        size = self.config['sitemap_size']
+        entries = []
+        for index in range(number * size, min(self.config['pages'], (number + 1) * size)):
+            day = 1 + self._rng('lastmod', index).randrange(28)
+            priority = max(0.1, 1.0 - 0.2 * self.page_depth(index))
+            entries.append(f'<url><loc>{base}{self.page_path(index)}</loc><lastmod>2024-01-{day:02d}</lastmod>'
+                           f'<priority>{priority:.1f}</priority></url>')
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+               f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{"".join(entries)}</urlset>')
+        return gzip.compress(xml.encode('utf-8'), mtime=0)
+
+    def resolve(self, path, base=''):
+        """(status, content type, body) for a request path; base is the site's URL without the slash"""
+        if path == '/robots.txt':
+            return 200, 'text/plain', self.robots_txt(base)
+        if self.config['sitemap'] and path == '/sitemap-index.xml':
+            return 200, 'application/xml', self.sitemap_index(base)
+        if self.config['sitemap'] and path.startswith('/sitemap-') and path.endswith('.xml.gz'):
+            number = path[len('/sitemap-'):-len('.xml.gz')]
+            if number.isdigit():
+                return 200, 'application/gzip', self.sitemap(base, int(number))
+        status = self.is_error(path)
+        if status:
+            return status, 'text/html', f'<html><body>Error {status}</body></html>'.encode('utf-8')
+
+        body = self._body_cache.get(path)
+        if body is None:
+            body = self._build(path)
+            if body is None:
+                return 404, 'text/html', b'<html><body>Not found</body></html>'
+            self._body_cache[path] = body
+        return 200, body[0], body[1]
+
+    def _build(self, path):
+        if path == '/':
+            return 'text/html; charset=utf-8', self.page(0)
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'p' and parts[1].isdigit() and int(parts[1]) < self.config['pages']:
+            return 'text/html; charset=utf-8', self.page(int(parts[1]))
+        if len(parts) == 3 and parts[0] == 'assets' and parts[1] in CONTENT_TYPES:
+            name, _, extension = parts[2].partition('.')
+            if name.isdigit() and int(name) < self.config['asset_pool'] and extension == EXTENSIONS[parts[1]]:
+                return CONTENT_TYPES[parts[1]], self.asset(parts[1], int(name))
+        return None
+
+class RateWindow:
+    """Requests seen in the current second, to answer 429 past max_rps"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._second = 0
+        self._count = 0
+
+    def allow(self, max_rps):
+        with self._lock:
+            second = int(time.monotonic())
+            if second != self._second:
+                self._second, self._count = second, 0
+            self._count += 1
+            return self._count <= max_rps
+
+def make_handler(site):
+    window = RateWindow()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            config = site.config
+            delay = config['latency_ms'] + (random.random() * config['jitter_ms'] if config['jitter_ms'] else 0)
+            if delay:
+                time.sleep(delay / 1000)
+
+            # The crawler asks for directory pages as .../index.html
+            path = self.path.split('?')[0].split('#')[0]
+            if path.endswith('/index.html'):
+                path = path[:-len('index.html')]
+            if config['max_rps'] and not window.allow(config['max_rps']):
+                status, content_type, body = 429, 'text/plain', b'Too many requests'
+            else:
+                status, content_type, body = site.resolve(path, f"http://{self.headers.get('Host')}")
+
+            self.send_response(status)
+            if status == 429:
+                self.send_header('Retry-After', '1')
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+class SiteServer:
+    """Serve a synthetic site on 127.0.0.1 from a background thread"""
+    def __init__(self, config=None, port=0):
+        self.site = SyntheticSite(config)
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), make_handler(self.site))
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='sitegen', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+if __name__ == '__main__':
+    import json
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve a synthetic site for manual crawling')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--config', help='JSON object overriding DEFAULT_CONFIG')
+    args = parser.parse_args()
+
+    server = SiteServer(json.loads(args.config) if args.config else None, args.port)
+    print(f'Serving synthetic site at {server.url}')
+    server.httpd.serve_forever()
@@ -0,0 +1,67 @@
+import os
+import uuid
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BlobStore:
+    """Content-addressed file store shared by all archives.
+
+    Every unique file body is kept once, as blobs/<first two hex digits>/<sha256>,
+    and archive files are hardlinks to it. Blobs are made read-only because
+    any change to one would show up in every archive that links to it.
+    Where hardlinks are not possible (the archive is on another
+    filesystem) files are copied instead.
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def contains(self, digest):
+        return os.path.exists(self.blob_path(digest))
+
+    def store(self, path, digest):
+        """Deduplicate the finished file at path against the store.
+
+        A new body is linked into the store; a known one replaces the file at
+        path with a link to the existing blob. Returns the number of bytes
+        the store grew by.
+        """
+        blob = self.blob_path(digest)
+        if os.path.exists(blob):
+            if not os.path.samefile(blob, path):
+                self.materialize(digest, path)
+            return 0
+
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+        except FileExistsError:
+            # Another task stored the same content first
+            self.materialize(digest, path)
+            return 0
+        except OSError:
+            # Different filesystem: keep a copy in the store, the archive keeps its own file
+            temp_path = f"{blob}.{uuid.uuid4().hex}.tmp"
+            shutil.copyfile(path, temp_path)
+            try:
+                os.link(temp_path, blob)
+            except FileExistsError:
+                return 0
+            finally:
+                os.remove(temp_path)
+        os.chmod(blob, 0o444)
+        return os.path.getsize(blob)
+
+    def materialize(self, digest, dest_path):
+        """Atomically put the blob for digest at dest_path, by hardlink where possible"""
+        temp_path = os.path.join(os.path.dirname(dest_path), f".{uuid.uuid4().hex}.link")
+        try:
+            os.link(self.blob_path(digest), temp_path)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), temp_path)
+        os.replace(temp_path, dest_path)
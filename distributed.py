@@ -0,0 +1,663 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from frontier import Frontier, DEFAULT_PRIORITY
+
+try:
+    import redis
+    HAVE_REDIS = True
+except ImportError:
+    HAVE_REDIS = False
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker keeps leased URLs without renewing them; the heartbeat
+# renews every third of that, so only a stopped worker loses its leases
+LEASE_TTL = 60.0
+# URLs a worker leases at once, and so at most has in flight
+LEASE_BATCH = 32
+# Discovered links sent to the store at once, when no page completes first
+PUSH_BATCH = 500
+# Seconds between checks for work while other workers finish a depth level
+POLL_INTERVAL = 0.5
+# Seconds the store's queued/leased/done counts are cached for
+COUNTS_INTERVAL = 1.0
+
+# States of a URL in a lease store
+QUEUED, LEASED, DONE = 0, 1, 2
+
+# Lease store specs that name a Redis server rather than a SQLite file
+REDIS_SCHEMES = ('redis://', 'rediss://', 'unix://')
+
+def open_lease_store(spec, name):
+    """Lease store for the crawl `name`: Redis for redis:// URLs, otherwise a SQLite file path"""
+    if spec.startswith(REDIS_SCHEMES):
+        return RedisLeaseStore(spec, prefix=f'archiver:{name}')
+    return SqliteLeaseStore(spec)
+
+class SqliteLeaseStore:
+    """Shared frontier of one crawl in a SQLite file, for workers on one machine.
+
+    Every URL has one row, so inserting is the dedup. Pages are leased from
+    the shallowest depth that still has unfinished pages. Workers on other
+    machines need Redis; SQLite locking over network filesystems is unreliable.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(f'''
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                depth INTEGER,
+                priority REAL NOT NULL DEFAULT {DEFAULT_PRIORITY},
+                lastmod REAL,
+                state INTEGER NOT NULL DEFAULT {QUEUED},
+                owner TEXT,
+                expires REAL,
+                size INTEGER,
+                physical_size INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS urls_unfinished
+                ON urls (depth, priority DESC, lastmod DESC) WHERE state < {DONE};
+            CREATE INDEX IF NOT EXISTS urls_leases ON urls (expires) WHERE state = {LEASED};
+            CREATE TABLE IF NOT EXISTS errors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT,
+                message TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        ''')
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the lock and the database's write lock for the enclosed statements"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def started(self):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM urls LIMIT 1').fetchone() is not None
+
+    def _add(self, entries):
+        before = self._db.total_changes
+        self._db.executemany(
+            'INSERT OR IGNORE INTO urls (url, depth, priority, lastmod) VALUES (?, ?, ?, ?)',
+            ((url, depth, DEFAULT_PRIORITY if priority is None else priority, lastmod)
+             for url, depth, priority, lastmod in entries))
+        return self._db.total_changes - before
+
+    def add(self, entries):
+        """Queue (url, depth, priority, lastmod) entries not known yet; returns how many were new"""
+        with self._transaction():
+            return self._add(entries)
+
+    def lease(self, owner, limit, ttl):
+        """Lease up to limit (url, depth) pages of the shallowest unfinished depth.
+
+        Queued pages and pages whose lease expired are handed out; an empty
+        list means every page of that depth is leased to a live worker.
+        """
+        with self._transaction():
+            if self._cancelled():
+                return []
+            level = self._db.execute(
+                f'SELECT MIN(depth) FROM urls WHERE state < {DONE} AND depth IS NOT NULL').fetchone()[0]
+            if level is None:
+                return []
+            now = time.time()
+            rows = self._db.execute(
+                f'SELECT url, depth FROM urls WHERE state < {DONE} AND depth = ? '
+                f'AND (state = {QUEUED} OR expires < ?) '
+                'ORDER BY priority DESC, lastmod DESC, rowid LIMIT ?', (level, now, limit)).fetchall()
+            self._db.executemany(f'UPDATE urls SET state = {LEASED}, owner = ?, expires = ? WHERE url = ?',
+                                 ((owner, now + ttl, url) for url, _ in rows))
+            return rows
+
+    def claim(self, owner, url, ttl):
+        """Lease an asset, returning False if another worker has it or it is done"""
+        with self._transaction():
+            now = time.time()
+            changed = self._db.execute(
+                f'UPDATE urls SET state = {LEASED}, owner = ?, expires = ? WHERE url = ? '
+                f'AND (state = {QUEUED} OR (state = {LEASED} AND depth IS NULL AND expires < ?))',
+                (owner, now + ttl, url, now)).rowcount
+            if changed:
+                return True
+            return self._db.execute(
+                f'INSERT OR IGNORE INTO urls (url, state, owner, expires) VALUES (?, {LEASED}, ?, ?)',
+                (url, owner, now + ttl)).rowcount > 0
+
+    def take_expired_assets(self, owner, ttl):
+        """Lease the assets whose worker stopped before downloading them"""
+        with self._transaction():
+            now = time.time()
+            urls = [row[0] for row in self._db.execute(
+                f'SELECT url FROM urls WHERE state = {LEASED} AND depth IS NULL AND expires < ?', (now,))]
+            self._db.executemany('UPDATE urls SET owner = ?, expires = ? WHERE url = ?',
+                                 ((owner, now + ttl, url) for url in urls))
+            return urls
+
+    def renew(self, owner, urls, ttl):
+        with self._transaction():
+            expires = time.time() + ttl
+            self._db.executemany(f'UPDATE urls SET expires = ? WHERE url = ? AND owner = ? AND state = {LEASED}',
+                                 ((expires, url, owner) for url in urls))
+
+    def release(self, owner, urls):
+        """Give leases back before they expire, so other workers take the URLs at once"""
+        with self._transaction():
+            self._db.executemany(f'UPDATE urls SET expires = 0 WHERE url = ? AND owner = ? AND state = {LEASED}',
+                                 ((url, owner) for url in urls))
+
+    def complete(self, url, sizes=None, entries=()):
+        """Mark url done, with (size, physical_size) of its file, and queue the links found on it"""
+        size, physical_size = sizes or (None, None)
+        with self._transaction():
+            self._add(entries)
+            self._db.execute(f'UPDATE urls SET state = {DONE}, size = ?, physical_size = ? WHERE url = ?',
+                             (size, physical_size, url))
+
+    def finished(self):
+        """Whether no page is left to crawl and no worker still holds a lease"""
+        with self._lock:
+            if self._cancelled():
+                return True
+            return self._db.execute(
+                f'SELECT 1 FROM urls WHERE state < {DONE} AND (depth IS NOT NULL OR expires >= ?) LIMIT 1',
+                (time.time(),)).fetchone() is None
+
+    def counts(self):
+        with self._lock:
+            states = dict(self._db.execute('SELECT state, COUNT(*) FROM urls GROUP BY state').fetchall())
+            files, total_size = self._db.execute(
+                f'SELECT COUNT(size), COALESCE(SUM(size), 0) FROM urls WHERE state = {DONE}').fetchone()
+        return {'queued': states.get(QUEUED, 0), 'leased': states.get(LEASED, 0), 'done': states.get(DONE, 0),
+                'files': files, 'total_size': total_size}
+
+    def visited_urls(self):
+        with self._lock:
+            return set(row[0] for row in self._db.execute(f'SELECT url FROM urls WHERE state > {QUEUED}'))
+
+    def add_error(self, url, message):
+        with self._lock:
+            self._db.execute('INSERT INTO errors (url, message) VALUES (?, ?)', (url, message))
+
+    def errors(self, offset=0, limit=None):
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT message FROM errors ORDER BY id LIMIT ? OFFSET ?',
+                                                       (-1 if limit is None else limit, offset))]
+
+    def _cancelled(self):
+        return self._db.execute("SELECT 1 FROM meta WHERE key = 'cancelled'").fetchone() is not None
+
+    def cancel(self):
+        """Stop every worker of the crawl once their current pages are done"""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('cancelled', '1')")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Queue scores are rank * 2**42 + arrival order: rank is 0-1000 from the
+# priority (highest first), and both parts stay exact in a double
+RANK_SHIFT = 2 ** 42
+
+REDIS_ADD = '''
+local p = ARGV[1]
+local added = 0
+for i = 2, #ARGV, 3 do
+    local url, depth = ARGV[i], ARGV[i + 1]
+    if redis.call('HSETNX', p .. ':state', url, '0') == 1 then
+        redis.call('HSET', p .. ':depth', url, depth)
+        local seq = redis.call('INCR', p .. ':seq')
+        redis.call('ZADD', p .. ':queue:' .. depth, tonumber(ARGV[i + 2]) * 4398046511104 + seq, url)
+        redis.call('HINCRBY', p .. ':pending', depth, 1)
+        redis.call('ZADD', p .. ':levels', depth, depth)
+        added = added + 1
+    end
+end
+redis.call('HINCRBY', p .. ':stats', 'queued', added)
+return added
+'''
+
+REDIS_LEASE = '''
+local p, owner, limit, ttl = ARGV[1], ARGV[2], tonumber(ARGV[3]), tonumber(ARGV[4])
+if redis.call('HEXISTS', p .. ':meta', 'cancelled') == 1 then return {} end
+local level = redis.call('ZRANGE', p .. ':levels', 0, 0)[1]
+if not level then return {} end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local urls = {}
+for _, url in ipairs(redis.call('ZRANGEBYSCORE', p .. ':leases', '-inf', '(' .. now)) do
+    local depth = redis.call('HGET', p .. ':depth', url)
+    if not depth then
+        -- An asset: claim() takes it over once it has no lease
+        redis.call('ZREM', p .. ':leases', url)
+    elseif depth == level and #urls < limit then
+        table.insert(urls, url)
+    end
+end
+if #urls < limit then
+    local queue = p .. ':queue:' .. level
+    local queued = redis.call('ZRANGE', queue, 0, limit - #urls - 1)
+    if #queued > 0 then
+        redis.call('ZREM', queue, unpack(queued))
+        redis.call('HINCRBY', p .. ':stats', 'queued', -#queued)
+        for _, url in ipairs(queued) do table.insert(urls, url) end
+    end
+end
+for _, url in ipairs(urls) do
+    redis.call('HSET', p .. ':state', url, '1')
+    redis.call('HSET', p .. ':owner', url, owner)
+    redis.call('ZADD', p .. ':leases', now + ttl, url)
+end
+table.insert(urls, 1, level)
+return urls
+'''
+
+REDIS_CLAIM = '''
+local p, owner, url, ttl = ARGV[1], ARGV[2], ARGV[3], tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HGET', p .. ':state', url)
+local depth = redis.call('HGET', p .. ':depth', url)
+if state == '2' then return 0 end
+if state == '1' then
+    if depth then return 0 end
+    local expires = redis.call('ZSCORE', p .. ':leases', url)
+    if expires and tonumber(expires) >= now then return 0 end
+elseif state == '0' then
+    redis.call('ZREM', p .. ':queue:' .. depth, url)
+    redis.call('HINCRBY', p .. ':stats', 'queued', -1)
+end
+redis.call('HSET', p .. ':state', url, '1')
+redis.call('HSET', p .. ':owner', url, owner)
+redis.call('ZADD', p .. ':leases', now + ttl, url)
+return 1
+'''
+
+REDIS_TAKE_EXPIRED = '''
+local p, owner, ttl = ARGV[1], ARGV[2], tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local urls = {}
+for _, url in ipairs(redis.call('HKEYS', p .. ':owner')) do
+    local expires = redis.call('ZSCORE', p .. ':leases', url)
+    if redis.call('HEXISTS', p .. ':depth', url) == 0 and (not expires or tonumber(expires) < now) then
+        redis.call('HSET', p .. ':owner', url, owner)
+        redis.call('ZADD', p .. ':leases', now + ttl, url)
+        table.insert(urls, url)
+    end
+end
+return urls
+'''
+
+REDIS_RENEW = '''
+local p, owner, expires = ARGV[1], ARGV[2], ARGV[3]
+local t = redis.call('TIME')
+if expires ~= '0' then expires = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(expires) end
+for i = 4, #ARGV do
+    if redis.call('HGET', p .. ':owner', ARGV[i]) == owner then
+        redis.call('ZADD', p .. ':leases', 'XX', expires, ARGV[i])
+    end
+end
+return 0
+'''
+
+REDIS_COMPLETE = '''
+local p, url = ARGV[1], ARGV[2]
+local state = redis.call('HGET', p .. ':state', url)
+if not state or state == '2' then return 0 end
+local depth = redis.call('HGET', p .. ':depth', url)
+if state == '0' then
+    redis.call('ZREM', p .. ':queue:' .. depth, url)
+    redis.call('HINCRBY', p .. ':stats', 'queued', -1)
+end
+redis.call('HSET', p .. ':state', url, '2')
+redis.call('ZREM', p .. ':leases', url)
+redis.call('HDEL', p .. ':owner', url)
+redis.call('HINCRBY', p .. ':stats', 'done', 1)
+if depth and redis.call('HINCRBY', p .. ':pending', depth, -1) <= 0 then
+    redis.call('HDEL', p .. ':pending', depth)
+    redis.call('ZREM', p .. ':levels', depth)
+end
+if ARGV[3] ~= '' then
+    redis.call('HINCRBY', p .. ':stats', 'files', 1)
+    redis.call('HINCRBY', p .. ':stats', 'total_size', ARGV[3])
+end
+return 1
+'''
+
+REDIS_FINISHED = '''
+local p = ARGV[1]
+if redis.call('HEXISTS', p .. ':meta', 'cancelled') == 1 then return 1 end
+if redis.call('ZCARD', p .. ':levels') > 0 then return 0 end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+if redis.call('ZCOUNT', p .. ':leases', now, '+inf') > 0 then return 0 end
+return 1
+'''
+
+class RedisLeaseStore:
+    """Shared frontier of one crawl in Redis, for workers on any number of machines.
+
+    Same contract as SqliteLeaseStore. Every operation is one Lua script,
+    so it is atomic and lease expiry follows the server's clock. Pages are
+    queued in one sorted set per depth, by priority then arrival; sitemap
+    lastmod does not order them here. Keys share `prefix` and are not
+    spread over a cluster's slots.
+    """
+    def __init__(self, url, prefix='archiver'):
+        if not HAVE_REDIS:
+            raise RuntimeError("The redis package is needed for a Redis frontier")
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._scripts = {name: self._redis.register_script(source) for name, source in (
+            ('add', REDIS_ADD), ('lease', REDIS_LEASE), ('claim', REDIS_CLAIM),
+            ('take_expired', REDIS_TAKE_EXPIRED), ('renew', REDIS_RENEW),
+            ('complete', REDIS_COMPLETE), ('finished', REDIS_FINISHED))}
+
+    def _key(self, name):
+        return f'{self.prefix}:{name}'
+
+    @staticmethod
+    def _add_args(entries):
+        args = []
+        for url, depth, priority, lastmod in entries:
+            rank = round((1 - (DEFAULT_PRIORITY if priority is None else priority)) * 1000)
+            args += [url, depth, rank]
+        return args
+
+    def started(self):
+        return self._redis.exists(self._key('state')) > 0
+
+    def add(self, entries):
+        args = self._add_args(entries)
+        return self._scripts['add'](args=[self.prefix] + args) if args else 0
+
+    def lease(self, owner, limit, ttl):
+        reply = self._scripts['lease'](args=[self.prefix, owner, limit, ttl])
+        if not reply:
+            return []
+        depth = int(reply[0])
+        return [(url.decode(), depth) for url in reply[1:]]
+
+    def claim(self, owner, url, ttl):
+        return self._scripts['claim'](args=[self.prefix, owner, url, ttl]) == 1
+
+    def take_expired_assets(self, owner, ttl):
+        return [url.decode() for url in self._scripts['take_expired'](args=[self.prefix, owner, ttl])]
+
+    def renew(self, owner, urls, ttl):
+        if urls:
+            self._scripts['renew'](args=[self.prefix, owner, ttl] + list(urls))
+
+    def release(self, owner, urls):
+        if urls:
+            self._scripts['renew'](args=[self.prefix, owner, 0] + list(urls))
+
+    def complete(self, url, sizes=None, entries=()):
+        # Both scripts run in one MULTI, so the links land with the completion
+        pipe = self._redis.pipeline()
+        args = self._add_args(entries)
+        if args:
+            self._scripts['add'](args=[self.prefix] + args, client=pipe)
+        self._scripts['complete'](args=[self.prefix, url, sizes[0] if sizes else ''], client=pipe)
+        pipe.execute()
+
+    def finished(self):
+        return self._scripts['finished'](args=[self.prefix]) == 1
+
+    def counts(self):
+        queued, done, files, total_size = self._redis.hmget(self._key('stats'), 'queued', 'done', 'files', 'total_size')
+        return {'queued': int(queued or 0), 'leased': self._redis.zcard(self._key('leases')),
+                'done': int(done or 0), 'files': int(files or 0), 'total_size': int(total_size or 0)}
+
+    def visited_urls(self):
+        return set(url.decode() for url, state in self._redis.hscan_iter(self._key('state')) if state != b'0')
+
+    def add_error(self, url, message):
+        self._redis.rpush(self._key('errors'), json.dumps({'url': url, 'message': message}))
+
+    def errors(self, offset=0, limit=None):
+        end = -1 if limit is None else offset + limit - 1
+        return [json.loads(item)['message'] for item in self._redis.lrange(self._key('errors'), offset, end)]
+
+    def cancel(self):
+        self._redis.hset(self._key('meta'), 'cancelled', '1')
+
+    def close(self):
+        self._redis.close()
+
+class DistributedFrontier(Frontier):
+    """Frontier shared by crawler processes through a lease store.
+
+    Each worker leases batches of pages from the shallowest unfinished
+    depth, so depths are crawled in order across all workers as they are
+    by one. A heartbeat renews the leases the worker holds; when a worker
+    stops, its leases expire and others take its URLs. Links found on a
+    page reach the store with the page's completion. The store decides
+    what is new; the local fingerprint sets only save round trips for URLs
+    this worker has already seen.
+
+    Counters such as file_stats() stay per worker; counts() of the store
+    covers the whole crawl.
+    """
+    shared = True
+
+    def __init__(self, store, worker_id=None, batch_size=LEASE_BATCH, lease_ttl=LEASE_TTL):
+        super().__init__()
+        self.store = store
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.batch_size = max(1, batch_size)
+        self.lease_ttl = lease_ttl
+        self._resumed = store.started()
+        self._leased = deque()  # (url, depth) leased but not handed out yet
+        self._held = {}  # URL -> is a page, for everything leased or claimed and not completed
+        self._in_flight = 0  # Pages handed out and not completed
+        self._pending = []  # (url, depth, priority, lastmod) pushed but not sent yet
+        self._sizes = {}  # URL -> (size, physical_size) until it completes
+        self._slot_free = threading.Condition(self._lock)
+        self._send_lock = threading.Lock()  # Keeps sends in order, so links arrive before their page completes
+        self._stopped = threading.Event()
+        self._closed = threading.Event()
+        self._counts = None
+        self._counted = 0.0
+        self._heartbeat = threading.Thread(target=self._renew_leases, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    @property
+    def resumed(self):
+        return self._resumed
+
+    def __len__(self):
+        return self.counts()['queued']
+
+    def counts(self):
+        """The store's counts for the whole crawl, cached for COUNTS_INTERVAL"""
+        now = time.monotonic()
+        if self._counts is None or now - self._counted > COUNTS_INTERVAL:
+            self._counts = self.store.counts()
+            self._counted = now
+        return self._counts
+
+    def push(self, url, depth, priority=None, lastmod=None):
+        """Queue url unless this worker has seen it; True means new to this worker only"""
+        with self._lock:
+            if not self._seen.add(url):
+                return False
+            self._pending.append((url, depth, priority, lastmod))
+            full = len(self._pending) >= PUSH_BATCH
+        if full:
+            self._flush()
+        return True
+
+    def _flush(self):
+        with self._send_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+            if entries:
+                self.store.add(entries)
+
+    def _lease(self):
+        """Lease more pages into the local batch, returning whether any came"""
+        self._flush()
+        with self._lock:
+            limit = self.batch_size - self._in_flight - len(self._leased)
+        if limit <= 0:
+            return False
+        items = self.store.lease(self.worker_id, limit, self.lease_ttl)
+        with self._lock:
+            for url, depth in items:
+                self._leased.append((url, depth))
+                self._held[url] = True
+                self._seen.add(url)
+                self._visited.add(url)
+        return bool(items)
+
+    def _finished(self):
+        self._flush()
+        return self.store.finished()
+
+    def next_depth(self):
+        """Depth of the next page to crawl, waiting while other workers finish the current depth"""
+        while not self._stopped.is_set():
+            with self._lock:
+                if self._leased:
+                    return self._leased[0][1]
+            if self._lease():
+                continue
+            if self._finished():
+                return None
+            self._stopped.wait(POLL_INTERVAL)
+        return None
+
+    def pop(self, max_depth=None):
+        """Hand out the next leased page, leasing more when this worker has room.
+
+        With max_depth, returns None once no page of that depth can be leased
+        right now. Without, waits for work until the whole crawl is finished.
+        """
+        while True:
+            with self._lock:
+                if not self._leased:
+                    # Lease no more than batch_size pages ahead of the crawl threads
+                    while self._in_flight >= self.batch_size and not self._stopped.is_set():
+                        self._slot_free.wait()
+                if self._stopped.is_set():
+                    return None
+                if self._leased:
+                    url, depth = self._leased[0]
+                    if max_depth is not None and depth > max_depth:
+                        return None
+                    self._leased.popleft()
+                    self._in_flight += 1
+                    return url, depth
+            if self._lease():
+                continue
+            if max_depth is not None or self._finished():
+                return None
+            self._stopped.wait(POLL_INTERVAL)
+
+    def claim(self, url, depth=None):
+        with self._lock:
+            if url in self._visited:
+                return False
+        claimed = self.store.claim(self.worker_id, url, self.lease_ttl)
+        with self._lock:
+            self._visited.add(url)
+            self._seen.add(url)
+            if claimed:
+                self._held[url] = False
+        return claimed
+
+    def complete(self, url):
+        with self._send_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+                sizes = self._sizes.pop(url, None)
+                if self._held.pop(url, False):
+                    self._in_flight -= 1
+                    self._slot_free.notify_all()
+            self.store.complete(url, sizes, entries)
+
+    def record_file(self, url, size, physical_size=0):
+        with self._lock:
+            self._sizes[url] = (size, physical_size)
+
+    def unfinished_assets(self):
+        """Assets left behind by workers that stopped, now leased to this one"""
+        urls = self.store.take_expired_assets(self.worker_id, self.lease_ttl)
+        with self._lock:
+            for url in urls:
+                self._held[url] = False
+                self._visited.add(url)
+        return urls
+
+    def visited_urls(self):
+        return self.store.visited_urls()
+
+    def memory_stats(self):
+        stats = super().memory_stats()
+        with self._lock:
+            held = len(self._held)
+        stats.update(worker=self.worker_id, leased=held, shared=self.counts())
+        return stats
+
+    def add_error(self, message, url=None):
+        self.store.add_error(url, message)
+
+    def errors(self, offset=0, limit=None):
+        """Errors recorded by every worker of the crawl"""
+        return self.store.errors(offset, limit)
+
+    def _renew_leases(self):
+        while not self._closed.wait(self.lease_ttl / 3):
+            with self._lock:
+                urls = list(self._held)
+            try:
+                self.store.renew(self.worker_id, urls, self.lease_ttl)
+            except Exception as e:
+                logger.warning(f"Could not renew {len(urls)} leases: {e}")
+
+    def cancel(self):
+        """Cancel the crawl on every worker"""
+        self.store.cancel()
+        self._stopped.set()
+        with self._lock:
+            self._slot_free.notify_all()
+
+    def close(self):
+        """Send what is pending and hand unfinished leases back to the other workers"""
+        self._closed.set()
+        self._heartbeat.join()
+        try:
+            self._flush()
+            with self._lock:
+                urls = list(self._held)
+            if urls:
+                self.store.release(self.worker_id, urls)
+        finally:
+            self.store.close()
@@ -0,0 +1,135 @@
+import os
+import queue
+import tarfile
+import zipfile
+import tempfile
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    'zip': 'application/zip',
+    'tar.gz': 'application/gzip',
+}
+
+# Chunks buffered between the archive writer and the response; bounds memory per download
+PIPE_DEPTH = 16
+CHUNK_SIZE = 64 * 1024
+
+class ExportCancelled(Exception):
+    pass
+
+class _Pipe:
+    """Write end of a bounded queue, given to zipfile/tarfile as their output file"""
+    def __init__(self):
+        self.chunks = queue.Queue(maxsize=PIPE_DEPTH)
+        self.closed = threading.Event()
+        self._position = 0
+        self._buffer = bytearray()
+
+    def write(self, data):
+        # zipfile and tarfile write many small headers: send them on in CHUNK_SIZE pieces
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= CHUNK_SIZE:
+            if not self._put(bytes(self._buffer)):
+                raise ExportCancelled()
+            self._buffer.clear()
+        return len(data)
+
+    def finish(self):
+        if self._buffer and self._put(bytes(self._buffer)):
+            self._buffer.clear()
+        self._put(None)
+
+    def _put(self, item):
+        """Queue item unless the reader has gone away; returns whether it was queued"""
+        while not self.closed.is_set():
+            try:
+                self.chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+def archive_files(directory):
+    """(path, name in the bundle) of every archive file, in a stable order.
+
+    Hidden files are the crawler's own temp files and WARC sidecar log.
+    """
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                path = os.path.join(root, name)
+                yield path, os.path.relpath(path, directory).replace(os.sep, '/')
+
+def _write_bundle(directory, fmt, pipe, prefix):
+    if fmt == 'zip':
+        with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as bundle:
+            for path, name in archive_files(directory):
+                bundle.write(path, f'{prefix}/{name}')
+    else:
+        with tarfile.open(fileobj=pipe, mode='w|gz') as bundle:
+            for path, name in archive_files(directory):
+                bundle.add(path, f'{prefix}/{name}', recursive=False)
+
+def stream_bundle(directory, fmt, prefix, cache_path=None):
+    """Yield a ZIP or tar.gz of directory as it is built.
+
+    The bundle is written by a background thread into a small bounded
+    queue, so memory stays constant whatever the archive size and nothing
+    is staged on disk. With cache_path the bytes are also teed to a temp
+    file that is renamed into place once the bundle is complete.
+    """
+    pipe = _Pipe()
+    failure = []
+
+    def writer():
+        try:
+            _write_bundle(directory, fmt, pipe, prefix)
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Error exporting {directory}: {e}")
+            failure.append(e)
+        finally:
+            pipe.finish()
+
+    thread = threading.Thread(target=writer, name='export', daemon=True)
+    thread.start()
+
+    cache = temp_path = None
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), prefix='.', suffix='.part')
+        cache = os.fdopen(fd, 'wb')
+    complete = False
+    try:
+        while True:
+            chunk = pipe.chunks.get()
+            if chunk is None:
+                break
+            if cache is not None:
+                cache.write(chunk)
+            yield chunk
+        if failure:
+            # Cuts the connection, so the client cannot take a truncated bundle for a complete one
+            raise failure[0]
+        complete = True
+    finally:
+        # Also reached when the client disconnects: stop the writer
+        pipe.closed.set()
+        if cache is not None:
+            cache.close()
+            if complete:
+                os.replace(temp_path, cache_path)
+            else:
+                os.remove(temp_path)
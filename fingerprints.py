@@ -0,0 +1,131 @@
+import math
+from array import array
+
+# Slots in a new table, and the share of them used before it doubles
+INITIAL_SLOTS = 1 << 12
+MAX_LOAD = 0.7
+
+MASK = (1 << 64) - 1
+
+def fingerprint(url):
+    """64-bit fingerprint of a URL, never 0 (the empty slot marker).
+
+    Built on hash(), so it is only stable within one process; frontiers
+    rebuild their sets from the stored URLs on resume. Two of a million
+    URLs collide with a probability of about 3e-8, and a collision makes
+    the crawler skip one URL.
+    """
+    return (hash(url) & MASK) or 1
+
+class BloomFilter:
+    """Bit array answering "definitely not added" in about 1.2 bytes per item at 1% errors"""
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fp):
+        # Double hashing on the two halves of the fingerprint
+        low, high = fp & 0xffffffff, fp >> 32
+        return ((low + i * high) % self.size for i in range(self.hashes))
+
+    def add(self, fp):
+        for position in self._positions(fp):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, fp):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(fp))
+
+    def memory_bytes(self):
+        return len(self.bits)
+
+class FingerprintSet:
+    """Set of URLs kept as 64-bit fingerprints in a flat open-addressing table.
+
+    Costs 8 bytes per slot, 11-23 bytes per URL depending on how full the
+    table is, against well over 100 for a URL string in a set. Not
+    thread-safe; the frontier holds its lock around it.
+    """
+    def __init__(self):
+        self._table = array('Q', bytes(8 * INITIAL_SLOTS))
+        self._mask = INITIAL_SLOTS - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, url):
+        fp = fingerprint(url)
+        return self._table[self._slot(fp)] == fp
+
+    def _slot(self, fp):
+        """Index holding fp, or the empty slot where it would go (linear probing)"""
+        table, mask = self._table, self._mask
+        i = fp & mask
+        while table[i] and table[i] != fp:
+            i = (i + 1) & mask
+        return i
+
+    def add(self, url):
+        """Add url, returning False if it was already in the set"""
+        fp = fingerprint(url)
+        i = self._slot(fp)
+        if self._table[i] == fp:
+            return False
+        self._table[i] = fp
+        self._count += 1
+        if self._count > MAX_LOAD * len(self._table):
+            self._grow()
+        return True
+
+    def preload(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def _grow(self):
+        old = self._table
+        self._table = array('Q', bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        for fp in old:
+            if fp:
+                self._table[self._slot(fp)] = fp
+
+    def memory_bytes(self):
+        return len(self._table) * self._table.itemsize
+
+class BloomSet:
+    """Set whose members live elsewhere (a database), with a Bloom filter in memory.
+
+    lookup(url) is the authoritative membership test; it only runs for URLs
+    the filter may have seen, so new URLs cost no lookup. Memory stays at
+    the filter's fixed size; past capacity the filter fills up and more
+    lookups run, but answers stay exact.
+    """
+    def __init__(self, lookup, capacity):
+        self._lookup = lookup
+        self._bloom = BloomFilter(capacity)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, url):
+        return fingerprint(url) in self._bloom and self._lookup(url)
+
+    def add(self, url):
+        """Add url, returning False if it was already in the set"""
+        fp = fingerprint(url)
+        if fp in self._bloom and self._lookup(url):
+            return False
+        self._bloom.add(fp)
+        self._count += 1
+        return True
+
+    def preload(self, urls):
+        """Add urls that are already stored where lookup() finds them"""
+        for url in urls:
+            self._bloom.add(fingerprint(url))
+            self._count += 1
+
+    def memory_bytes(self):
+        return self._bloom.memory_bytes()
@@ -0,0 +1,340 @@
+import os
+import sys
+import heapq
+import sqlite3
+import itertools
+import threading
+import logging
+from contextlib import contextmanager
+
+from fingerprints import FingerprintSet, BloomSet
+
+logger = logging.getLogger(__name__)
+
+# Priority of URLs without one, as in the sitemap protocol
+DEFAULT_PRIORITY = 0.5
+
+QUEUE_ORDER = 'ORDER BY depth, priority DESC, lastmod DESC, seq'
+
+def read_errors(path, offset=0, limit=None):
+    """Errors recorded in a frontier file, read without taking it over for crawling"""
+    if not os.path.exists(path):
+        return []
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return [row[0] for row in db.execute(
+            'SELECT message FROM errors ORDER BY id LIMIT ? OFFSET ?',
+            (-1 if limit is None else limit, offset))]
+    except sqlite3.OperationalError:
+        # The crawler is still creating the file
+        return []
+    finally:
+        db.close()
+
+class Frontier:
+    """In-memory crawl frontier: a priority queue of (url, depth) plus the visited set.
+
+    URLs come out shallowest first, then by priority (highest first, from
+    sitemaps), then freshest lastmod, then in the order they were queued.
+
+    A URL is claimed when it is popped (pages) or about to be downloaded
+    (assets) and completed once it has been saved. push() ignores URLs that
+    were already queued or claimed, so each URL is queued at most once.
+    Both sets keep 64-bit fingerprints rather than the URLs themselves, so
+    visited_urls() returns None unless keep_urls also lists the visited
+    URLs, at the cost of holding every URL string.
+    """
+    # Whether other processes crawl from the same frontier
+    shared = False
+
+    def __init__(self, keep_urls=False):
+        self._lock = threading.Lock()
+        self._queue = []  # (depth, -priority, -lastmod, seq, url)
+        self._seq = itertools.count()
+        self._visited = FingerprintSet()
+        self._seen = FingerprintSet()  # Queued or claimed
+        self._visited_urls = [] if keep_urls else None
+        self._visited_urls_bytes = 0
+
+    @property
+    def resumed(self):
+        return False
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, url, depth, priority=None, lastmod=None):
+        """Queue url unless it was queued or claimed before; returns whether it was queued"""
+        with self._lock:
+            if not self._seen.add(url):
+                return False
+            heapq.heappush(self._queue, (depth, -(DEFAULT_PRIORITY if priority is None else priority),
+                                         -(lastmod or 0), next(self._seq), url))
+            return True
+
+    def next_depth(self):
+        """Depth of the next queued URL, or None if the queue is empty"""
+        with self._lock:
+            return self._queue[0][0] if self._queue else None
+
+    def pop(self, max_depth=None):
+        """Remove and claim the next unvisited URL.
+
+        Returns (url, depth), or None when the queue is empty or the next
+        URL is deeper than max_depth.
+        """
+        with self._lock:
+            while self._queue:
+                depth, url = self._queue[0][0], self._queue[0][4]
+                if max_depth is not None and depth > max_depth:
+                    return None
+                heapq.heappop(self._queue)
+                # Skip pages that were downloaded as assets meanwhile
+                if self._visited.add(url):
+                    self._keep_url(url)
+                    return url, depth
+            return None
+
+    def claim(self, url, depth=None):
+        """Mark url as visited, returning False if it already was"""
+        with self._lock:
+            if not self._visited.add(url):
+                return False
+            self._seen.add(url)
+            self._keep_url(url)
+            return True
+
+    def _keep_url(self, url):
+        if self._visited_urls is not None:
+            self._visited_urls.append(url)
+            self._visited_urls_bytes += sys.getsizeof(url) + 8  # String and list slot
+
+    def complete(self, url):
+        pass
+
+    def is_visited(self, url):
+        with self._lock:
+            return url in self._visited
+
+    def visited_count(self):
+        return len(self._visited)
+
+    def visited_urls(self):
+        if self._visited_urls is None:
+            return None
+        with self._lock:
+            return set(self._visited_urls)
+
+    def memory_stats(self):
+        """Memory held by the dedup sets, per known URL"""
+        with self._lock:
+            urls = len(self._seen)
+            size = self._seen.memory_bytes() + self._visited.memory_bytes() + self._visited_urls_bytes
+        return {
+            'urls': urls,
+            'bytes': size,
+            'bytes_per_url': round(size / urls, 1) if urls else None,
+        }
+
+    def record_file(self, url, size, physical_size=0):
+        """Remember the logical and physically stored size of the file saved for a claimed URL"""
+        pass
+
+    def file_stats(self):
+        """(files, total bytes, physical bytes) saved for completed URLs"""
+        return 0, 0, 0
+
+    def completed_pages(self):
+        """Number of pages (as opposed to assets) completed"""
+        return 0
+
+    def unfinished_assets(self):
+        """Assets claimed but not completed by a previous run, to be downloaded again; each is returned once"""
+        return []
+
+    def add_error(self, message, url=None):
+        pass
+
+    def errors(self):
+        return []
+
+    def cancel(self):
+        """Wake up a pop() or next_depth() that waits for work"""
+        pass
+
+    def close(self):
+        pass
+
+class SqliteFrontier(Frontier):
+    """Crawl frontier persisted to a SQLite file so a crawl can resume.
+
+    Every change is committed as it happens (WAL mode keeps that cheap).
+    With bloom_capacity the visited and queued sets are not held in memory:
+    a Bloom filter sized for that many URLs screens lookups and the tables
+    answer the rest, for crawls too large for even the fingerprint sets.
+    On reopen, URLs that were claimed but never completed are handed back,
+    without the files and errors recorded for them: pages go back on the
+    queue and assets stay claimed, listed by unfinished_assets().
+    """
+    def __init__(self, path, bloom_capacity=None):
+        super().__init__()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS queue (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                priority REAL NOT NULL DEFAULT 0.5,
+                lastmod REAL
+            );
+            CREATE TABLE IF NOT EXISTS visited (
+                url TEXT PRIMARY KEY,
+                depth INTEGER,
+                done INTEGER NOT NULL DEFAULT 0,
+                size INTEGER,
+                physical_size INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS errors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT,
+                message TEXT NOT NULL
+            );
+        ''')
+        # Columns added after the first release of this table
+        columns = set(row[1] for row in self._db.execute('PRAGMA table_info(queue)'))
+        for name, definition in (('priority', f'REAL NOT NULL DEFAULT {DEFAULT_PRIORITY}'),
+                                 ('lastmod', 'REAL')):
+            if name not in columns:
+                self._db.execute(f'ALTER TABLE queue ADD COLUMN {name} {definition}')
+        self._db.execute('CREATE INDEX IF NOT EXISTS queue_order ON queue (depth, priority DESC, lastmod DESC, seq)')
+        self._resumed = self._recover()
+        # Membership checks happen for every link on every page, so keep them in memory
+        if bloom_capacity:
+            self._db.execute('CREATE INDEX IF NOT EXISTS queue_url ON queue (url)')
+            self._visited = BloomSet(self._is_stored_visited, bloom_capacity)
+            self._seen = BloomSet(self._is_stored, bloom_capacity)
+        self._visited.preload(row[0] for row in self._db.execute('SELECT url FROM visited'))
+        self._seen.preload(row[0] for row in self._db.execute('SELECT url FROM visited UNION SELECT url FROM queue'))
+        self._length = self._db.execute('SELECT COUNT(*) FROM queue').fetchone()[0]
+
+    @contextmanager
+    def _transaction(self):
+        """Hold the lock and run the enclosed statements as one transaction"""
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                yield
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def _recover(self):
+        """Requeue pages and collect assets left unfinished by a previous run"""
+        with self._transaction():
+            seen = self._db.execute('SELECT COUNT(*) FROM visited').fetchone()[0]
+            unfinished = self._db.execute(
+                'SELECT url, depth FROM visited WHERE done = 0 AND depth IS NOT NULL').fetchall()
+            if unfinished:
+                logger.info(f"Requeueing {len(unfinished)} unfinished pages from {self.path}")
+            self._db.executemany('INSERT INTO queue (url, depth) VALUES (?, ?)', unfinished)
+            self._unfinished_assets = [row[0] for row in self._db.execute(
+                'SELECT url FROM visited WHERE done = 0 AND depth IS NULL')]
+            self._db.execute('DELETE FROM errors WHERE url IN (SELECT url FROM visited WHERE done = 0)')
+            self._db.execute('DELETE FROM visited WHERE done = 0 AND depth IS NOT NULL')
+        return seen > 0
+
+    def _is_stored_visited(self, url):
+        return self._db.execute('SELECT 1 FROM visited WHERE url = ?', (url,)).fetchone() is not None
+
+    def _is_stored(self, url):
+        return (self._is_stored_visited(url) or
+                self._db.execute('SELECT 1 FROM queue WHERE url = ?', (url,)).fetchone() is not None)
+
+    @property
+    def resumed(self):
+        return self._resumed
+
+    def __len__(self):
+        return self._length
+
+    def push(self, url, depth, priority=None, lastmod=None):
+        with self._lock:
+            if not self._seen.add(url):
+                return False
+            self._db.execute('INSERT INTO queue (url, depth, priority, lastmod) VALUES (?, ?, ?, ?)',
+                             (url, depth, DEFAULT_PRIORITY if priority is None else priority, lastmod))
+            self._length += 1
+            return True
+
+    def next_depth(self):
+        with self._lock:
+            row = self._db.execute(f'SELECT depth FROM queue {QUEUE_ORDER} LIMIT 1').fetchone()
+            return row[0] if row else None
+
+    def pop(self, max_depth=None):
+        with self._transaction():
+            while True:
+                row = self._db.execute(f'SELECT seq, url, depth FROM queue {QUEUE_ORDER} LIMIT 1').fetchone()
+                if row is None:
+                    return None
+                seq, url, depth = row
+                if max_depth is not None and depth > max_depth:
+                    return None
+                self._db.execute('DELETE FROM queue WHERE seq = ?', (seq,))
+                self._length -= 1
+                if self._visited.add(url):
+                    self._db.execute('INSERT INTO visited (url, depth) VALUES (?, ?)', (url, depth))
+                    return url, depth
+
+    def claim(self, url, depth=None):
+        with self._lock:
+            if not self._visited.add(url):
+                return False
+            self._seen.add(url)
+            self._db.execute('INSERT INTO visited (url, depth) VALUES (?, ?)', (url, depth))
+            return True
+
+    def complete(self, url):
+        with self._lock:
+            self._db.execute('UPDATE visited SET done = 1 WHERE url = ?', (url,))
+
+    def visited_urls(self):
+        with self._lock:
+            return set(row[0] for row in self._db.execute('SELECT url FROM visited'))
+
+    def record_file(self, url, size, physical_size=0):
+        with self._lock:
+            self._db.execute('UPDATE visited SET size = ?, physical_size = ? WHERE url = ?',
+                             (size, physical_size, url))
+
+    def file_stats(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(size), COALESCE(SUM(size), 0), COALESCE(SUM(physical_size), 0) '
+                'FROM visited WHERE done = 1').fetchone()
+
+    def unfinished_assets(self):
+        urls, self._unfinished_assets = self._unfinished_assets, []
+        return urls
+
+    def completed_pages(self):
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM visited WHERE done = 1 AND depth IS NOT NULL').fetchone()[0]
+
+    def add_error(self, message, url=None):
+        with self._lock:
+            self._db.execute('INSERT INTO errors (url, message) VALUES (?, ?)', (url, message))
+
+    def errors(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT message FROM errors ORDER BY id')]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,136 @@
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+
+# Transient statuses worth retrying with backoff; 429 and 503 are left to
+# the scraper's per-host rate limiter, which slows the whole host down
+RETRY_STATUSES = (500, 502, 504)
+
+# Connect time spent by the current thread's request, set by the pool's connections
+_timings = threading.local()
+
+class ConnectionStats:
+    """Thread-safe counters for requests sent and sockets opened"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def request_sent(self):
+        with self._lock:
+            self.requests += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(0, self.requests - self.new_connections),
+            }
+
+def _counting_pool_class(base, stats):
+    """Build a connection pool class that reports to stats"""
+    class CountingConnection(base.ConnectionCls):
+        def connect(self):
+            stats.connection_opened()
+            start = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                _timings.connect = getattr(_timings, 'connect', 0.0) + time.perf_counter() - start
+
+    class CountingPool(base):
+        ConnectionCls = CountingConnection
+
+        def _make_request(self, *args, **kwargs):
+            stats.request_sent()
+            return super()._make_request(*args, **kwargs)
+
+    return CountingPool
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools count new connections versus reused ones"""
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self.stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+class HttpClient:
+    """Pooled, keep-alive HTTP client shared by all requests of a scraper.
+
+    Connections are kept per host (up to pool_size each), responses are
+    negotiated with gzip/deflate, plus brotli when a brotli package is
+    installed, and transient failures are retried with exponential backoff.
+    observer, if given, is called as observer(phase, seconds) with the
+    'connect' time of new connections and the 'ttfb' of every request.
+    """
+    def __init__(self, pool_size=10, retries=3, backoff_factor=0.5, timeout=10,
+                 user_agent=DEFAULT_USER_AGENT, observer=None):
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.stats = ConnectionStats()
+        self.observer = observer
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter = CountingAdapter(
+            self.stats,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': user_agent,
+            'Accept-Encoding': ACCEPT_ENCODING,
+            'Connection': 'keep-alive',
+        })
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.observer is None:
+            return self.session.get(url, **kwargs)
+
+        _timings.connect = 0.0
+        start = time.perf_counter()
+        response = self.session.get(url, **kwargs)
+        elapsed = time.perf_counter() - start
+        connect = _timings.connect
+        if connect:
+            self.observer('connect', connect)
+        self.observer('ttfb', elapsed - connect)
+        return response
+
+    def connection_stats(self):
+        return self.stats.snapshot()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,169 @@
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+class JobScheduler:
+    """Runs jobs on a fixed number of worker threads.
+
+    Jobs wait in a priority queue (lower priority values first, FIFO within
+    a priority), so a burst of submissions queues up instead of starting a
+    crawler each.
+    """
+    def __init__(self, workers=2):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._heap = []  # (priority, seq, job_id)
+        self._queued = {}  # job_id -> (run, cancel)
+        self._running = {}  # job_id -> cancel
+        self._seq = itertools.count()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True).start()
+
+    def submit(self, job_id, run, cancel=None, priority=0):
+        """Queue run() to be called on a worker; cancel() asks it to stop once running"""
+        with self._cond:
+            self._queued[job_id] = (run, cancel)
+            heapq.heappush(self._heap, (priority, next(self._seq), job_id))
+            self._cond.notify()
+
+    def position(self, job_id):
+        """1-based place of a job in the queue, 0 while it runs, None otherwise"""
+        with self._cond:
+            if job_id in self._running:
+                return 0
+            if job_id not in self._queued:
+                return None
+            waiting = sorted(entry for entry in self._heap if entry[2] in self._queued)
+            return 1 + [entry[2] for entry in waiting].index(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job, returning 'queued' or 'running' for where it was, or None if unknown"""
+        with self._cond:
+            if self._queued.pop(job_id, None) is not None:
+                # The heap entry is skipped when a worker reaches it
+                return 'queued'
+            cancel = self._running.get(job_id)
+            if job_id not in self._running:
+                return None
+        if cancel is not None:
+            cancel()
+        return 'running'
+
+    def stats(self):
+        with self._cond:
+            return {'workers': self.workers, 'queued': len(self._queued), 'running': len(self._running)}
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    while not self._heap:
+                        self._cond.wait()
+                    _, _, job_id = heapq.heappop(self._heap)
+                    job = self._queued.pop(job_id, None)
+                    if job is not None:
+                        break
+                run, cancel = job
+                self._running[job_id] = cancel
+            try:
+                run()
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+
+def run_task(task_id, build_scraper, set_status, set_stats):
+    """Build a task's scraper and run it to the end, reporting its final status and counters.
+
+    A scraper that cannot be built fails the task as well, with the error
+    as its stats.
+    """
+    scraper = None
+    try:
+        scraper = build_scraper()
+        set_status(task_id, 'running')
+        scraper.start_scraping()
+        set_status(task_id, 'cancelled' if scraper.cancelled else 'completed')
+    except Exception as e:
+        logger.error(f"Error in scraping task: {e}")
+        if scraper is None:
+            set_stats(task_id, {'error': f"Could not start the crawl: {e}", 'error_count': 1})
+        set_status(task_id, 'failed')
+        raise
+    finally:
+        if scraper is not None:
+            set_stats(task_id, scraper.stats())
+
+def run_worker(task_store, create_scraper, workers=2, poll_interval=1.0, stale_after=60):
+    """Crawl tasks queued in task_store from a separate worker process.
+
+    Claims queued tasks while a worker thread is free, publishes every
+    running task's counters to the store each poll interval (which also
+    serves as its heartbeat) and honours cancellation requests made by
+    the web process.
+    """
+    scheduler = JobScheduler(workers)
+    running = {}  # task_id -> scraper, None while it is built
+    lock = threading.Lock()
+
+    requeued = task_store.requeue_stale(stale_after)
+    if requeued:
+        logger.info(f"Requeued {requeued} tasks abandoned by a stopped worker")
+
+    def set_status(task_id, status):
+        task_store.set_status(task_id, status)
+
+    def start(record):
+        task_id = record['task_id']
+        with lock:
+            # Holds the worker slot while the scraper is built on the job thread
+            running[task_id] = None
+
+        def build():
+            scraper = create_scraper(task_id, record['url'], record['options'])
+            with lock:
+                running[task_id] = scraper
+            return scraper
+
+        def run():
+            try:
+                run_task(task_id, build, set_status, task_store.set_stats)
+            finally:
+                with lock:
+                    running.pop(task_id, None)
+
+        scheduler.submit(task_id, run)
+
+    logger.info(f"Crawl worker started with {scheduler.workers} threads")
+    while True:
+        with lock:
+            busy = len(running)
+        for _ in range(scheduler.workers - busy):
+            record = task_store.claim_next()
+            if record is None:
+                break
+            start(record)
+
+        with lock:
+            active = {task_id: scraper for task_id, scraper in running.items() if scraper is not None}
+        for task_id, scraper in active.items():
+            task_store.set_stats(task_id, scraper.stats())
+        for task_id in task_store.cancel_requests(list(active)):
+            active[task_id].cancel()
+
+        time.sleep(poll_interval)
+
+def join_task(task_store, create_scraper, task_id):
+    """Help crawl a running task through its shared frontier, returning once the crawl is done"""
+    record = task_store.get(task_id)
+    if record is None:
+        raise ValueError(f"Unknown task {task_id}")
+    scraper = create_scraper(task_id, record['url'], record['options'], join=True)
+    logger.info(f"Joining task {task_id} as worker {scraper.frontier.worker_id}")
+    scraper.start_scraping()
+    return scraper
@@ -0,0 +1,219 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+# How a URL compares with the previous snapshot of the same site
+CHANGE_NEW = 'new'
+CHANGE_CHANGED = 'changed'
+CHANGE_UNCHANGED = 'unchanged'
+CHANGE_REMOVED = 'removed'
+
+ENTRY_FIELDS = ('url', 'path', 'status', 'content_type', 'size', 'sha256', 'etag', 'last_modified', 'change',
+                'stored_sha256', 'stored_size')
+
+def url_segments(url):
+    """Names of the tree nodes leading to url: its origin and path directories, each ending
+    in '/', then a leaf named after the last segment and query. They concatenate back to url."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}/"
+    directories, _, leaf = parts.path[1:].rpartition('/')
+    names = [origin] + [name + '/' for name in directories.split('/') if directories]
+    names.append(leaf + ('?' + parts.query if parts.query else ''))
+    return names
+
+def is_directory(name):
+    """Whether a tree node name is a directory's; a leaf's only ends in '/' inside its query"""
+    return name.endswith('/') and '?' not in name
+
+def leaf_digest(sha256, status):
+    return hashlib.sha256(f"{status}:{sha256 or ''}".encode()).hexdigest()
+
+def tree_digest(children):
+    """Digest of a directory from the (name, digest) of its children, in name order"""
+    h = hashlib.sha256()
+    for name, digest in sorted(children):
+        h.update(f"{name}\0{digest}\n".encode())
+    return h.hexdigest()
+
+class Manifest:
+    """Per-archive index of every saved URL.
+
+    Each entry maps the URL to its file (relative to the archive root) and
+    records the HTTP status, content type, size, SHA-256 and the ETag /
+    Last-Modified validators, so a later crawl can make conditional requests
+    and reuse unchanged files. Without a path the manifest lives in memory.
+    size and sha256 describe the file as the crawl saved it (pages with
+    their links rewritten); once post-processing has replaced it with a
+    smaller one, stored_size and stored_sha256 describe what is on disk.
+
+    build_tree() adds a Merkle tree over the URLs: a directory's digest
+    covers everything below it, so two snapshots are compared by descending
+    only into the directories whose digests differ.
+    """
+    def __init__(self, path=None, root=None):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ':memory:', check_same_thread=False, isolation_level=None)
+        if path:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                status INTEGER,
+                content_type TEXT,
+                size INTEGER,
+                sha256 TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                change TEXT
+            );
+            CREATE INDEX IF NOT EXISTS entries_path ON entries (path);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tree (
+                parent TEXT NOT NULL,
+                name TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (parent, name)
+            ) WITHOUT ROWID;
+        ''')
+        # Columns added after the first release of this table
+        columns = set(row[1] for row in self._db.execute('PRAGMA table_info(entries)'))
+        for name, definition in (('stored_sha256', 'TEXT'),
+                                 ('stored_size', 'INTEGER')):
+            if name not in columns:
+                self._db.execute(f'ALTER TABLE entries ADD COLUMN {name} {definition}')
+        if root is not None:
+            self.set_meta('root', os.path.abspath(root))
+        self.root = self.get_meta('root')
+
+    def record(self, url, path, status, content_type, size, sha256, etag=None, last_modified=None, change=None,
+               stored_sha256=None, stored_size=None):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries (url, path, status, content_type, size, sha256, etag, last_modified, '
+                'change, stored_sha256, stored_size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, path, status, content_type, size, sha256, etag, last_modified, change,
+                 stored_sha256, stored_size))
+
+    def set_stored(self, url, stored_sha256, stored_size):
+        """Record that url's file was replaced by a post-processed body"""
+        with self._lock:
+            self._db.execute('UPDATE entries SET stored_sha256 = ?, stored_size = ? WHERE url = ?',
+                             (stored_sha256, stored_size, url))
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT {", ".join(ENTRY_FIELDS)} FROM entries WHERE url = ?', (url,)).fetchone()
+        return dict(zip(ENTRY_FIELDS, row)) if row else None
+
+    def get_by_path(self, path):
+        """An entry saved at path (relative to the archive root), or None"""
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT {", ".join(ENTRY_FIELDS)} FROM entries WHERE path = ? LIMIT 1', (path,)).fetchone()
+        return dict(zip(ENTRY_FIELDS, row)) if row else None
+
+    def file_path(self, entry):
+        """Absolute path of an entry's file inside this manifest's archive"""
+        return os.path.join(self.root, entry['path'])
+
+    def entries(self):
+        with self._lock:
+            rows = self._db.execute(f'SELECT {", ".join(ENTRY_FIELDS)} FROM entries').fetchall()
+        return [dict(zip(ENTRY_FIELDS, row)) for row in rows]
+
+    def urls(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT url FROM entries')]
+
+    def urls_by_change(self, change):
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                'SELECT url FROM entries WHERE change = ? ORDER BY url', (change,))]
+
+    def change_counts(self):
+        with self._lock:
+            return dict(self._db.execute(
+                'SELECT change, COUNT(*) FROM entries WHERE change IS NOT NULL GROUP BY change').fetchall())
+
+    def build_tree(self):
+        """(Re)build the Merkle tree of the entries unless it is current; returns the root digest.
+
+        A leaf's digest covers the entry's status and SHA-256, a directory's
+        the names and digests of its children. Crawls build it as they
+        finish; a manifest changed since is rebuilt on first use.
+        """
+        with self._lock:
+            # Every record() takes a new rowid, so the highest one dates the entries
+            version = str(self._db.execute('SELECT COALESCE(MAX(rowid), 0) FROM entries').fetchone()[0])
+            if self._meta('tree_version') == version:
+                return self._meta('tree_digest')
+
+            directories = {(): []}  # Names leading to a directory -> [(name, digest)] of its children
+            for url, status, sha256 in self._db.execute('SELECT url, status, sha256 FROM entries'):
+                *path, leaf = url_segments(url)
+                path = tuple(path)
+                if path not in directories:
+                    # List the directory and any new ancestors in their parents
+                    for depth in range(len(path), 0, -1):
+                        if path[:depth] in directories:
+                            break
+                        directories[path[:depth]] = []
+                directories[path].append((leaf, leaf_digest(sha256, status)))
+
+            # Deepest first, so a directory's digest is done before its parent's
+            rows = []
+            for path in sorted(directories, key=len, reverse=True):
+                children = directories[path]
+                digest = tree_digest(children)
+                rows.extend((''.join(path), name, child_digest) for name, child_digest in children)
+                if path:
+                    directories[path[:-1]].append((path[-1], digest))
+
+            self._db.execute('BEGIN')
+            self._db.execute('DELETE FROM tree')
+            self._db.executemany('INSERT INTO tree (parent, name, digest) VALUES (?, ?, ?)', rows)
+            self._db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                 [('tree_version', version), ('tree_digest', digest)])
+            self._db.execute('COMMIT')
+            return digest
+
+    def tree_children(self, parent):
+        """{name: digest} of the children of a directory of the tree ('' is the root)"""
+        with self._lock:
+            return dict(self._db.execute('SELECT name, digest FROM tree WHERE parent = ?', (parent,)))
+
+    def tree_urls(self, prefix):
+        """URLs of the leaves below the directory prefix"""
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT parent || name FROM tree WHERE parent >= ? AND parent < ? "
+                "AND NOT (name LIKE '%/' AND instr(name, '?') = 0)",
+                (prefix, prefix + '\U0010ffff'))]
+
+    def _meta(self, key):
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,191 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Phases of fetching and saving a URL. connect covers DNS, TCP and TLS of new
+# connections; ttfb runs from sending the request to the response headers.
+PHASES = ('connect', 'ttfb', 'download', 'parse', 'rewrite', 'index', 'compress', 'write', 'optimize')
+
+# Which resource each phase waits on, to tell network-, CPU- and disk-bound crawls apart
+PHASE_RESOURCES = {
+    'connect': 'network',
+    'ttfb': 'network',
+    'download': 'network',
+    'parse': 'cpu',
+    'rewrite': 'cpu',
+    'index': 'cpu',
+    'compress': 'cpu',
+    'write': 'disk',
+    'optimize': 'cpu',
+}
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = ('pages', 'assets', 'bytes')
+
+class Histogram:
+    """Count, sum, max and bucketed distribution of observed durations"""
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # The last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+class CrawlMetrics:
+    """Thread-safe timings and throughput counters of one crawl.
+
+    Every observation is also passed on to parent, so PROCESS_METRICS holds
+    the totals of all crawls in this process for the /metrics endpoint.
+    """
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.in_flight = 0
+        self._started = None
+        self._stopped = None
+
+    def start(self):
+        self._started = time.monotonic()
+        self._stopped = None
+
+    def stop(self):
+        self._stopped = time.monotonic()
+
+    @property
+    def elapsed(self):
+        if self._started is None:
+            return 0.0
+        return (self._stopped or time.monotonic()) - self._started
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            self.phases[phase].observe(seconds)
+        if self.parent is not None:
+            self.parent.observe(phase, seconds)
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+        if self.parent is not None:
+            self.parent.count(name, amount)
+
+    @contextmanager
+    def fetching(self):
+        """Count the enclosed fetch as in flight"""
+        self._add_in_flight(1)
+        try:
+            yield
+        finally:
+            self._add_in_flight(-1)
+
+    def _add_in_flight(self, amount):
+        with self._lock:
+            self.in_flight += amount
+        if self.parent is not None:
+            self.parent._add_in_flight(amount)
+
+    def summary(self, queue_depth=None):
+        """Per-task report: rates, per-phase timings and where the time went"""
+        elapsed = self.elapsed
+        with self._lock:
+            phases = {
+                phase: {
+                    'count': histogram.count,
+                    'total': round(histogram.total, 3),
+                    'avg': round(histogram.total / histogram.count, 4) if histogram.count else 0,
+                    'max': round(histogram.max, 4),
+                }
+                for phase, histogram in self.phases.items()
+            }
+            counters = dict(self.counters)
+            in_flight = self.in_flight
+
+        by_resource = {}
+        for phase, timing in phases.items():
+            resource = PHASE_RESOURCES[phase]
+            by_resource[resource] = round(by_resource.get(resource, 0) + timing['total'], 3)
+        busiest = max(by_resource, key=by_resource.get)
+
+        return {
+            'elapsed': round(elapsed, 3),
+            **counters,
+            'pages_per_second': round(counters['pages'] / elapsed, 2) if elapsed else 0,
+            'bytes_per_second': round(counters['bytes'] / elapsed) if elapsed else 0,
+            'queue_depth': queue_depth,
+            'in_flight': in_flight,
+            'phases': phases,
+            'time_by_resource': by_resource,
+            'bound_by': busiest if by_resource[busiest] else None,
+        }
+
+# Totals over every crawl run by this process
+PROCESS_METRICS = CrawlMetrics()
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+def render_prometheus(process_metrics, tasks, jobs=None):
+    """Prometheus text exposition of process totals and per-task gauges.
+
+    tasks maps task ids to their live scrapers; jobs is the scheduler's stats().
+    """
+    lines = [
+        '# HELP archiver_phase_seconds Time spent fetching and saving URLs, by phase',
+        '# TYPE archiver_phase_seconds histogram',
+    ]
+    with process_metrics._lock:
+        for phase, histogram in process_metrics.phases.items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), histogram.buckets):
+                cumulative += count
+                lines.append(f'archiver_phase_seconds_bucket{_labels(phase=phase, le=bound)} {cumulative}')
+            lines.append(f'archiver_phase_seconds_sum{_labels(phase=phase)} {histogram.total}')
+            lines.append(f'archiver_phase_seconds_count{_labels(phase=phase)} {histogram.count}')
+        counters = dict(process_metrics.counters)
+        in_flight = process_metrics.in_flight
+
+    for name, help_text in (('pages', 'Pages crawled'), ('assets', 'Assets downloaded'),
+                            ('bytes', 'Response body bytes downloaded')):
+        lines += [f'# HELP archiver_{name}_total {help_text}', f'# TYPE archiver_{name}_total counter',
+                  f'archiver_{name}_total {counters[name]}']
+    lines += ['# HELP archiver_in_flight Fetches in progress', '# TYPE archiver_in_flight gauge',
+              f'archiver_in_flight {in_flight}']
+
+    lines += ['# HELP archiver_task_queue_depth URLs waiting in a running task\'s frontier',
+              '# TYPE archiver_task_queue_depth gauge']
+    lines += [f'archiver_task_queue_depth{_labels(task_id=task_id)} {len(scraper.frontier)}'
+              for task_id, scraper in tasks.items()]
+    lines += ['# HELP archiver_task_in_flight Fetches in progress in a running task',
+              '# TYPE archiver_task_in_flight gauge']
+    lines += [f'archiver_task_in_flight{_labels(task_id=task_id)} {scraper.metrics.in_flight}'
+              for task_id, scraper in tasks.items()]
+    lines += ['# HELP archiver_task_progress Percent of known pages crawled by a running task',
+              '# TYPE archiver_task_progress gauge']
+    lines += [f'archiver_task_progress{_labels(task_id=task_id)} {scraper.progress}'
+              for task_id, scraper in tasks.items()]
+
+    if jobs is not None:
+        lines += ['# HELP archiver_jobs Crawl jobs in the scheduler, by state', '# TYPE archiver_jobs gauge',
+                  f'archiver_jobs{_labels(state="queued")} {jobs["queued"]}',
+                  f'archiver_jobs{_labels(state="running")} {jobs["running"]}',
+                  '# HELP archiver_workers Crawl worker threads', '# TYPE archiver_workers gauge',
+                  f'archiver_workers {jobs["workers"]}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,90 @@
+import os
+import heapq
+import logging
+import itertools
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Lower values are fetched first: stylesheets lead to more assets through
+# their url() references, and fonts and scripts matter more to a page than images
+ASSET_PRIORITIES = {'stylesheet': 0, 'font': 1, 'script': 2, 'image': 3, 'other': 4}
+
+EXTENSION_KINDS = {
+    '.css': 'stylesheet',
+    '.js': 'script', '.mjs': 'script',
+    '.woff': 'font', '.woff2': 'font', '.ttf': 'font', '.otf': 'font', '.eot': 'font',
+    '.png': 'image', '.jpg': 'image', '.jpeg': 'image', '.gif': 'image', '.webp': 'image',
+    '.svg': 'image', '.ico': 'image', '.avif': 'image',
+}
+
+def asset_kind(url):
+    """Kind of asset a URL points to, judged by its extension"""
+    return EXTENSION_KINDS.get(os.path.splitext(urlparse(url).path)[1].lower(), 'other')
+
+class AssetPipeline:
+    """Downloads assets on its own worker threads while pages are crawled.
+
+    URLs wait in a priority queue by kind (FIFO within a kind) and fetch(url)
+    runs on a worker. fetch may submit more URLs, such as the url()
+    references of a stylesheet; join() waits for those too.
+    """
+    def __init__(self, fetch, workers=2):
+        self.fetch = fetch
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._work_ready = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._heap = []  # (priority, seq, url)
+        self._seq = itertools.count()
+        self._active = 0
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f'asset-worker-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def submit(self, url, kind=None):
+        priority = ASSET_PRIORITIES[kind or asset_kind(url)]
+        with self._lock:
+            heapq.heappush(self._heap, (priority, next(self._seq), url))
+            self._work_ready.notify()
+
+    def join(self):
+        """Block until every submitted URL has been fetched"""
+        with self._lock:
+            while self._heap or self._active:
+                self._idle.wait()
+
+    def close(self):
+        """Stop the workers; URLs still queued are dropped"""
+        with self._lock:
+            self._closed = True
+            self._heap.clear()
+            self._work_ready.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._heap and not self._closed:
+                    self._work_ready.wait()
+                if self._closed:
+                    return
+                _, _, url = heapq.heappop(self._heap)
+                self._active += 1
+            try:
+                self.fetch(url)
+            except Exception as e:
+                logger.error(f"Error fetching asset {url}: {e}")
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    if not self._heap and not self._active:
+                        self._idle.notify_all()
@@ -0,0 +1,329 @@
+import os
+import re
+import zlib
+import uuid
+import json
+import shutil
+import struct
+import hashlib
+import logging
+import sqlite3
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    import rjsmin
+    HAVE_RJSMIN = True
+except ImportError:
+    HAVE_RJSMIN = False
+
+logger = logging.getLogger(__name__)
+
+# Kind of optimization by media type
+MEDIA_KINDS = {
+    'text/html': 'html',
+    'text/css': 'css',
+    'application/javascript': 'js',
+    'application/x-javascript': 'js',
+    'text/javascript': 'js',
+    'image/png': 'png',
+    'image/jpeg': 'jpeg',
+}
+
+# Files larger than this are left as they are
+MAX_SIZE = 32 * 1024 * 1024
+
+# Tags whose contents are kept byte for byte when HTML whitespace is collapsed
+HTML_VERBATIM_RE = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.S | re.I)
+# A tag, allowing '>' inside quoted attribute values, or a comment
+HTML_TOKEN_RE = re.compile(r'(<!--.*?-->|<(?:[^>"\']|"[^"]*"|\'[^\']*\')*>)', re.S)
+WHITESPACE_RE = re.compile(r'\s+')
+
+# CSS strings are left alone; comments go, except /*! license */ ones
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/)', re.S)
+CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Text and timestamp chunks, which don't change how an image looks
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+
+def media_kind(content_type):
+    return MEDIA_KINDS.get((content_type or '').split(';')[0].strip().lower())
+
+def available_kinds():
+    """Kinds this installation can optimize: JavaScript needs rjsmin, JPEG the jpegtran tool"""
+    kinds = {'html', 'css', 'png'}
+    if HAVE_RJSMIN:
+        kinds.add('js')
+    if shutil.which('jpegtran'):
+        kinds.add('jpeg')
+    return kinds
+
+def _collapse(text):
+    # A run of whitespace renders as one space; keep a line break if it had one
+    return WHITESPACE_RE.sub(lambda m: '\n' if '\n' in m.group() else ' ', text)
+
+def minify_html(data):
+    """Collapse whitespace between tags and drop comments, leaving tags, pre, textarea, script and style as they are"""
+    text = data.decode('utf-8')
+    parts = []
+    for i, chunk in enumerate(HTML_VERBATIM_RE.split(text)):
+        if i % 3 == 2:
+            continue  # Tag name captured by the split
+        if i % 3 == 1:
+            parts.append(chunk)
+            continue
+        for j, token in enumerate(HTML_TOKEN_RE.split(chunk)):
+            if j % 2 == 0:
+                parts.append(_collapse(token))
+            elif not token.startswith('<!--') or token.startswith('<!--['):
+                # Conditional comments are markup to old browsers
+                parts.append(token)
+    return ''.join(parts).encode('utf-8')
+
+def minify_css(data):
+    """Drop comments and the whitespace CSS doesn't need, outside strings"""
+    text = data.decode('utf-8')
+    parts = []
+    code = []  # Code since the last string or kept comment
+    for i, token in enumerate(CSS_TOKEN_RE.split(text)):
+        if i % 2 == 0:
+            code.append(token)
+        elif token.startswith('/*') and not token.startswith('/*!'):
+            code.append(' ')  # A comment still separates the tokens around it
+        else:
+            parts.append(_minify_css_code(''.join(code)))
+            parts.append(token)
+            code = []
+    parts.append(_minify_css_code(''.join(code)))
+    return ''.join(parts).strip().encode('utf-8')
+
+def _minify_css_code(code):
+    return CSS_PUNCTUATION_RE.sub(r'\1', WHITESPACE_RE.sub(' ', code)).replace(';}', '}')
+
+def minify_js(data):
+    return rjsmin.jsmin(data)
+
+def recompress_png(data):
+    """The same PNG with its image data deflated at the highest level and text chunks dropped"""
+    if not data.startswith(PNG_SIGNATURE):
+        return None
+    chunks = []
+    image_data = []
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b'IDAT':
+            if not image_data:
+                chunks.append((chunk_type, None))  # Where the merged IDAT goes
+            image_data.append(body)
+        elif chunk_type not in PNG_METADATA_CHUNKS:
+            chunks.append((chunk_type, body))
+        if chunk_type == b'IEND':
+            break
+    if not image_data:
+        return None
+
+    raw = zlib.decompress(b''.join(image_data))
+    # The default strategy usually wins, filtered data sometimes does better with Z_FILTERED
+    deflated = min((_deflate(raw, strategy) for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)), key=len)
+    out = [PNG_SIGNATURE]
+    for chunk_type, body in chunks:
+        if body is None:
+            body = deflated
+        out.append(struct.pack('>I4s', len(body), chunk_type))
+        out.append(body)
+        out.append(struct.pack('>I', zlib.crc32(chunk_type + body)))
+    return b''.join(out)
+
+def _deflate(raw, strategy):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+    return compressor.compress(raw) + compressor.flush()
+
+def optimize_jpeg(data):
+    """Huffman tables of a JPEG rebuilt by jpegtran, which leaves the image data untouched"""
+    result = subprocess.run(['jpegtran', '-copy', 'all', '-optimize'], input=data,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    return result.stdout
+
+OPTIMIZERS = {
+    'html': minify_html,
+    'css': minify_css,
+    'js': minify_js,
+    'png': recompress_png,
+    'jpeg': optimize_jpeg,
+}
+
+def _cpu_time():
+    # jpegtran runs in a child process, so its time is counted too
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def _optimize_file(path, kind):
+    """Run in a worker: (optimized body or None, size of the file, CPU seconds spent)"""
+    start = _cpu_time()
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        optimized = OPTIMIZERS[kind](data)
+    except Exception as e:
+        logger.warning(f"Could not optimize {path} as {kind}: {e}")
+        optimized = None
+    return optimized, len(data), _cpu_time() - start
+
+class OptimizedStore:
+    """Post-processed bodies shared by all archives, by the SHA-256 of the original.
+
+    The results table maps an original digest to its smaller body, kept as
+    <first two hex digits>/<sha256> like blobs, or to NULL when the original
+    could not be made smaller, so no file is processed twice.
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'results.sqlite'), check_same_thread=False,
+                                   isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                source_sha256 TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                source_size INTEGER NOT NULL,
+                sha256 TEXT,
+                size INTEGER,
+                cpu_seconds REAL NOT NULL
+            )
+        ''')
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, source_sha256):
+        """(sha256, size, source_size) of the optimized body, with sha256 and size None if
+        there was no gain, or None if the body has not been processed yet"""
+        with self._lock:
+            row = self._db.execute('SELECT sha256, size, source_size FROM results WHERE source_sha256 = ?',
+                                   (source_sha256,)).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, source_sha256, kind, source_size, body, cpu_seconds):
+        """Keep the result for a body; returns what get() will"""
+        digest = size = None
+        if body is not None and len(body) < source_size:
+            digest, size = hashlib.sha256(body).hexdigest(), len(body)
+            path = self.path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(body)
+                # Read-only like blobs: archives hardlink to it
+                os.chmod(temp_path, 0o444)
+                os.replace(temp_path, path)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO results (source_sha256, kind, source_size, sha256, size, cpu_seconds) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (source_sha256, kind, source_size, digest, size, cpu_seconds))
+        return digest, size, source_size
+
+    def materialize(self, digest, dest_path):
+        """Atomically put the optimized body at dest_path, by hardlink where possible"""
+        temp_path = os.path.join(os.path.dirname(dest_path), f".{uuid.uuid4().hex}.link")
+        try:
+            os.link(self.path(digest), temp_path)
+        except OSError:
+            shutil.copyfile(self.path(digest), temp_path)
+        os.replace(temp_path, dest_path)
+
+class PostProcessor:
+    """Minifies and recompresses a finished archive's files in worker processes.
+
+    HTML and CSS are minified, JavaScript too when rjsmin is installed, PNGs
+    are recompressed losslessly and JPEGs get optimized Huffman tables when
+    jpegtran is on the PATH. Results are cached in an OptimizedStore, so a
+    body shared by several archives is processed once. Only files that
+    get smaller are replaced; the manifest keeps the original digest, so
+    snapshots still compare by what was downloaded.
+    """
+    def __init__(self, store, workers=None, kinds=None):
+        self.store = store
+        self.kinds = set(kinds or available_kinds()) & available_kinds()
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # spawn rather than fork: crawler threads hold locks a forked child would inherit
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def run(self, manifest, sidecars=None, observe=None, cancelled=None):
+        """Optimize every saved 200 response of the manifest's archive.
+
+        observe(phase, seconds) gets the CPU time of each file processed;
+        cancelled() is checked between files. Returns per-kind counts:
+        files replaced, bytes before and after, bytes saved, CPU seconds
+        and how many results came from the cache.
+        """
+        by_digest = {}
+        for entry in manifest.entries():
+            kind = media_kind(entry['content_type'])
+            if (kind not in self.kinds or entry['status'] != 200 or not entry['sha256']
+                    or entry['stored_sha256'] or not entry['size'] or entry['size'] > MAX_SIZE):
+                continue
+            by_digest.setdefault(entry['sha256'], (kind, []))[1].append(entry)
+
+        report = {kind: {'files': 0, 'bytes_before': 0, 'bytes_after': 0, 'saved': 0,
+                         'cpu_seconds': 0.0, 'cached': 0} for kind in sorted(self.kinds)}
+        futures = {}
+        for digest, (kind, entries) in by_digest.items():
+            cached = self.store.get(digest)
+            if cached is not None:
+                report[kind]['cached'] += 1
+                self._apply(manifest, entries, kind, cached, sidecars, report)
+                continue
+            path = next((manifest.file_path(entry) for entry in entries
+                         if os.path.isfile(manifest.file_path(entry))), None)
+            if path is not None:
+                futures[self._executor.submit(_optimize_file, path, kind)] = digest
+
+        for future in as_completed(futures):
+            if cancelled is not None and cancelled():
+                for pending in futures:
+                    pending.cancel()
+                break
+            digest = futures[future]
+            kind, entries = by_digest[digest]
+            body, source_size, cpu_seconds = future.result()
+            report[kind]['cpu_seconds'] += cpu_seconds
+            if observe is not None:
+                observe('optimize', cpu_seconds)
+            result = self.store.put(digest, kind, source_size, body, cpu_seconds)
+            self._apply(manifest, entries, kind, result, sidecars, report)
+
+        for counts in report.values():
+            counts['saved'] = counts['bytes_before'] - counts['bytes_after']
+            counts['cpu_seconds'] = round(counts['cpu_seconds'], 3)
+        manifest.set_meta('postprocess', json.dumps(report))
+        return report
+
+    def _apply(self, manifest, entries, kind, result, sidecars, report):
+        """Put the optimized body in place of every file of entries"""
+        digest, size, source_size = result
+        if digest is None:
+            return
+        for entry in entries:
+            file_path = manifest.file_path(entry)
+            if not os.path.isfile(file_path):
+                continue
+            self.store.materialize(digest, file_path)
+            manifest.set_stored(entry['url'], digest, size)
+            if sidecars is not None:
+                sidecars.add(file_path, digest, entry['content_type'])
+            counts = report[kind]
+            counts['files'] += 1
+            counts['bytes_before'] += source_size
+            counts['bytes_after'] += size
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
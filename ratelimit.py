@@ -0,0 +1,204 @@
+import time
+import logging
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.robotparser import RobotFileParser
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean "slow down": the host pauses for Retry-After and the request is retried
+THROTTLE_STATUSES = (429, 503)
+
+# What robots.txt is used for: nothing, only its Crawl-delay/Request-rate,
+# or that plus skipping disallowed URLs
+ROBOTS_POLICIES = ('ignore', 'delay', 'obey')
+
+# Requests per second are paced like TCP congestion control: until the host
+# first shows trouble the rate grows by RAMP_UP per healthy response, after
+# that by RATE_STEP, so it creeps back towards the rate that was too much.
+# Trouble halves the rate, at most once per cooldown.
+RAMP_UP = 1.1
+RATE_STEP = 0.5
+BACK_OFF = 0.5
+BACKOFF_COOLDOWN = 1.0
+MIN_RATE = 1 / 30
+# Rates this high are treated as no throttling at all
+UNLIMITED_RATE = 1000.0
+# Recent send times used to estimate the rate of an unthrottled host
+RATE_WINDOW = 32
+
+# Health signals: the share of 5xx/429/failed requests (smoothed), and how
+# far recent latency may grow over the host's baseline before backing off
+ERROR_ALPHA = 0.1
+ERROR_THRESHOLD = 0.25
+LATENCY_FAST_ALPHA = 0.3
+LATENCY_SLOW_ALPHA = 0.02
+LATENCY_FACTOR = 2.0
+LATENCY_MIN_GROWTH = 0.05
+LATENCY_WARMUP = 10
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def load_robots(http, root_url):
+    """Parsed robots.txt of the site at root_url; missing or unreadable files allow everything.
+
+    urllib.robotparser only reads whole-second Crawl-delay values.
+    """
+    robots = RobotFileParser(root_url + 'robots.txt')
+    try:
+        response = http.get(robots.url)
+        if response.status_code == 200:
+            robots.parse(response.text.splitlines())
+        else:
+            robots.allow_all = True
+    except Exception as e:
+        logger.warning(f"Could not read {robots.url}: {e}")
+        robots.allow_all = True
+    return robots
+
+class HostLimiter:
+    """Caps concurrent requests to one host and paces them with an adaptive token bucket.
+
+    Tokens refill at `rate` per second, up to `burst`. The rate starts at one
+    request per delay (unlimited for delay 0), grows while the host answers
+    quickly and cleanly, and halves when it returns 429/503, when its error
+    rate climbs or its latency grows well past its baseline. Retry-After
+    pauses the host outright, and robots.txt's Crawl-delay caps the rate.
+    """
+    def __init__(self, host, max_connections, delay, burst=1):
+        self.host = host
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self.burst = max(1, burst)
+        self.rate = 1 / delay if delay else None
+        self.max_rate = None
+        self.robots = None
+        self._backed_off = False
+        self._tokens = float(self.burst)
+        self._refilled = time.monotonic()
+        self._sent = deque(maxlen=RATE_WINDOW)
+        self._paused_until = 0.0
+        self._last_backoff = 0.0
+        self._error_rate = 0.0
+        self._latency_fast = None
+        self._latency_slow = None
+        self._samples = 0
+        self.throttled = 0  # 429/503 responses seen
+
+    def __enter__(self):
+        self._slots.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._slots.release()
+
+    def set_robots(self, robots, user_agent):
+        """Apply robots.txt: its Crawl-delay or Request-rate caps the rate"""
+        with self._lock:
+            self.robots = robots
+            delay = robots.crawl_delay(user_agent)
+            rate = robots.request_rate(user_agent)
+            if rate is not None and rate.requests:
+                delay = max(float(delay or 0), rate.seconds / rate.requests)
+            if delay:
+                # A crawl delay spaces requests out, so no bursts either
+                self.max_rate = 1 / float(delay)
+                self.rate = min(self.rate or self.max_rate, self.max_rate)
+                self.burst = 1
+                self._tokens = min(self._tokens, 1.0)
+
+    def wait_turn(self):
+        """Block until the host may be sent another request"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait_for = self._paused_until - now
+                if wait_for <= 0:
+                    if self.rate is None:
+                        self._sent.append(now)
+                        return
+                    self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+                    self._refilled = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self._sent.append(now)
+                        return
+                    wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+    def record(self, status, latency, retry_after=None):
+        """Adapt the pace to one response; status None is a request that failed outright"""
+        with self._lock:
+            failed = status is None or status >= 500 or status == 429
+            self._error_rate += ERROR_ALPHA * (failed - self._error_rate)
+
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                pause = parse_retry_after(retry_after)
+                if pause:
+                    self._paused_until = max(self._paused_until, time.monotonic() + min(pause, 1 / MIN_RATE))
+                self._back_off()
+                return
+
+            if status is not None:
+                if self._latency_fast is None:
+                    self._latency_fast = self._latency_slow = latency
+                else:
+                    self._latency_fast += LATENCY_FAST_ALPHA * (latency - self._latency_fast)
+                    self._latency_slow += LATENCY_SLOW_ALPHA * (latency - self._latency_slow)
+                self._samples += 1
+
+            slow = (self._samples >= LATENCY_WARMUP
+                    and self._latency_fast > LATENCY_FACTOR * self._latency_slow
+                    and self._latency_fast - self._latency_slow > LATENCY_MIN_GROWTH)
+            if self._error_rate > ERROR_THRESHOLD or slow:
+                self._back_off()
+            elif not failed:
+                self._ramp_up()
+
+    def _observed_rate(self):
+        if len(self._sent) < 2 or self._sent[-1] == self._sent[0]:
+            return None
+        return (len(self._sent) - 1) / (self._sent[-1] - self._sent[0])
+
+    def _back_off(self):
+        now = time.monotonic()
+        if now - self._last_backoff < max(BACKOFF_COOLDOWN, 1 / self.rate if self.rate else 0):
+            return
+        self._last_backoff = now
+        current = self.rate or self._observed_rate() or 1.0
+        self.rate = max(MIN_RATE, min(current, self.max_rate or current) * BACK_OFF)
+        self._backed_off = True
+        self._tokens = min(self._tokens, 1.0)
+        logger.info(f"Slowing down to {self.rate:.2f} requests per second to {self.host}")
+
+    def _ramp_up(self):
+        if self.rate is None:
+            return
+        rate = self.rate + RATE_STEP if self._backed_off else self.rate * RAMP_UP
+        if self.max_rate is not None:
+            self.rate = min(rate, self.max_rate)
+        else:
+            self.rate = None if rate >= UNLIMITED_RATE else rate
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests_per_second': round(self.rate, 2) if self.rate else None,
+                'max_requests_per_second': round(self.max_rate, 2) if self.max_rate else None,
+                'error_rate': round(self._error_rate, 3),
+                'latency': round(self._latency_fast, 4) if self._latency_fast is not None else None,
+                'throttled': self.throttled,
+                'paused': self._paused_until > time.monotonic(),
+            }
@@ -0,0 +1,184 @@
+import re
+import os
+import time
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup
+from requests.compat import chardet
+
+from pipeline import asset_kind
+from searchindex import page_text
+from urlnorm import PathMapper, DEFAULT_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Tags whose links are rewritten and collected by PageRewriter.rewrite_soup
+REWRITE_TAGS = ['a', 'link', 'script', 'img', 'style']
+
+CSS_URL_RE = re.compile(r'url\([\'"]?([^\'"()]+)[\'"]?\)')
+
+# Rewriters a pool worker keeps, one per crawl it has served pages for
+WORKER_REWRITERS = 8
+
+def decode_html(content, encoding):
+    """Text of a page body, decoded the way requests' Response.text does it"""
+    if isinstance(content, str):
+        return content
+    if not content:
+        return ''
+    if encoding is None:
+        encoding = chardet.detect(content)['encoding']
+    try:
+        return str(content, encoding, errors='replace')
+    except (LookupError, TypeError):
+        return str(content, errors='replace')
+
+class PageRewriter:
+    """Parses a page, points its links at local files and collects the URLs it references.
+
+    Holds only what the rewrite needs (no client, no frontier), so the same
+    work runs on the crawler's threads or in a ParsePool worker process.
+    """
+    def __init__(self, output_dir, domain, max_depth, parser='html.parser',
+                 cache_size=DEFAULT_CACHE_SIZE, paths=None):
+        self.output_dir = output_dir
+        self.domain = domain
+        self.max_depth = max_depth
+        self.parser = parser
+        self.cache_size = cache_size
+        self.paths = paths or PathMapper(output_dir, cache_size)
+
+    @property
+    def config(self):
+        """Arguments that rebuild this rewriter in another process"""
+        return (self.output_dir, self.domain, self.max_depth, self.parser, self.cache_size)
+
+    def rewrite(self, content, encoding, url, depth, serialize=True, extract_text=False):
+        """Rewrite one page given as bytes (decoded with encoding) or text.
+
+        Returns (html, links, assets, text, timings): the rewritten page, or
+        None unless serialize, what rewrite_soup() collected, the page's
+        (title, text) for the search index if extract_text, and the seconds
+        spent on the 'parse', 'rewrite' and 'index' phases.
+        """
+        start = time.perf_counter()
+        soup = BeautifulSoup(decode_html(content, encoding), self.parser)
+        parsed = time.perf_counter()
+        links, assets = self.rewrite_soup(soup, url, depth)
+        html = str(soup) if serialize else None
+        rewritten = time.perf_counter()
+        timings = {'parse': parsed - start, 'rewrite': rewritten - parsed}
+        text = None
+        if extract_text:
+            text = page_text(soup)
+            timings['index'] = time.perf_counter() - rewritten
+        return html, links, assets, text, timings
+
+    def rewrite_soup(self, soup, current_url, depth):
+        """Point links at local files and collect URLs in a single pass over the tree.
+
+        Returns (links, assets): same-domain pages to crawl, which are only
+        collected below max_depth, and (url, kind) of every asset referenced.
+        """
+        follow_links = depth < self.max_depth
+        links = []
+        assets = []
+
+        page_netloc = self.paths.locate(current_url)[0]
+        page_root = f"{urlparse(current_url).scheme}://{page_netloc}/"
+        resolved_values = {}  # Pages repeat the same navigation links many times
+
+        for tag in soup.find_all(REWRITE_TAGS):
+            name = tag.name
+
+            if name == 'style':
+                css_content = tag.string
+                if css_content:
+                    for url in CSS_URL_RE.findall(css_content):
+                        absolute_url = urljoin(current_url, url)
+                        assets.append((absolute_url, asset_kind(absolute_url)))
+                continue
+
+            if name == 'link' and 'stylesheet' not in (tag.get('rel') or []):
+                continue
+
+            attr = 'href' if name in ('a', 'link') else 'src'
+            value = tag.get(attr)
+            if value is None:
+                continue
+
+            # Skip fragment links and JavaScript
+            if name == 'a' and (value.startswith('#') or value.startswith('javascript:')):
+                continue
+
+            resolved = resolved_values.get(value)
+            if resolved is None:
+                absolute_url = urljoin(current_url, value)
+                netloc, site_path = self.paths.locate(absolute_url)
+                relative_path = self.paths.relative_path(current_url, absolute_url)
+                # Queued URLs follow the rewritten link, i.e. the local file it maps to
+                if netloc == page_netloc:
+                    local_url = page_root + site_path
+                else:
+                    local_url = absolute_url
+                resolved = resolved_values[value] = (absolute_url, netloc, relative_path, local_url)
+            absolute_url, netloc, relative_path, local_url = resolved
+
+            if name == 'a' and netloc != self.domain:
+                continue
+
+            tag[attr] = relative_path
+            # Add data attribute to track 404 links
+            tag['data-original-url'] = absolute_url
+
+            if name == 'a':
+                if follow_links:
+                    links.append(local_url)
+            elif name == 'link':
+                assets.append((local_url, 'stylesheet'))
+            elif name == 'script':
+                assets.append((local_url, 'script'))
+            else:
+                assets.append((local_url, 'image'))
+
+        return links, assets
+
+# Per-process rewriters of a pool worker, by PageRewriter.config
+_worker_rewriters = OrderedDict()
+
+def _rewrite_in_worker(config, content, encoding, url, depth, serialize, extract_text):
+    rewriter = _worker_rewriters.get(config)
+    if rewriter is None:
+        rewriter = _worker_rewriters[config] = PageRewriter(*config)
+        if len(_worker_rewriters) > WORKER_REWRITERS:
+            _worker_rewriters.popitem(last=False)
+    else:
+        _worker_rewriters.move_to_end(config)
+    return rewriter.rewrite(content, encoding, url, depth, serialize, extract_text)
+
+class ParsePool:
+    """Worker processes that run PageRewriter.rewrite, so parsing uses every core.
+
+    BeautifulSoup holds the GIL, so crawler threads alone parse one page at a
+    time. Each call ships the raw body and a few short strings to a worker and
+    gets back the rewritten HTML with the links, assets and text found; the parse
+    tree never crosses the process boundary. Workers keep their rewriters and
+    path caches between calls, and one pool can serve several crawls.
+    """
+    def __init__(self, workers=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # spawn rather than fork: crawler threads hold locks a forked child would inherit
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def rewrite(self, rewriter, content, encoding, url, depth, serialize=True, extract_text=False):
+        """PageRewriter.rewrite run by a worker with the configuration of rewriter"""
+        future = self._executor.submit(_rewrite_in_worker, rewriter.config, content, encoding,
+                                       url, depth, serialize, extract_text)
+        return future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
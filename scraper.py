@@ -1,90 +1,713 @@
 import os
 import time
+import json
+import uuid
+import hashlib
 import logging
-import requests
-from urllib.parse import urlparse, urljoin, unquote
-from bs4 import BeautifulSoup
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlparse, urljoin
 import shutil
+import tempfile
 from urllib.request import Request, urlopen
 
+from frontier import Frontier, SqliteFrontier
+from http_client import HttpClient
+from metrics import CrawlMetrics, PROCESS_METRICS
+from pipeline import AssetPipeline
+from ratelimit import HostLimiter, THROTTLE_STATUSES, load_robots
+from rewrite import PageRewriter, ParsePool, CSS_URL_RE
+from sitemap import read_sitemaps
+from urlnorm import UrlNormalizer, PathMapper, DEFAULT_CACHE_SIZE
+from manifest import Manifest, CHANGE_NEW, CHANGE_CHANGED, CHANGE_UNCHANGED, CHANGE_REMOVED
+from warc import WarcWriter
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+try:
+    import lxml  # noqa: F401
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+def pick_parser(parser):
+    """Resolve a BeautifulSoup backend name, preferring lxml for 'auto'"""
+    if parser == 'auto':
+        return 'lxml' if HAVE_LXML else 'html.parser'
+    if parser == 'lxml' and not HAVE_LXML:
+        logger.warning("lxml is not installed, falling back to html.parser")
+        return 'html.parser'
+    return parser
+
+# Bodies at most this large are drained so their connection can be reused
+DRAIN_LIMIT = 64 * 1024
+
+# Bodies up to this size are buffered in memory on their way into a WARC
+SPOOL_LIMIT = 1024 * 1024
+
+def hash_file(path):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FileTooLargeError(Exception):
+    """Raised when a download exceeds the scraper's per-file size cap"""
+
 class WebsiteScraper:
-    def __init__(self, base_url, output_dir, max_depth=1, download_assets=True):
+    def __init__(self, base_url, output_dir, max_depth=1, download_assets=True,
+                 concurrency=1, per_host_limit=4, delay=0.1, pool_size=None, retries=3,
+                 max_file_size=None, chunk_size=64 * 1024, parser='html.parser', state_path=None,
+                 manifest_path=None, previous_manifest_path=None, blob_store=None, archive_format='files',
+                 rewrite_rules=None, query_policy='drop', url_cache_size=DEFAULT_CACHE_SIZE,
+                 bloom_capacity=None, asset_workers=None, robots='delay', use_sitemaps=False,
+                 parse_workers=0, parse_pool=None, frontier=None, sidecars=None, search_index=None,
+                 postprocessor=None, keep_visited_urls=False):
         self.base_url = base_url
         self.output_dir = output_dir
         self.max_depth = max_depth
         self.download_assets = download_assets
-        self.visited_urls = set()
-        self.to_visit = [(base_url, 0)]  # (url, depth)
+        self.concurrency = max(1, concurrency)
+        self.per_host_limit = max(1, per_host_limit)
+        self.asset_workers = max(1, asset_workers or max(2, self.concurrency))
+        self.delay = delay  # Starting interval between requests per host, adapted as the host responds
+        self.retries = retries
+        self.robots = robots  # 'ignore', 'delay' (honor Crawl-delay) or 'obey' (also skip disallowed URLs)
+        self.use_sitemaps = use_sitemaps  # Seed the frontier with the pages listed in the site's sitemaps
+        self.sitemap_urls = 0
+        self.max_file_size = max_file_size  # in bytes, None for no cap
+        self.chunk_size = chunk_size
+        self.parser = pick_parser(parser)  # 'html.parser', 'lxml' or 'auto'
+        self.parse_workers = parse_workers
         self.progress = 0
         self.files_downloaded = 0
-        self.total_size = 0  # in bytes
+        self.total_size = 0  # in bytes, as saved in this archive
+        self.physical_size = 0  # in bytes newly added to the shared blob store
         self.errors = []
         
+        # Optional content-addressed store shared with other archives
+        self.blob_store = blob_store
+        
+        # Optional store of precompressed copies of saved files, for serving them
+        self.sidecars = sidecars
+        
+        # Optional TaskIndexer (SearchIndex.writer) that the text of every page is fed to
+        self.search_index = search_index
+        
+        # Optional PostProcessor that minifies and recompresses the files once the crawl is done
+        self.postprocessor = postprocessor
+        self.optimization = None
+        
+        # Canonical URLs (rewrite_rules default to the Webflow ones) and the
+        # files they map to, both memoized
+        self.urls = UrlNormalizer(rewrite_rules, query_policy, url_cache_size)
+        self.paths = PathMapper(output_dir, url_cache_size)
+        
+        # Queue and visited set, kept in a SQLite file when state_path is given
+        # so an interrupted crawl resumes where it stopped. With bloom_capacity
+        # the file also answers dedup lookups, behind a Bloom filter. A
+        # frontier passed in, such as a DistributedFrontier, replaces both.
+        # The in-memory one only lists visited URLs with keep_visited_urls.
+        if frontier is not None:
+            if frontier.shared and archive_format != 'files':
+                raise ValueError("Crawls shared by several workers can only write the 'files' format")
+            self.frontier = frontier
+        elif state_path:
+            self.frontier = SqliteFrontier(state_path, bloom_capacity)
+        else:
+            self.frontier = Frontier(keep_urls=keep_visited_urls)
+        self._pages_done = 0
+        self._pages_in_flight = 0
+        if self.frontier.resumed:
+            self.files_downloaded, self.total_size, self.physical_size = self.frontier.file_stats()
+            self.errors = self.frontier.errors()
+            self._pages_done = self.frontier.completed_pages()
+            known = self._pages_done + len(self.frontier)
+            self.progress = self._pages_done / known * 100 if known else 0
+            logger.info(f"Resuming crawl of {base_url} with {len(self.frontier)} queued URLs")
+        elif not len(self.frontier):
+            self.frontier.push(self.urls.clean(base_url), 0)
+        
+        # Index of every saved URL, and optionally the one from the previous
+        # snapshot of this site for incremental re-archiving
+        self.manifest = Manifest(manifest_path, root=output_dir)
+        self.previous = None
+        if previous_manifest_path and os.path.exists(previous_manifest_path):
+            self.previous = Manifest(previous_manifest_path)
+        self.changes = None
+        
+        # Shared state is touched by several worker threads in concurrent mode
+        self._lock = threading.Lock()
+        self._host_limiters = {}
+        self._robots_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        
+        # Per-phase timings and throughput, also added to the process-wide totals
+        self.metrics = CrawlMetrics(parent=PROCESS_METRICS)
+        
+        # One pooled keep-alive client for every page and asset request
+        self.http = HttpClient(pool_size=pool_size or max(self.concurrency + self.asset_workers, self.per_host_limit),
+                               retries=retries, observer=self.metrics.observe)
+        
         # Parse and save the domain for later use
-        parsed_url = urlparse(base_url)
+        parsed_url = urlparse(self.urls.clean(base_url))
         self.domain = parsed_url.netloc
         self.scheme = parsed_url.scheme
         
+        # Pages are parsed and rewritten on the crawler threads, or in worker
+        # processes: those of a shared parse_pool, or parse_workers of its own
+        self.rewriter = PageRewriter(output_dir, self.domain, max_depth, self.parser, url_cache_size, self.paths)
+        self.parse_pool = parse_pool
+        self._owns_parse_pool = False
+        
         # Create the base directory
         os.makedirs(output_dir, exist_ok=True)
+        
+        # 'files' saves a browsable tree of rewritten pages; 'warc' and 'wacz'
+        # append the original responses to one WARC file in output_dir instead
+        self.archive_format = archive_format
+        self.warc = WarcWriter(output_dir, base_url) if archive_format in ('warc', 'wacz') else None
+        
+        # Assets are fetched by their own workers, started with the crawl
+        self.assets = None
     
     def start_scraping(self):
         """Start the scraping process"""
+        self.metrics.start()
         try:
-            while self.to_visit:
-                url, depth = self.to_visit.pop(0)
-                
-                if url in self.visited_urls:
-                    continue
-                
-                self.visited_urls.add(url)
-                logger.info(f"Processing URL: {url} at depth {depth}")
-                
-                try:
-                    self.process_url(url, depth)
-                except Exception as e:
-                    logger.error(f"Error processing URL {url}: {e}")
-                    self.errors.append(f"Failed to process {url}: {str(e)}")
-                
-                # Update progress
-                self.progress = len(self.visited_urls) / (len(self.visited_urls) + len(self.to_visit)) * 100
-                time.sleep(0.1)  # Small delay to avoid overwhelming the server
-                
+            if self.download_assets:
+                self.assets = AssetPipeline(self._download_asset, self.asset_workers)
+                for url in self.frontier.unfinished_assets():
+                    self.assets.submit(url)
+            
+            if self.parse_pool is None and self.parse_workers:
+                self.parse_pool = ParsePool(self.parse_workers)
+                self._owns_parse_pool = True
+            
+            if self.use_sitemaps and self.max_depth > 0 and not self.frontier.resumed:
+                self._seed_from_sitemaps()
+            
+            if self.concurrency > 1:
+                self._crawl_concurrently()
+            else:
+                while not self.cancelled:
+                    item = self.frontier.pop()
+                    if item is None:
+                        break
+                    
+                    self._crawl_url(*item)
+            
+            if self.assets is not None:
+                # A shared frontier hands over the assets of workers that stopped meanwhile
+                for url in self.frontier.unfinished_assets():
+                    self.assets.submit(url)
+                self.assets.join()
+            
+            if self.cancelled:
+                logger.info("Scraping cancelled")
+                return
+            
+            if self.previous is not None:
+                self.changes = self.change_report()
+                logger.info(f"Changes since previous snapshot: {self.changes}")
+            
+            # Directory digests let later snapshots be diffed against this one
+            self.manifest.build_tree()
+            
+            if self.postprocessor is not None and self.warc is None:
+                self.optimization = self.postprocessor.run(self.manifest, self.sidecars, self.metrics.observe,
+                                                           lambda: self.cancelled)
+                logger.info(f"Post-processing: {self.optimization}")
+            
+            if self.warc is not None:
+                archive_path = self.warc.finish(wacz=self.archive_format == 'wacz', title=self.base_url)
+                logger.info(f"Archive written to {archive_path}")
+            
+            self.progress = 100
             logger.info("Scraping completed!")
         except Exception as e:
             logger.error(f"Error in scraping process: {e}")
-            self.errors.append(f"Scraping error: {str(e)}")
+            self._record_error(f"Scraping error: {str(e)}")
+        finally:
+            if self.assets is not None:
+                self.assets.close()
+            if self._owns_parse_pool:
+                self.parse_pool.close()
+            if self.search_index is not None:
+                self._flush_search_index()
+            self.metrics.stop()
+            logger.info(f"Connection stats: {self.http.connection_stats()}")
+            logger.info(f"Crawl metrics: {self.metrics.summary(len(self.frontier))}")
+            self.http.close()
+            self.frontier.close()
+            if self.manifest.path is not None:
+                # An in-memory manifest would be lost; it stays readable for visited_urls
+                self.manifest.close()
+            if self.previous is not None:
+                self.previous.close()
+            if self.warc is not None:
+                self.warc.close()
+    
+    def _flush_search_index(self):
+        try:
+            with self.metrics.timed('index'):
+                self.search_index.flush()
+        except Exception as e:
+            logger.error(f"Error writing the search index: {e}")
+    
+    def _seed_from_sitemaps(self):
+        """Queue the pages listed in the site's sitemaps one level below base_url.
+        
+        Sitemaps are found through robots.txt, falling back to /sitemap.xml.
+        Their priority and lastmod order the pages within each depth.
+        """
+        root = f"{self.scheme}://{self.domain}/"
+        robots = self._host_limiter(root).robots or load_robots(self.http, root)
+        sitemaps = robots.site_maps() or [root + 'sitemap.xml']
+        
+        for entry in read_sitemaps(self._fetch, self._release, sitemaps):
+            if self.cancelled:
+                break
+            netloc, site_path = self.paths.locate(entry.url)
+            if netloc != self.domain:
+                continue
+            # Queued as the local file it maps to, like links found on pages
+            url = self.urls.clean(f"{self.scheme}://{netloc}/{site_path}")
+            if self.frontier.push(url, 1, entry.priority, entry.lastmod):
+                self.sitemap_urls += 1
+        logger.info(f"Queued {self.sitemap_urls} pages from sitemaps")
+    
+    def _crawl_concurrently(self):
+        """Crawl with up to `concurrency` fetches in flight.
+        
+        The queue is drained one depth level at a time, so every URL is fetched
+        at its shallowest depth exactly as the serial crawler would.
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='crawl') as pool:
+            while not self.cancelled:
+                level = self.frontier.next_depth()
+                if level is None:
+                    break
+                
+                futures = []
+                while True:
+                    item = self.frontier.pop(max_depth=level)
+                    if item is None:
+                        break
+                    futures.append(pool.submit(self._crawl_url, *item))
+                wait(futures)
+    
+    def cancel(self):
+        """Ask a running crawl to stop after the pages already being fetched.
+        
+        URLs that were queued but not processed stay unfinished in the
+        frontier, so a persistent crawl can still be resumed later.
+        """
+        self._cancelled.set()
+        self.frontier.cancel()
+    
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+    
+    def stats(self):
+        """Snapshot of the crawl counters, as reported by /status"""
+        with self._lock:
+            return {
+                'progress': self.progress,
+                'files_downloaded': self.files_downloaded,
+                'total_size': self.total_size,
+                'physical_size': self.physical_size,
+                'error_count': len(self.errors),
+                'connections': self.http.connection_stats(),
+                'changes': self.changes,
+                'optimization': self.optimization,
+                'metrics': self.metrics.summary(len(self.frontier)),
+                'caches': self.cache_stats(),
+                'frontier': self.frontier.memory_stats(),
+                'assets_queued': len(self.assets) if self.assets is not None else 0,
+                'rate_limits': {host: limiter.stats() for host, limiter in self._host_limiters.items()},
+                'sitemap_urls': self.sitemap_urls,
+            }
+    
+    def cache_stats(self):
+        """Hit rates of the URL normalization and path mapping caches"""
+        return {**self.urls.cache_stats(), **self.paths.cache_stats()}
+    
+    def _crawl_url(self, url, depth):
+        """Process a single queued URL and update progress"""
+        if self.cancelled:
+            return
+        
+        logger.info(f"Processing URL: {url} at depth {depth}")
+        
+        with self._lock:
+            self._pages_in_flight += 1
+        with self.metrics.fetching():
+            try:
+                self.process_url(url, depth)
+            except Exception as e:
+                logger.error(f"Error processing URL {url}: {e}")
+                self._record_error(f"Failed to process {url}: {str(e)}", url)
+        
+        self.frontier.complete(url)
+        self.metrics.count('pages')
+        self._update_progress()
+    
+    def _update_progress(self):
+        """Set progress to the share of known pages that are done.
+        
+        Assets are left out as they never enter the queue, and the value
+        never moves backwards when new links are found; it only reaches 100
+        when the crawl ends.
+        """
+        with self._lock:
+            self._pages_in_flight -= 1
+            self._pages_done += 1
+            done = self._pages_done
+            progress = done / (done + self._pages_in_flight + len(self.frontier)) * 100
+            self.progress = min(99, max(self.progress, progress))
+    
+    @property
+    def visited_urls(self):
+        """URLs claimed by the crawl; without a list of them, the URLs saved to the manifest"""
+        urls = self.frontier.visited_urls()
+        if urls is None:
+            urls = set(self.manifest.urls())
+        return urls
+    
+    def _count_file(self, size, url, physical_size):
+        self.frontier.record_file(url, size, physical_size)
+        with self._lock:
+            self.files_downloaded += 1
+            self.total_size += size
+            self.physical_size += physical_size
+    
+    def _record_file(self, size, url, file_path, response=None, status=None, content_type=None, digest=None):
+        """Count a saved file and add it to the manifest.
+        
+        Successful downloads pass their response; placeholders pass the status
+        they stand in for (None after an exception) and their own content type.
+        """
+        etag = last_modified = None
+        if response is not None:
+            status = response.status_code
+            content_type = response.headers.get('Content-Type')
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        if digest is None:
+            digest = hash_file(file_path)
+        
+        change, previous = self._classify_change(url, digest)
+        stored_sha256 = stored_size = None
+        if change == CHANGE_UNCHANGED:
+            # Share storage with the identical file from the previous snapshot
+            if self.blob_store is None and os.path.exists(self.previous.file_path(previous)):
+                self._link_previous(previous, file_path)
+                # Which may have been post-processed since
+                stored_sha256, stored_size = previous['stored_sha256'], previous['stored_size']
+        
+        if self.blob_store is not None:
+            physical_size = self.blob_store.store(file_path, digest)
+        else:
+            physical_size = size
+        self._add_sidecars(file_path, stored_sha256 or digest, content_type)
+        
+        self.manifest.record(url, os.path.relpath(file_path, self.output_dir), status, content_type,
+                             size, digest, etag, last_modified, change, stored_sha256, stored_size)
+        self._count_file(size, url, physical_size)
+    
+    def _classify_change(self, url, digest):
+        """How url compares with the previous snapshot: (change, previous entry)"""
+        if self.previous is None:
+            return None, None
+        previous = self.previous.get(url)
+        if previous is None:
+            return CHANGE_NEW, None
+        if previous['sha256'] == digest:
+            return CHANGE_UNCHANGED, previous
+        return CHANGE_CHANGED, previous
+    
+    def _previous_entry(self, url):
+        """The previous snapshot's entry for url, if it can stand in for a fresh download"""
+        # A WARC keeps every response it was sent, so it never skips a body on a 304
+        if self.previous is None or self.warc is not None:
+            return None
+        entry = self.previous.get(url)
+        if entry is None or entry['status'] != 200 or not (entry['etag'] or entry['last_modified']):
+            return None
+        if not os.path.exists(self.previous.file_path(entry)):
+            return None
+        return entry
+    
+    def _conditional_headers(self, previous):
+        if previous is None:
+            return None
+        headers = {}
+        if previous['etag']:
+            headers['If-None-Match'] = previous['etag']
+        if previous['last_modified']:
+            headers['If-Modified-Since'] = previous['last_modified']
+        return headers
+    
+    def _link_previous(self, previous, file_path):
+        """Put the previous snapshot's copy of a file at file_path, by hardlink where possible"""
+        source = self.previous.file_path(previous)
+        temp_path = os.path.join(os.path.dirname(file_path), f".{uuid.uuid4().hex}.link")
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copy2(source, temp_path)
+        os.replace(temp_path, file_path)
+    
+    def _reuse_previous(self, previous, url, file_path, response):
+        """Keep the previous snapshot's file for a URL the server reported unchanged (304)"""
+        stored_sha256 = stored_size = None
+        if self.blob_store is not None and self.blob_store.contains(previous['sha256']):
+            self.blob_store.materialize(previous['sha256'], file_path)
+        else:
+            self._link_previous(previous, file_path)
+            stored_sha256, stored_size = previous['stored_sha256'], previous['stored_size']
+        self._add_sidecars(file_path, stored_sha256 or previous['sha256'], previous['content_type'])
+        self.manifest.record(url, os.path.relpath(file_path, self.output_dir), previous['status'],
+                             previous['content_type'], previous['size'], previous['sha256'],
+                             response.headers.get('ETag') or previous['etag'],
+                             response.headers.get('Last-Modified') or previous['last_modified'],
+                             CHANGE_UNCHANGED, stored_sha256, stored_size)
+        self._count_file(previous['size'], url, 0)
+    
+    def _add_sidecars(self, file_path, digest, content_type):
+        if self.sidecars is not None:
+            with self.metrics.timed('compress'):
+                self.sidecars.add(file_path, digest, content_type)
+    
+    def change_report(self):
+        """Count new, changed, unchanged and removed URLs against the previous snapshot"""
+        report = {CHANGE_NEW: 0, CHANGE_CHANGED: 0, CHANGE_UNCHANGED: 0}
+        report.update(self.manifest.change_counts())
+        report[CHANGE_REMOVED] = len(set(self.previous.urls()) - set(self.manifest.urls()))
+        self.manifest.set_meta('changes', json.dumps(report))
+        return report
+    
+    def _record_error(self, message, url=None):
+        self.frontier.add_error(message, url)
+        with self._lock:
+            self.errors.append(message)
+    
+    def _host_limiter(self, url):
+        """The rate limiter of a URL's host, reading its robots.txt before the first request"""
+        parsed = urlparse(url)
+        with self._lock:
+            limiter = self._host_limiters.get(parsed.netloc)
+        if limiter is not None:
+            return limiter
+        
+        with self._robots_lock:
+            with self._lock:
+                limiter = self._host_limiters.get(parsed.netloc)
+            if limiter is None:
+                limiter = HostLimiter(parsed.netloc, self.per_host_limit, self.delay, burst=self.per_host_limit)
+                if self.robots != 'ignore':
+                    limiter.set_robots(load_robots(self.http, f"{parsed.scheme}://{parsed.netloc}/"),
+                                       self.http.user_agent)
+                with self._lock:
+                    self._host_limiters[parsed.netloc] = limiter
+        return limiter
+    
+    def _allowed(self, url):
+        """Whether robots.txt lets us fetch url, when robots is 'obey'"""
+        if self.robots != 'obey':
+            return True
+        return self._host_limiter(url).robots.can_fetch(self.http.user_agent, url)
+    
+    def _fetch(self, url, headers=None):
+        """GET a URL at its host's pace while holding one of its connection slots.
+        
+        429 and 503 responses slow the host down and are retried after its
+        Retry-After. The body is streamed: callers must read it or pass the
+        response to _release or _save_stream.
+        """
+        limiter = self._host_limiter(url)
+        for attempt in range(self.retries + 1):
+            with limiter:
+                limiter.wait_turn()
+                start = time.perf_counter()
+                try:
+                    response = self.http.get(url, stream=True, headers=headers)
+                except Exception:
+                    limiter.record(None, time.perf_counter() - start)
+                    raise
+                limiter.record(response.status_code, time.perf_counter() - start,
+                               response.headers.get('Retry-After'))
+            if response.status_code not in THROTTLE_STATUSES or attempt == self.retries:
+                return response
+            logger.info(f"{url} answered {response.status_code}, retrying")
+            self._release(response)
+    
+    def _release(self, response):
+        """Discard an unread body, keeping the connection alive when it is small"""
+        length = response.headers.get('Content-Length')
+        if response.status_code in (204, 304) or (length and length.isdigit() and int(length) <= DRAIN_LIMIT):
+            response.content
+        response.close()
+    
+    def _write_text(self, file_path, text):
+        """Write text to file_path through a temp file and rename, returning the bytes written.
+        
+        Replacing rather than truncating matters once files are hardlinked:
+        writing in place would change every archive sharing the file.
+        """
+        with self.metrics.timed('write'):
+            return self._write_text_file(file_path, text)
+    
+    def _write_text_file(self, file_path, text):
+        data = text.encode('utf-8')
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, file_path)
+            return len(data)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+    
+    def _read_stream(self, response, f, observe=True):
+        """Copy a response body to the file object f in chunks, enforcing max_file_size.
+        
+        Unless observe is False the transfer is timed as 'download', less the
+        time spent writing to f, which is returned for the caller to add to
+        its 'write' time. Returns (size, sha256 hex digest, write seconds).
+        """
+        length = response.headers.get('Content-Length')
+        if self.max_file_size and length and length.isdigit() and int(length) > self.max_file_size:
+            raise FileTooLargeError(f"{length} bytes exceeds the {self.max_file_size} byte limit")
+        
+        size = 0
+        digest = hashlib.sha256()
+        write_time = 0.0
+        start = time.perf_counter()
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            size += len(chunk)
+            if self.max_file_size and size > self.max_file_size:
+                raise FileTooLargeError(f"download exceeds the {self.max_file_size} byte limit")
+            digest.update(chunk)
+            write_start = time.perf_counter()
+            f.write(chunk)
+            write_time += time.perf_counter() - write_start
+        if observe:
+            self.metrics.observe('download', time.perf_counter() - start - write_time)
+            self.metrics.count('bytes', size)
+        return size, digest.hexdigest(), write_time
+    
+    def _save_stream(self, response, file_path):
+        """Stream a response body to file_path in chunks and return its size.
+        
+        Data goes to a temp file in the same directory which is renamed into
+        place once complete, so a partial download never shows up in the archive.
+        Returns (size, sha256 hex digest).
+        """
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), prefix='.', suffix='.part')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    size, digest, write_time = self._read_stream(response, f)
+                start = time.perf_counter()
+                os.replace(temp_path, file_path)
+                self.metrics.observe('write', write_time + time.perf_counter() - start)
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+        finally:
+            response.close()
+        
+        return size, digest
+    
+    def _archive_response(self, url, response, page=False, keep_body=False):
+        """Append a response, whatever its status, to the WARC and the manifest.
+        
+        The body is buffered (in memory up to SPOOL_LIMIT) so the record can
+        be written in one go. Returns the body bytes when keep_body is set.
+        """
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT, dir=self.output_dir) as payload:
+                # A page's body has already been read, and timed, for parsing
+                size, digest, write_time = self._read_stream(response, payload, observe=not page)
+                payload.seek(0)
+                start = time.perf_counter()
+                physical_size = self.warc.write_response(response.url or url, response, payload, size, digest, page)
+                self.metrics.observe('write', write_time + time.perf_counter() - start)
+                if keep_body:
+                    payload.seek(0)
+                    body = payload.read()
+        finally:
+            response.close()
+        
+        change, _ = self._classify_change(url, digest)
+        self.manifest.record(url, os.path.relpath(self.warc.path, self.output_dir), response.status_code,
+                             response.headers.get('Content-Type'), size, digest,
+                             response.headers.get('ETag'), response.headers.get('Last-Modified'), change)
+        self._count_file(size, url, physical_size)
+        return body if keep_body else None
     
     def process_url(self, url, depth):
         """Process a URL: download the page and parse for links"""
         # Skip URLs that are not on the same domain
-        if urlparse(url).netloc != self.domain:
+        if self.paths.locate(url)[0] != self.domain:
+            return
+        
+        # The frontier tracks the page under the URL it was queued as
+        page_url = url
+        
+        if not self._allowed(url):
+            self._record_error(f"Skipped {url}: disallowed by robots.txt", page_url)
             return
         
         # Skip URL fragments and query parameters for now
-        url = self._clean_url(url)
+        url = self.urls.clean(url)
         
         try:
-            # Make the request
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            # Make the request, conditional if the previous snapshot has this page
+            previous = self._previous_entry(page_url)
+            response = self._fetch(url, headers=self._conditional_headers(previous))
             
             # Determine the file path for saving
-            file_path = self._get_file_path(url)
+            file_path = self.paths.file_path(url)
             
             # Create directories if they don't exist
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            if self.warc is None:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            
+            if response.status_code == 304 and previous is not None:
+                # Unchanged since the previous snapshot: reuse its file and
+                # follow the links recorded in it
+                self._release(response)
+                self._reuse_previous(previous, page_url, file_path, response)
+                if 'text/html' in (previous['content_type'] or '').lower():
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        html = f.read()
+                    self._follow_page(html, None, url, depth, serialize=False)
+                return
             
             if response.status_code != 200:
                 # Create an error page for missing content
-                self.errors.append(f"Failed to fetch {url}: HTTP {response.status_code}")
+                self._record_error(f"Failed to fetch {url}: HTTP {response.status_code}", page_url)
+                
+                # A WARC records the error response as it was received
+                if self.warc is not None:
+                    self._archive_response(page_url, response)
+                    return
+                self._release(response)
                 
                 # Create a placeholder HTML page with error information
                 html_content = f"""<!DOCTYPE html>
@@ -111,49 +734,49 @@ class WebsiteScraper:
 </body>
 </html>"""
                 # Save the error page
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
+                size = self._write_text(file_path, html_content)
                 
-                self.files_downloaded += 1
-                self.total_size += len(html_content)
+                self._record_file(size, page_url, file_path,
+                                  status=response.status_code, content_type='text/html')
                 return
             
             # If this is an HTML page, parse it and extract links
             content_type = response.headers.get('Content-Type', '').lower()
             
             if 'text/html' in content_type:
-                soup = BeautifulSoup(response.text, 'html.parser')
+                with self.metrics.timed('download'):
+                    self.metrics.count('bytes', len(response.content))
+                html = self._follow_page(response.content, response.encoding, url, depth,
+                                         serialize=self.warc is None)
                 
-                # Update links in the HTML to point to local files
-                self._update_html_links(soup, url)
+                if self.warc is not None:
+                    # The WARC keeps the page as served, links are left as they were
+                    self._archive_response(page_url, response, page=True)
+                    return
                 
-                # Find all links and add them to the queue if we're not at max depth
-                if depth < self.max_depth:
-                    self._extract_links(soup, url, depth)
+                # Save the modified HTML; its size is the rewritten page's, which the digest covers
+                size = self._write_text(file_path, html)
                 
-                # If we're downloading assets, process them
-                if self.download_assets:
-                    self._extract_and_download_assets(soup, url)
-                
-                # Save the modified HTML
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(str(soup))
+                self._record_file(size, page_url, file_path, response=response)
+            elif self.warc is not None:
+                self._archive_response(page_url, response)
             else:
-                # For non-HTML content, just save the file
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
-            
-            self.files_downloaded += 1
-            self.total_size += len(response.content)
+                # For non-HTML content, stream the file straight to disk
+                size, digest = self._save_stream(response, file_path)
+                self._record_file(size, page_url, file_path, response=response, digest=digest)
             
         except Exception as e:
             logger.error(f"Error processing {url}: {e}")
-            self.errors.append(f"Error processing {url}: {str(e)}")
+            self._record_error(f"Error processing {url}: {str(e)}", page_url)
+            
+            # Placeholders only stand in for missing files in a browsable tree
+            if self.warc is not None:
+                return
             
             # Create an error page for exceptions
             try:
                 # Get the file path for this URL
-                error_file_path = self._get_file_path(url)
+                error_file_path = self.paths.file_path(url)
                 
                 # Ensure the directory exists
                 os.makedirs(os.path.dirname(error_file_path), exist_ok=True)
@@ -182,246 +805,110 @@ class WebsiteScraper:
 </html>"""
                 
                 # Save the error page
-                with open(error_file_path, 'w', encoding='utf-8') as f:
-                    f.write(html_content)
+                size = self._write_text(error_file_path, html_content)
                 
-                self.files_downloaded += 1
-                self.total_size += len(html_content)
+                self._record_file(size, page_url, error_file_path, content_type='text/html')
             except Exception as inner_e:
                 logger.error(f"Error creating error page for {url}: {inner_e}")
     
-    def _clean_url(self, url):
-        """Remove fragments and standardize URL, with Webflow-specific handling"""
-        parsed = urlparse(url)
-        path = parsed.path
-        
-        # Special case for webflow sites where URL structure doesn't use /index.html
-        if 'webflow.io' in parsed.netloc:
-            # Handle specific URL pattern conversion: /home-v2/index.html -> /home-pages/home-v2
-            if '/home-v2/index.html' in path:
-                path = path.replace('/home-v2/index.html', '/home-pages/home-v2')
-            elif '/home-v3/index.html' in path:
-                path = path.replace('/home-v3/index.html', '/home-pages/home-v3')
-            elif '/blog-v1/index.html' in path:
-                path = path.replace('/blog-v1/index.html', '/blog-pages/blog-v1')
-            elif '/blog-v2/index.html' in path:
-                path = path.replace('/blog-v2/index.html', '/blog-pages/blog-v2')
-            elif '/blog-v3/index.html' in path:
-                path = path.replace('/blog-v3/index.html', '/blog-pages/blog-v3')
-            elif '/contact-v1/index.html' in path:
-                path = path.replace('/contact-v1/index.html', '/contact-pages/contact-v1')
-            elif '/contact-v2/index.html' in path:
-                path = path.replace('/contact-v2/index.html', '/contact-pages/contact-v2')
-            elif '/contact-v3/index.html' in path:
-                path = path.replace('/contact-v3/index.html', '/contact-pages/contact-v3')
-            # General pattern for removing /index.html from paths for webflow sites
-            elif path.endswith('/index.html'):
-                path = path[:-11]  # Remove /index.html
-                
-        return f"{parsed.scheme}://{parsed.netloc}{path}"
-    
-    def _get_file_path(self, url):
-        """Convert a URL to a local file path"""
-        parsed = urlparse(url)
-        path = parsed.path.strip('/')
-        
-        # Default to index.html for empty paths
-        if not path:
-            path = 'index.html'
-        # Add .html extension if there's no extension
-        elif '.' not in os.path.basename(path):
-            path = os.path.join(path, 'index.html')
-        
-        # Decode URL-encoded characters
-        path = unquote(path)
-        
-        return os.path.join(self.output_dir, path)
-    
-    def _update_html_links(self, soup, current_url):
-        """Update links in HTML to point to local files"""
-        # Update anchor links
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            if not href.startswith('#') and not href.startswith('javascript:'):
-                absolute_url = urljoin(current_url, href)
-                if urlparse(absolute_url).netloc == self.domain:
-                    relative_path = self._get_relative_path(current_url, absolute_url)
-                    a_tag['href'] = relative_path
-                    # Add data attribute to track 404 links
-                    a_tag['data-original-url'] = absolute_url
-        
-        # Update stylesheets
-        for link_tag in soup.find_all('link', rel='stylesheet', href=True):
-            href = link_tag['href']
-            absolute_url = urljoin(current_url, href)
-            relative_path = self._get_relative_path(current_url, absolute_url)
-            link_tag['href'] = relative_path
-            link_tag['data-original-url'] = absolute_url
-        
-        # Update scripts
-        for script_tag in soup.find_all('script', src=True):
-            src = script_tag['src']
-            absolute_url = urljoin(current_url, src)
-            relative_path = self._get_relative_path(current_url, absolute_url)
-            script_tag['src'] = relative_path
-            script_tag['data-original-url'] = absolute_url
-        
-        # Update images
-        for img_tag in soup.find_all('img', src=True):
-            src = img_tag['src']
-            absolute_url = urljoin(current_url, src)
-            relative_path = self._get_relative_path(current_url, absolute_url)
-            img_tag['src'] = relative_path
-            img_tag['data-original-url'] = absolute_url
-    
-    def _get_relative_path(self, from_url, to_url):
-        """Calculate the relative path from one URL to another"""
-        from_parsed = urlparse(from_url)
-        to_parsed = urlparse(to_url)
-        
-        # If different domains, keep the absolute URL
-        if from_parsed.netloc != to_parsed.netloc:
-            return to_url
-        
-        # Get the file paths
-        from_path = from_parsed.path.strip('/')
-        to_path = to_parsed.path.strip('/')
-        
-        # If from_path is empty, it's the root
-        if not from_path:
-            from_path = 'index.html'
-        # Add index.html for directory paths
-        elif '.' not in os.path.basename(from_path):
-            from_path = os.path.join(from_path, 'index.html')
-        
-        # Same for to_path
-        if not to_path:
-            to_path = 'index.html'
-        elif '.' not in os.path.basename(to_path):
-            to_path = os.path.join(to_path, 'index.html')
-        
-        # Calculate the relative path
-        from_dir = os.path.dirname(from_path)
-        to_dir = os.path.dirname(to_path)
-        
-        if from_dir == to_dir:
-            return os.path.basename(to_path)
-        
-        # Count the number of directories to go up
-        from_parts = from_dir.split('/')
-        to_parts = to_dir.split('/')
-        
-        # Find common prefix
-        common_prefix = 0
-        for i in range(min(len(from_parts), len(to_parts))):
-            if from_parts[i] != to_parts[i]:
-                break
-            common_prefix += 1
-        
-        # Calculate relative path
-        up_dirs = ['..'] * (len(from_parts) - common_prefix)
-        down_dirs = to_parts[common_prefix:]
-        
-        rel_path = '/'.join(up_dirs + down_dirs)
-        if rel_path:
-            rel_path += '/'
-        
-        rel_path += os.path.basename(to_path)
+    def _follow_page(self, content, encoding, url, depth, serialize=True):
+        """Rewrite a page, queue its links and its assets and return the rewritten HTML"""
+        # Update links in the HTML to point to local files and collect
+        # pages to crawl and assets to download along the way
+        extract_text = self.search_index is not None
+        if self.parse_pool is not None:
+            html, links, assets, text, timings = self.parse_pool.rewrite(self.rewriter, content, encoding,
+                                                                         url, depth, serialize, extract_text)
+        else:
+            html, links, assets, text, timings = self.rewriter.rewrite(content, encoding, url, depth,
+                                                                       serialize, extract_text)
+        if text is not None:
+            # Batches are written by whichever thread fills them; the page is
+            # saved even if the index can't be written
+            start = time.perf_counter()
+            try:
+                self.search_index.add(url, *text)
+            except Exception as e:
+                logger.error(f"Error indexing {url}: {e}")
+            timings['index'] += time.perf_counter() - start
+        for phase, seconds in timings.items():
+            self.metrics.observe(phase, seconds)
+        self._queue_links(links, depth)
         
-        return rel_path
+        # Assets are downloaded by the asset pipeline, the page doesn't wait for them
+        if self.download_assets:
+            for asset_url, kind in assets:
+                self._queue_asset(asset_url, kind)
+        return html
     
-    def _extract_links(self, soup, current_url, depth):
-        """Extract links from HTML and add them to the queue"""
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            
-            # Skip fragment links and JavaScript
-            if href.startswith('#') or href.startswith('javascript:'):
-                continue
-            
-            # Convert to absolute URL
-            absolute_url = urljoin(current_url, href)
-            
-            # Skip external links
-            if urlparse(absolute_url).netloc != self.domain:
-                continue
-            
+    def _queue_links(self, links, depth):
+        """Add same-domain links found on a page at `depth` to the queue"""
+        for absolute_url in links:
             # Clean URL (remove fragments, etc.)
-            clean_url = self._clean_url(absolute_url)
+            clean_url = self.urls.clean(absolute_url)
             
-            # Add to queue if not visited
-            if clean_url not in self.visited_urls:
-                self.to_visit.append((clean_url, depth + 1))
-    
-    def _extract_and_download_assets(self, soup, current_url):
-        """Extract and download assets (CSS, JS, images, etc.)"""
-        # Process stylesheets
-        for link_tag in soup.find_all('link', rel='stylesheet', href=True):
-            href = link_tag['href']
-            absolute_url = urljoin(current_url, href)
-            self._download_asset(absolute_url)
-        
-        # Process scripts
-        for script_tag in soup.find_all('script', src=True):
-            src = script_tag['src']
-            absolute_url = urljoin(current_url, src)
-            self._download_asset(absolute_url)
-        
-        # Process images
-        for img_tag in soup.find_all('img', src=True):
-            src = img_tag['src']
-            absolute_url = urljoin(current_url, src)
-            self._download_asset(absolute_url)
-        
-        # Process CSS url() references
-        for style_tag in soup.find_all('style'):
-            css_content = style_tag.string
-            if css_content:
-                urls = re.findall(r'url\([\'"]?([^\'"()]+)[\'"]?\)', css_content)
-                for url in urls:
-                    absolute_url = urljoin(current_url, url)
-                    self._download_asset(absolute_url)
+            # Queued unless already queued or visited
+            self.frontier.push(clean_url, depth + 1)
     
-    def _download_asset(self, url):
-        """Download an asset if it's on the same domain"""
-        parsed_url = urlparse(url)
-        
+    def _queue_asset(self, url, kind=None):
+        """Hand an asset to the asset pipeline if it's on the same domain"""
         # Skip external assets and already visited URLs
-        if parsed_url.netloc != self.domain or url in self.visited_urls:
+        if self.paths.locate(url)[0] != self.domain or not self._allowed(url) or not self.frontier.claim(url):
             return
         
-        self.visited_urls.add(url)
+        self.assets.submit(url, kind)
+    
+    def _download_asset(self, url):
+        """Asset pipeline worker: download a claimed asset"""
+        if self.cancelled:
+            return
         
+        with self.metrics.fetching():
+            self._save_asset(url)
+        self.frontier.complete(url)
+        self.metrics.count('assets')
+    
+    def _save_asset(self, url):
+        """Fetch a claimed asset and save it, or a placeholder if that fails"""        
         # Get the file path - define this before the try block so it's available in except
-        file_path = self._get_file_path(url)
+        file_path = self.paths.file_path(url)
         
         # Create directories if they don't exist
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if self.warc is None:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
         
         try:
-            # Make the request
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            # Make the request, conditional if the previous snapshot has this asset
+            previous = self._previous_entry(url)
+            response = self._fetch(url, headers=self._conditional_headers(previous))
+            
+            if response.status_code == 304 and previous is not None:
+                self._release(response)
+                self._reuse_previous(previous, url, file_path, response)
+                if 'text/css' in (previous['content_type'] or '').lower():
+                    with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+                        self._process_css_file(f.read(), url)
+                return
             
             if response.status_code != 200:
-                self.errors.append(f"Failed to fetch asset {url}: HTTP {response.status_code}")
+                self._record_error(f"Failed to fetch asset {url}: HTTP {response.status_code}", url)
+                if self.warc is not None:
+                    self._archive_response(url, response)
+                    return
+                self._release(response)
                 
                 # For CSS files, create a minimal fallback
                 if url.endswith('.css') or 'text/css' in response.headers.get('Content-Type', '').lower():
                     fallback_css = "/* This is a placeholder for a CSS file that could not be downloaded */\n"
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fallback_css)
-                    self.files_downloaded += 1
-                    self.total_size += len(fallback_css)
+                    size = self._write_text(file_path, fallback_css)
+                    self._record_file(size, url, file_path,
+                                      status=response.status_code, content_type='text/css')
                 # For JavaScript files, create a minimal fallback
                 elif url.endswith('.js') or 'javascript' in response.headers.get('Content-Type', '').lower():
                     fallback_js = "// This is a placeholder for a JavaScript file that could not be downloaded\n"
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fallback_js)
-                    self.files_downloaded += 1
-                    self.total_size += len(fallback_js)
+                    size = self._write_text(file_path, fallback_js)
+                    self._record_file(size, url, file_path,
+                                      status=response.status_code, content_type='application/javascript')
                 # For images, create a minimal SVG placeholder
                 elif any(url.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg']):
                     fallback_svg = f"""<svg xmlns="http://www.w3.org/2000/svg" width="200" height="150" viewBox="0 0 200 150">
@@ -429,43 +916,45 @@ class WebsiteScraper:
   <text x="100" y="75" font-family="Arial" font-size="12" text-anchor="middle">Image Not Found</text>
   <text x="100" y="90" font-family="Arial" font-size="10" text-anchor="middle">{os.path.basename(url)}</text>
 </svg>"""
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fallback_svg)
-                    self.files_downloaded += 1
-                    self.total_size += len(fallback_svg)
+                    size = self._write_text(file_path, fallback_svg)
+                    self._record_file(size, url, file_path,
+                                      status=response.status_code, content_type='image/svg+xml')
                 
                 return
             
-            # Save the file
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            if self.warc is not None:
+                is_css = 'text/css' in response.headers.get('Content-Type', '').lower()
+                body = self._archive_response(url, response, keep_body=is_css)
+                if is_css:
+                    self._process_css_file(body.decode(response.encoding or 'utf-8', errors='replace'), url)
+                return
             
-            self.files_downloaded += 1
-            self.total_size += len(response.content)
+            # Stream the file to disk
+            size, digest = self._save_stream(response, file_path)
+            self._record_file(size, url, file_path, response=response, digest=digest)
             
             # For CSS files, extract and download embedded assets
             content_type = response.headers.get('Content-Type', '').lower()
             if 'text/css' in content_type:
-                self._process_css_file(response.text, url)
+                with open(file_path, 'r', encoding=response.encoding or 'utf-8', errors='replace') as f:
+                    self._process_css_file(f.read(), url)
                 
         except Exception as e:
             logger.error(f"Error downloading asset {url}: {e}")
-            self.errors.append(f"Error downloading asset {url}: {str(e)}")
+            self._record_error(f"Error downloading asset {url}: {str(e)}", url)
+            if self.warc is not None:
+                return
             
             # Create a minimal placeholder based on file type
             try:
                 if url.endswith('.css'):
                     fallback_css = "/* This is a placeholder for a CSS file that could not be downloaded due to an error */\n"
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fallback_css)
-                    self.files_downloaded += 1
-                    self.total_size += len(fallback_css)
+                    size = self._write_text(file_path, fallback_css)
+                    self._record_file(size, url, file_path, content_type='text/css')
                 elif url.endswith('.js'):
                     fallback_js = "// This is a placeholder for a JavaScript file that could not be downloaded due to an error\n"
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fallback_js)
-                    self.files_downloaded += 1
-                    self.total_size += len(fallback_js)
+                    size = self._write_text(file_path, fallback_js)
+                    self._record_file(size, url, file_path, content_type='application/javascript')
                 elif any(url.endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg']):
                     fallback_svg = f"""<svg xmlns="http://www.w3.org/2000/svg" width="200" height="150" viewBox="0 0 200 150">
   <rect width="200" height="150" fill="#f1f1f1" />
@@ -473,19 +962,17 @@ class WebsiteScraper:
   <text x="100" y="90" font-family="Arial" font-size="10" text-anchor="middle">{os.path.basename(url)}</text>
   <text x="100" y="105" font-family="Arial" font-size="8" text-anchor="middle">Error: {str(e)[:30]}</text>
 </svg>"""
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(fallback_svg)
-                    self.files_downloaded += 1
-                    self.total_size += len(fallback_svg)
+                    size = self._write_text(file_path, fallback_svg)
+                    self._record_file(size, url, file_path, content_type='image/svg+xml')
             except Exception as placeholder_error:
                 logger.error(f"Error creating placeholder for {url}: {placeholder_error}")
     
     def _process_css_file(self, css_content, css_url):
-        """Process a CSS file to extract and download referenced assets"""
-        urls = re.findall(r'url\([\'"]?([^\'"()]+)[\'"]?\)', css_content)
+        """Process a CSS file to queue the assets it references"""
+        urls = CSS_URL_RE.findall(css_content)
         for url in urls:
             if url.startswith('data:'):
                 continue  # Skip data URLs
             
             absolute_url = urljoin(css_url, url)
-            self._download_asset(absolute_url)
+            self._queue_asset(absolute_url)
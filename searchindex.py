@@ -0,0 +1,166 @@
+import os
+import re
+import html
+import time
+import sqlite3
+import threading
+
+# Pages buffered by a crawl before they are written in one transaction, and
+# the longest a page waits in the buffer
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 2.0
+
+# Characters of a page's text that are indexed; the rest of very long pages is dropped
+MAX_TEXT = 1000000
+
+# Ranking weight of a title match against a body match
+TITLE_WEIGHT = 5.0
+
+# Words of context around the matches in a snippet
+SNIPPET_TOKENS = 24
+
+# Quoted phrases and single words of a search box query
+QUERY_TERM_RE = re.compile(r'"([^"]*)"|(\w+)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Marks around matched words in snippets, swapped for <mark> once the text is escaped
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+def page_text(soup):
+    """(title, text) of a parsed page; script, style and template contents are left out"""
+    title = soup.title.get_text() if soup.title else ''
+    body = soup.body or soup
+    # Inline tags would split words if their strings were joined with spaces,
+    # so the source's own whitespace separates them
+    text = WHITESPACE_RE.sub(' ', body.get_text()[:MAX_TEXT]).strip()
+    return WHITESPACE_RE.sub(' ', title).strip(), text
+
+def fts_query(query):
+    """FTS5 query for pages matching every word and "quoted phrase" of query; None if it has none.
+
+    Words are quoted so FTS5 operators typed in the box are searched as
+    text, and the last word also matches as a prefix.
+    """
+    terms = []
+    for phrase, word in QUERY_TERM_RE.findall(query):
+        # An empty "" matches the phrase branch with neither group set
+        words = re.findall(r'\w+', phrase) if phrase or not word else [word]
+        if words:
+            terms.append('"' + ' '.join(words) + '"')
+    if not terms:
+        return None
+    if not query.rstrip().endswith('"'):
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+class SearchIndex:
+    """Full-text index of archived pages, across tasks, in a SQLite FTS5 table.
+
+    pages holds each page's title and text, with the rowid of its
+    (task_id, url) row in documents, so a page crawled again replaces its
+    text. Crawls write through the buffered TaskIndexer of writer().
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                task_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                UNIQUE (task_id, url)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(title, body, tokenize='porter unicode61');
+        ''')
+
+    def writer(self, task_id):
+        return TaskIndexer(self, task_id)
+
+    def add_pages(self, task_id, pages):
+        """Index (url, title, text) pages of a task in one transaction"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for url, title, text in pages:
+                    self._db.execute('INSERT OR IGNORE INTO documents (task_id, url) VALUES (?, ?)', (task_id, url))
+                    doc_id = self._db.execute('SELECT id FROM documents WHERE task_id = ? AND url = ?',
+                                              (task_id, url)).fetchone()[0]
+                    self._db.execute('DELETE FROM pages WHERE rowid = ?', (doc_id,))
+                    self._db.execute('INSERT INTO pages (rowid, title, body) VALUES (?, ?, ?)', (doc_id, title, text))
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def search(self, query, task_ids=None, limit=20, offset=0):
+        """Best matches of a search box query, in the given tasks or all of them.
+
+        Returns dicts with task_id, url, title, an HTML-escaped snippet with
+        the matches in <mark>, and rank (lower is better).
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+        sql = (f"SELECT d.task_id, d.url, pages.title, "
+               f"snippet(pages, -1, ?, ?, '…', {SNIPPET_TOKENS}), bm25(pages, {TITLE_WEIGHT}, 1.0) AS rank "
+               f"FROM pages JOIN documents d ON d.id = pages.rowid WHERE pages MATCH ?")
+        params = [MATCH_START, MATCH_END, match]
+        if task_ids:
+            sql += f" AND d.task_id IN ({', '.join('?' * len(task_ids))})"
+            params.extend(task_ids)
+        sql += ' ORDER BY rank LIMIT ? OFFSET ?'
+        params.extend((limit, offset))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [{
+            'task_id': task_id,
+            'url': url,
+            'title': title,
+            'snippet': html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'),
+            'rank': round(rank, 4),
+        } for task_id, url, title, snippet, rank in rows]
+
+    def count(self, task_id):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM documents WHERE task_id = ?', (task_id,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class TaskIndexer:
+    """Buffers the pages of one task's crawl and writes them to a SearchIndex in batches.
+
+    Thread-safe; the crawler thread that fills a batch writes it while the
+    others keep buffering. flush() writes what is left at the end of a crawl.
+    """
+    def __init__(self, index, task_id):
+        self.index = index
+        self.task_id = task_id
+        self._lock = threading.Lock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def add(self, url, title, text):
+        with self._lock:
+            self._pending.append((url, title, text))
+            if len(self._pending) < BATCH_SIZE and time.monotonic() - self._last_flush < FLUSH_INTERVAL:
+                return
+            batch = self._take()
+        self.index.add_pages(self.task_id, batch)
+
+    def flush(self):
+        with self._lock:
+            batch = self._take()
+        if batch:
+            self.index.add_pages(self.task_id, batch)
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        self._last_flush = time.monotonic()
+        return batch
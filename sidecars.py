@@ -0,0 +1,86 @@
+import os
+import gzip
+import uuid
+import logging
+
+try:
+    import brotli
+    HAVE_BROTLI = True
+except ImportError:
+    HAVE_BROTLI = False
+
+logger = logging.getLogger(__name__)
+
+# Content types worth compressing; images, woff/woff2 fonts and archives already are
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/x-javascript', 'application/json',
+                      'application/ld+json', 'application/manifest+json', 'application/xml',
+                      'application/rss+xml', 'application/atom+xml', 'image/svg+xml', 'image/x-icon',
+                      'font/ttf', 'font/otf', 'application/vnd.ms-fontobject', 'application/wasm')
+
+# Files outside this size range get no sidecars: tiny ones gain nothing, huge
+# ones would hold a crawl thread for too long
+MIN_SIZE = 512
+MAX_SIZE = 32 * 1024 * 1024
+
+# A sidecar is only kept if it is at least this much smaller than the file
+MIN_SAVING = 0.1
+
+# Levels cheap enough to run on the crawl threads
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Content-Encoding -> file suffix, in order of preference
+SIDECAR_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+def compressible(content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES)
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+class SidecarStore:
+    """Gzip and Brotli copies of archived files, made as they are saved and served by /replay.
+
+    Like blobs they are kept by SHA-256, as <first two hex digits>/<sha256>.gz
+    and .br, so a body shared by several archives or snapshots is
+    compressed once. Brotli copies need the optional brotli package.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.encodings = [encoding for encoding in SIDECAR_SUFFIXES if encoding != 'br' or HAVE_BROTLI]
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest, encoding):
+        return os.path.join(self.root, digest[:2], digest + SIDECAR_SUFFIXES[encoding])
+
+    def find(self, digest, encoding):
+        """Path of the sidecar of digest in encoding, or None"""
+        path = self.path(digest, encoding)
+        return path if os.path.exists(path) else None
+
+    def add(self, file_path, digest, content_type):
+        """Write the missing sidecars of a saved file, if its type and size are worth it"""
+        if not compressible(content_type):
+            return
+        missing = [encoding for encoding in self.encodings if not os.path.exists(self.path(digest, encoding))]
+        if not missing:
+            return
+        size = os.path.getsize(file_path)
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            return
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        os.makedirs(os.path.join(self.root, digest[:2]), exist_ok=True)
+        for encoding in missing:
+            compressed = _compress(data, encoding)
+            if len(compressed) > len(data) * (1 - MIN_SAVING):
+                continue
+            path = self.path(digest, encoding)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(temp_path, path)
@@ -0,0 +1,119 @@
+import zlib
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+from xml.etree.ElementTree import XMLPullParser
+
+logger = logging.getLogger(__name__)
+
+# Sitemap files read per crawl (indexes included) and URLs taken from them
+MAX_SITEMAPS = 100
+MAX_SITEMAP_URLS = 500000
+
+GZIP_MAGIC = b'\x1f\x8b'
+CHUNK_SIZE = 64 * 1024
+
+# One <url> of a sitemap: priority is 0.0-1.0 (None if absent), lastmod a POSIX timestamp or None
+SitemapEntry = namedtuple('SitemapEntry', 'url priority lastmod')
+
+def _local_name(tag):
+    return tag.rpartition('}')[2]
+
+def parse_lastmod(value):
+    """POSIX timestamp of a W3C datetime (2024-05-01, 2024-05-01T10:00:00+02:00), or None"""
+    if not value:
+        return None
+    value = value.strip().replace('Z', '+00:00')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def parse_priority(value):
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+def sitemap_chunks(response):
+    """XML of a sitemap response in chunks, gunzipping .xml.gz files as they arrive"""
+    decompressor = None
+    for chunk in response.iter_content(CHUNK_SIZE):
+        if decompressor is None:
+            # Content-Encoding is undone by requests; a gzip file served as is is not
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == GZIP_MAGIC else False
+        yield decompressor.decompress(chunk) if decompressor else chunk
+    if decompressor:
+        yield decompressor.flush()
+
+def iter_sitemap(chunks):
+    """Yield ('url', SitemapEntry) and ('sitemap', url) items from a sitemap or sitemap index.
+
+    The XML is parsed as its chunks arrive and every element dropped once
+    read, so memory stays flat however large the file.
+    """
+    parser = XMLPullParser(events=('end',))
+    fields = {}  # Children of the <url> or <sitemap> being read
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from _read_events(parser, fields)
+    parser.close()
+    yield from _read_events(parser, fields)
+
+def _read_events(parser, fields):
+    for event, element in parser.read_events():
+        name = _local_name(element.tag)
+        if name in ('loc', 'priority', 'lastmod'):
+            fields[name] = (element.text or '').strip()
+        elif name == 'url':
+            if fields.get('loc'):
+                yield 'url', SitemapEntry(fields['loc'], parse_priority(fields.get('priority')),
+                                          parse_lastmod(fields.get('lastmod')))
+            fields.clear()
+            element.clear()
+        elif name == 'sitemap':
+            if fields.get('loc'):
+                yield 'sitemap', fields['loc']
+            fields.clear()
+            element.clear()
+
+def read_sitemaps(fetch, release, sitemap_urls):
+    """Yield the SitemapEntry of every page listed in sitemap_urls, following sitemap indexes.
+
+    fetch(url) returns a streamed response and release(response) discards
+    one. Files that fail to download or parse are logged and skipped.
+    """
+    queue = list(sitemap_urls)
+    seen = set(queue)
+    read = listed = 0
+    while queue and read < MAX_SITEMAPS and listed < MAX_SITEMAP_URLS:
+        sitemap_url = queue.pop(0)
+        read += 1
+        try:
+            response = fetch(sitemap_url)
+        except Exception as e:
+            logger.warning(f"Could not fetch sitemap {sitemap_url}: {e}")
+            continue
+        if response.status_code != 200:
+            release(response)
+            logger.info(f"No sitemap at {sitemap_url}: HTTP {response.status_code}")
+            continue
+        try:
+            for kind, item in iter_sitemap(sitemap_chunks(response)):
+                if kind == 'sitemap':
+                    if item not in seen:
+                        seen.add(item)
+                        queue.append(item)
+                    continue
+                listed += 1
+                yield item
+                if listed >= MAX_SITEMAP_URLS:
+                    break
+        except Exception as e:
+            logger.warning(f"Could not parse sitemap {sitemap_url}: {e}")
+        finally:
+            response.close()
+    logger.info(f"Read {read} sitemaps listing {listed} URLs")
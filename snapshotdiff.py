@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import difflib
+import argparse
+import itertools
+
+from manifest import Manifest, is_directory
+from warc import WARC_FILENAME
+
+# Lines of a text diff returned at most; the rest of huge diffs is cut
+MAX_DIFF_LINES = 5000
+
+def diff_manifests(old, new):
+    """Added, removed and changed URLs between two snapshots' manifests.
+
+    Walks both Merkle trees from the root and only descends into
+    directories whose digests differ, so unchanged parts of the sites cost
+    nothing. directories_compared counts the directories listed.
+    """
+    added, removed, changed = [], [], []
+    compared = 0
+    if old.build_tree() != new.build_tree():
+        pending = ['']
+        while pending:
+            parent = pending.pop()
+            compared += 1
+            old_children = old.tree_children(parent)
+            new_children = new.tree_children(parent)
+            for name in old_children.keys() | new_children.keys():
+                old_digest = old_children.get(name)
+                new_digest = new_children.get(name)
+                if old_digest == new_digest:
+                    continue
+                key = parent + name
+                if not is_directory(name):
+                    if old_digest is None:
+                        added.append(key)
+                    elif new_digest is None:
+                        removed.append(key)
+                    else:
+                        changed.append(key)
+                elif old_digest is None:
+                    added.extend(new.tree_urls(key))
+                elif new_digest is None:
+                    removed.extend(old.tree_urls(key))
+                else:
+                    pending.append(key)
+    return {
+        'added': sorted(added),
+        'removed': sorted(removed),
+        'changed': sorted(changed),
+        'directories_compared': compared,
+    }
+
+def _html_file(manifest, url):
+    entry = manifest.get(url)
+    if entry is None or 'text/html' not in (entry['content_type'] or '').lower():
+        return None
+    # WARC and WACZ archives keep every response in one file
+    if entry['path'] == WARC_FILENAME:
+        return None
+    path = manifest.file_path(entry)
+    return path if os.path.isfile(path) else None
+
+def text_diff(old, new, url, old_label='old', new_label='new', context=3):
+    """Unified diff of a page saved in both snapshots; None unless both are saved HTML files"""
+    old_path = _html_file(old, url)
+    new_path = _html_file(new, url)
+    if old_path is None or new_path is None:
+        return None
+    with open(old_path, 'r', encoding='utf-8', errors='replace') as f:
+        old_lines = f.readlines()
+    with open(new_path, 'r', encoding='utf-8', errors='replace') as f:
+        new_lines = f.readlines()
+    lines = difflib.unified_diff(old_lines, new_lines, f'{old_label} {url}', f'{new_label} {url}', n=context)
+    return ''.join(itertools.islice(lines, MAX_DIFF_LINES))
+
+def _open_manifest(snapshot, state_dir):
+    """Manifest of a task ID, or of a manifest file given by path"""
+    path = snapshot if os.path.isfile(snapshot) else os.path.join(state_dir, 'manifests', f'{snapshot}.sqlite')
+    if not os.path.isfile(path):
+        raise SystemExit(f"No manifest for {snapshot} at {path}")
+    return Manifest(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two archived snapshots by their manifests")
+    parser.add_argument('old', help="task ID or manifest file of the older snapshot")
+    parser.add_argument('new', help="task ID or manifest file of the newer snapshot")
+    parser.add_argument('--state-dir', default=os.environ.get(
+        'ARCHIVER_STATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')),
+        help="where the web app keeps task state (ARCHIVER_STATE_DIR)")
+    parser.add_argument('--text', metavar='URL', help="print the diff of one changed HTML page instead")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    old = _open_manifest(args.old, args.state_dir)
+    new = _open_manifest(args.new, args.state_dir)
+    try:
+        if args.text:
+            diff = text_diff(old, new, args.text, args.old, args.new)
+            if diff is None:
+                raise SystemExit(f"{args.text} is not a saved HTML page in both snapshots")
+            sys.stdout.write(diff)
+        else:
+            report = diff_manifests(old, new)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                for mark, change in (('+', 'added'), ('-', 'removed'), ('~', 'changed')):
+                    for url in report[change]:
+                        print(f"{mark} {url}")
+                print(f"{len(report['added'])} added, {len(report['removed'])} removed, "
+                      f"{len(report['changed'])} changed")
+    finally:
+        old.close()
+        new.close()
@@ -5,6 +5,11 @@ document.addEventListener('DOMContentLoaded', function() {
         const taskId = taskIdElement.getAttribute('data-task-id');
         if (taskId) {
             updateTaskStatus(taskId);
+            
+            const cancelBtn = document.getElementById('cancel-btn');
+            if (cancelBtn) {
+                cancelBtn.addEventListener('click', () => cancelTask(taskId));
+            }
         }
     }
 
@@ -28,106 +33,49 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function updateTaskStatus(taskId) {
-    fetch(`/status/${taskId}`)
-        .then(response => {
-            if (!response.ok) {
-                throw new Error('Failed to fetch task status');
-            }
-            return response.json();
-        })
-        .then(data => {
-            // Update progress bar
-            const progressBar = document.getElementById('progress-bar');
-            if (progressBar) {
-                const progress = Math.round(data.progress);
-                progressBar.style.width = `${progress}%`;
-                progressBar.setAttribute('aria-valuenow', progress);
-                progressBar.textContent = `${progress}%`;
-                
-                // Set color based on status
-                progressBar.classList.remove('bg-success', 'bg-danger', 'bg-warning', 'bg-info');
-                
-                if (data.status === 'completed') {
-                    progressBar.classList.add('bg-success');
-                } else if (data.status === 'failed') {
-                    progressBar.classList.add('bg-danger');
-                } else if (data.status === 'running') {
-                    progressBar.classList.add('bg-info');
-                } else {
-                    progressBar.classList.add('bg-warning');
-                }
-            }
-            
-            // Update status text
-            const statusElement = document.getElementById('status-text');
-            if (statusElement) {
-                statusElement.textContent = data.status.charAt(0).toUpperCase() + data.status.slice(1);
-                
-                // Change status color based on state
-                statusElement.classList.remove('text-success', 'text-danger', 'text-warning', 'text-info');
-                
-                if (data.status === 'completed') {
-                    statusElement.classList.add('text-success');
-                } else if (data.status === 'failed') {
-                    statusElement.classList.add('text-danger');
-                } else if (data.status === 'running') {
-                    statusElement.classList.add('text-info');
-                } else {
-                    statusElement.classList.add('text-warning');
-                }
-            }
-            
-            // Update statistics
-            updateStatElement('files-count', data.files_downloaded);
-            updateStatElement('total-size', formatBytes(data.total_size));
-            
-            // Update errors
-            const errorsList = document.getElementById('errors-list');
-            if (errorsList) {
-                errorsList.innerHTML = '';
-                
-                if (data.errors && data.errors.length > 0) {
-                    document.getElementById('errors-container').classList.remove('d-none');
-                    
-                    data.errors.forEach(error => {
-                        const li = document.createElement('li');
-                        li.classList.add('list-group-item', 'bg-dark', 'text-danger');
-                        li.textContent = error;
-                        errorsList.appendChild(li);
-                    });
-                } else {
-                    document.getElementById('errors-container').classList.add('d-none');
-                }
-            }
+    // Progress is pushed over Server-Sent Events; browsers without them poll instead
+    if (window.EventSource) {
+        watchTaskEvents(taskId);
+    } else {
+        pollTaskStatus(taskId, 0);
+    }
+}
+
+function watchTaskEvents(taskId) {
+    const source = new EventSource(`/events/${taskId}`);
+    
+    source.addEventListener('progress', event => {
+        const data = JSON.parse(event.data);
+        renderTaskStatus(data);
+        if (isTaskFinished(data.status)) {
+            // The server ends the stream after the last errors; stop EventSource from reconnecting
+            source.addEventListener('error', () => source.close());
+        }
+    });
+    
+    source.addEventListener('errors', event => {
+        appendErrors(JSON.parse(event.data));
+    });
+    
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            showAlert('Lost connection to the server. Please refresh the page.', 'danger');
+        }
+    });
+}
+
+function pollTaskStatus(taskId, errorCursor) {
+    Promise.all([
+        fetchJson(`/status/${taskId}`),
+        fetchJson(`/errors/${taskId}?cursor=${errorCursor}`)
+    ])
+        .then(([data, errors]) => {
+            renderTaskStatus(data);
+            appendErrors(errors.errors);
             
-            // Continue polling if the task is still running
-            if (data.status === 'running' || data.status === 'starting') {
-                setTimeout(() => updateTaskStatus(taskId), 1000);
-            } else {
-                // Task is complete or failed, update UI accordingly
-                const downloadBtn = document.getElementById('download-btn');
-                if (downloadBtn) {
-                    downloadBtn.classList.remove('disabled');
-                    
-                    // Add a title tooltip to explain what the button does
-                    const tooltipTitle = (data.status === 'completed') 
-                        ? 'View the archived website in a new tab' 
-                        : 'View the partially archived website';
-                    
-                    downloadBtn.setAttribute('title', tooltipTitle);
-                    downloadBtn.setAttribute('data-bs-toggle', 'tooltip');
-                    downloadBtn.setAttribute('data-bs-placement', 'top');
-                    
-                    // Initialize the tooltip
-                    new bootstrap.Tooltip(downloadBtn);
-                }
-                
-                // Show completion message
-                if (data.status === 'completed') {
-                    showAlert('Scraping completed successfully!', 'success');
-                } else if (data.status === 'failed') {
-                    showAlert('Scraping failed. Check the errors below.', 'danger');
-                }
+            // Continue polling while the task is still running or errors remain to be fetched
+            if (!isTaskFinished(data.status) || errors.next_cursor < data.error_count) {
+                setTimeout(() => pollTaskStatus(taskId, errors.next_cursor), 1000);
             }
         })
         .catch(error => {
@@ -136,6 +84,161 @@ function updateTaskStatus(taskId) {
         });
 }
 
+function fetchJson(url) {
+    return fetch(url).then(response => {
+        if (!response.ok) {
+            throw new Error('Failed to fetch task status');
+        }
+        return response.json();
+    });
+}
+
+function isTaskFinished(status) {
+    return !['queued', 'starting', 'running'].includes(status);
+}
+
+function renderTaskStatus(data) {
+    // Update progress bar
+    const progressBar = document.getElementById('progress-bar');
+    if (progressBar) {
+        const progress = Math.round(data.progress);
+        progressBar.style.width = `${progress}%`;
+        progressBar.setAttribute('aria-valuenow', progress);
+        progressBar.textContent = `${progress}%`;
+        
+        // Set color based on status
+        progressBar.classList.remove('bg-success', 'bg-danger', 'bg-warning', 'bg-info');
+        
+        if (data.status === 'completed') {
+            progressBar.classList.add('bg-success');
+        } else if (data.status === 'failed') {
+            progressBar.classList.add('bg-danger');
+        } else if (data.status === 'running') {
+            progressBar.classList.add('bg-info');
+        } else {
+            progressBar.classList.add('bg-warning');
+        }
+    }
+    
+    // Update status text
+    const statusElement = document.getElementById('status-text');
+    if (statusElement) {
+        statusElement.textContent = data.status.charAt(0).toUpperCase() + data.status.slice(1);
+        
+        // Change status color based on state
+        statusElement.classList.remove('text-success', 'text-danger', 'text-warning', 'text-info');
+        
+        if (data.status === 'completed') {
+            statusElement.classList.add('text-success');
+        } else if (data.status === 'failed') {
+            statusElement.classList.add('text-danger');
+        } else if (data.status === 'running') {
+            statusElement.classList.add('text-info');
+        } else {
+            statusElement.classList.add('text-warning');
+        }
+    }
+    
+    // Show the place in the queue while the task waits for a worker
+    const queuePosition = document.getElementById('queue-position');
+    if (queuePosition) {
+        if (data.status === 'queued' && data.queue_position) {
+            updateStatElement('queue-position-value', `#${data.queue_position}`);
+            queuePosition.classList.remove('d-none');
+        } else {
+            queuePosition.classList.add('d-none');
+        }
+    }
+    
+    // Update statistics
+    updateStatElement('files-count', data.files_downloaded);
+    updateStatElement('total-size', formatBytes(data.total_size));
+    updateStatElement('physical-size', formatBytes(data.physical_size));
+    
+    if (isTaskFinished(data.status)) {
+        showTaskFinished(data.status);
+    }
+}
+
+function appendErrors(errors) {
+    // Errors arrive incrementally, so new ones are added to those already shown
+    const errorsList = document.getElementById('errors-list');
+    if (!errorsList || !errors || errors.length === 0) return;
+    
+    document.getElementById('errors-container').classList.remove('d-none');
+    
+    errors.forEach(error => {
+        const li = document.createElement('li');
+        li.classList.add('list-group-item', 'bg-dark', 'text-danger');
+        li.textContent = error;
+        errorsList.appendChild(li);
+    });
+}
+
+let taskFinishedShown = false;
+
+function showTaskFinished(status) {
+    // Task is complete, failed or cancelled, update UI accordingly (once)
+    if (taskFinishedShown) return;
+    taskFinishedShown = true;
+    
+    const cancelBtn = document.getElementById('cancel-btn');
+    if (cancelBtn) {
+        cancelBtn.classList.add('d-none');
+    }
+    
+    // The whole archive can be downloaded once nothing more is being added to it
+    document.querySelectorAll('.export-btn').forEach(button => button.classList.remove('disabled'));
+    
+    const downloadBtn = document.getElementById('download-btn');
+    if (downloadBtn) {
+        downloadBtn.classList.remove('disabled');
+        
+        // Add a title tooltip to explain what the button does
+        const tooltipTitle = (status === 'completed') 
+            ? 'View the archived website in a new tab' 
+            : 'View the partially archived website';
+        
+        downloadBtn.setAttribute('title', tooltipTitle);
+        downloadBtn.setAttribute('data-bs-toggle', 'tooltip');
+        downloadBtn.setAttribute('data-bs-placement', 'top');
+        
+        // Initialize the tooltip
+        new bootstrap.Tooltip(downloadBtn);
+    }
+    
+    // Show completion message
+    if (status === 'completed') {
+        showAlert('Scraping completed successfully!', 'success');
+    } else if (status === 'failed') {
+        showAlert('Scraping failed. Check the errors below.', 'danger');
+    } else if (status === 'cancelled') {
+        showAlert('Scraping was cancelled.', 'warning');
+    }
+}
+
+function cancelTask(taskId) {
+    const cancelBtn = document.getElementById('cancel-btn');
+    if (cancelBtn) {
+        cancelBtn.disabled = true;
+    }
+    
+    fetch(`/cancel/${taskId}`, { method: 'POST' })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to cancel task');
+            }
+            showAlert('Cancelling: pages already being downloaded will finish first.', 'warning');
+        })
+        .catch(error => {
+            console.error('Error cancelling task:', error);
+            showAlert('Failed to cancel the task.', 'danger');
+            if (cancelBtn) {
+                cancelBtn.disabled = false;
+            }
+        });
+}
+
 function updateStatElement(id, value) {
     const element = document.getElementById(id);
     if (element) {
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+TASK_FIELDS = ('task_id', 'url', 'options', 'status', 'created_at', 'priority', 'stats', 'updated_at')
+
+# Statuses of tasks that still have work to do
+UNFINISHED_STATUSES = ('queued', 'starting', 'running')
+
+class TaskStore:
+    """SQLite record of scraping tasks, so they survive an app restart.
+
+    Each task keeps the options it was started with, letting the app build
+    an identical scraper again and resume unfinished crawls. The store is
+    also the queue shared with a separate worker process (see worker.py),
+    which publishes each task's counters here.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        # Columns added after the first release of this table
+        columns = set(row[1] for row in self._db.execute('PRAGMA table_info(tasks)'))
+        for name, definition in (('priority', 'INTEGER NOT NULL DEFAULT 0'),
+                                 ('stats', 'TEXT'),
+                                 ('updated_at', 'REAL'),
+                                 ('cancel_requested', 'INTEGER NOT NULL DEFAULT 0')):
+            if name not in columns:
+                self._db.execute(f'ALTER TABLE tasks ADD COLUMN {name} {definition}')
+
+    def add(self, task_id, url, options, status='queued', priority=0):
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO tasks (task_id, url, options, status, created_at, priority) VALUES (?, ?, ?, ?, ?, ?)',
+                (task_id, url, json.dumps(options), status, time.time(), priority))
+
+    def set_status(self, task_id, status):
+        with self._lock:
+            self._db.execute('UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ?',
+                             (status, time.time(), task_id))
+
+    def set_stats(self, task_id, stats):
+        with self._lock:
+            self._db.execute('UPDATE tasks SET stats = ?, updated_at = ? WHERE task_id = ?',
+                             (json.dumps(stats), time.time(), task_id))
+
+    def get(self, task_id):
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT {", ".join(TASK_FIELDS)} FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def latest_completed(self, url):
+        """The most recent completed task for url, or None"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(TASK_FIELDS)} FROM tasks "
+                "WHERE url = ? AND status = 'completed' ORDER BY created_at DESC LIMIT 1",
+                (url,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def unfinished(self):
+        """Tasks that were queued, starting or running when the app last stopped, in queue order"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(TASK_FIELDS)} FROM tasks "
+                f"WHERE status IN {UNFINISHED_STATUSES} ORDER BY priority, created_at").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def queue_position(self, task_id):
+        """1-based place of a queued task among all queued tasks, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM tasks AS t, tasks AS me WHERE me.task_id = ? "
+                "AND me.status = 'queued' AND t.status = 'queued' "
+                "AND (t.priority < me.priority OR (t.priority = me.priority AND t.created_at <= me.created_at))",
+                (task_id,)).fetchone()
+        return row[0] or None
+
+    def claim_next(self):
+        """Atomically move the first queued task to 'starting' and return it"""
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    f"SELECT {', '.join(TASK_FIELDS)} FROM tasks WHERE status = 'queued' "
+                    "ORDER BY priority, created_at LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE tasks SET status = 'starting', updated_at = ? WHERE task_id = ?",
+                                     (time.time(), row[0]))
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+        if row is None:
+            return None
+        record = self._to_dict(row)
+        record['status'] = 'starting'
+        return record
+
+    def request_cancel(self, task_id):
+        """Cancel a queued task outright, or flag a running one for its worker; returns the new status"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE tasks SET status = 'cancelled', updated_at = ? WHERE task_id = ? AND status = 'queued'",
+                (time.time(), task_id))
+            self._db.execute('UPDATE tasks SET cancel_requested = 1 WHERE task_id = ?', (task_id,))
+            row = self._db.execute('SELECT status FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        return row[0] if row else None
+
+    def cancel_requests(self, task_ids):
+        """The subset of task_ids whose cancellation has been requested"""
+        if not task_ids:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT task_id FROM tasks WHERE cancel_requested = 1 "
+                f"AND task_id IN ({', '.join('?' * len(task_ids))})", task_ids).fetchall()
+        return [row[0] for row in rows]
+
+    def requeue_stale(self, stale_after):
+        """Put back running tasks whose worker stopped reporting, returning how many"""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE tasks SET status = 'queued' WHERE status IN ('starting', 'running') "
+                "AND COALESCE(updated_at, created_at) < ?", (time.time() - stale_after,))
+        return cursor.rowcount
+
+    def _to_dict(self, row):
+        record = dict(zip(TASK_FIELDS, row))
+        record['options'] = json.loads(record['options'])
+        record['stats'] = json.loads(record['stats']) if record['stats'] else None
+        return record
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from blobstore import BlobStore  # noqa: E402
+from manifest import Manifest  # noqa: E402
+from scraper import WebsiteScraper, hash_file  # noqa: E402
+from sitegen import SiteServer  # noqa: E402
+
+SITE = {'pages': 40, 'asset_pool': 5, 'page_bytes': 2000}
+
+class BlobStoreDedupTest(unittest.TestCase):
+    def test_two_tasks_share_blobs_and_account_sizes(self):
+        with SiteServer(SITE) as server, tempfile.TemporaryDirectory() as root:
+            store = BlobStore(os.path.join(root, 'blobs'))
+            scrapers = []
+            for task in ('first', 'second'):
+                scraper = WebsiteScraper(server.url, os.path.join(root, task), max_depth=2, delay=0,
+                                         manifest_path=os.path.join(root, f'{task}.sqlite'), blob_store=store)
+                scraper.start_scraping()
+                scrapers.append(scraper)
+
+            first, second = scrapers
+            self.assertGreater(first.total_size, 0)
+            self.assertEqual(second.total_size, first.total_size)
+            # Every body of the second task was already in the store
+            self.assertEqual(second.physical_size, 0)
+            for scraper in scrapers:
+                self.assertGreaterEqual(scraper.total_size, scraper.physical_size)
+
+            manifest = Manifest(os.path.join(root, 'second.sqlite'), root=os.path.join(root, 'second'))
+            try:
+                entries = manifest.entries()
+                self.assertEqual(sum(entry['size'] for entry in entries), second.total_size)
+                for entry in entries:
+                    path = manifest.file_path(entry)
+                    self.assertEqual(entry['size'], os.path.getsize(path), entry['url'])
+                    self.assertEqual(entry['sha256'], hash_file(path), entry['url'])
+            finally:
+                manifest.close()
+
+if __name__ == '__main__':
+    unittest.main()
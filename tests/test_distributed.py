@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from distributed import DistributedFrontier, RedisLeaseStore, SqliteLeaseStore  # noqa: E402
+from export import archive_files  # noqa: E402
+from scraper import WebsiteScraper  # noqa: E402
+from sitegen import SiteServer  # noqa: E402
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401  fakeredis runs the Lua scripts with it
+    HAVE_FAKEREDIS = True
+except ImportError:
+    HAVE_FAKEREDIS = False
+
+# Latency keeps pages in flight, so both workers get some
+SITE = {'pages': 60, 'asset_pool': 8, 'page_bytes': 2000, 'latency_ms': 5}
+# Short enough for a test to wait out
+TTL = 0.2
+
+def page(url, depth=0, priority=None):
+    return url, depth, priority, None
+
+class LeaseStoreTests:
+    """Contract of a lease store, run against each implementation"""
+    def open_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = self.open_store()
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_add_deduplicates(self):
+        self.assertEqual(self.store.add([page('http://a.test/'), page('http://a.test/x', 1)]), 2)
+        self.assertEqual(self.store.add([page('http://a.test/'), page('http://a.test/y', 1)]), 1)
+        self.assertTrue(self.store.started())
+        self.assertEqual(self.store.counts()['queued'], 3)
+
+    def test_leases_the_shallowest_depth_by_priority(self):
+        self.store.add([page('http://a.test/deep', 1), page('http://a.test/low', 0, 0.1),
+                        page('http://a.test/high', 0, 0.9)])
+        self.assertEqual(self.store.lease('a', 10, 60), [('http://a.test/high', 0), ('http://a.test/low', 0)])
+        # Depth 1 waits until every page of depth 0 is done
+        self.assertEqual(self.store.lease('b', 10, 60), [])
+        self.store.complete('http://a.test/high')
+        self.store.complete('http://a.test/low')
+        self.assertEqual(self.store.lease('b', 10, 60), [('http://a.test/deep', 1)])
+
+    def test_expired_lease_goes_to_another_worker(self):
+        self.store.add([page('http://a.test/')])
+        self.assertEqual(self.store.lease('a', 10, TTL), [('http://a.test/', 0)])
+        self.assertEqual(self.store.lease('b', 10, TTL), [])
+        time.sleep(TTL + 0.1)
+        self.assertEqual(self.store.lease('b', 10, 60), [('http://a.test/', 0)])
+
+    def test_renewed_lease_does_not_expire(self):
+        self.store.add([page('http://a.test/')])
+        self.store.lease('a', 10, TTL)
+        time.sleep(TTL / 2)
+        self.store.renew('a', ['http://a.test/'], 60)
+        time.sleep(TTL)
+        self.assertEqual(self.store.lease('b', 10, TTL), [])
+
+    def test_released_lease_is_leased_again_at_once(self):
+        self.store.add([page('http://a.test/')])
+        self.store.lease('a', 10, 60)
+        self.store.release('a', ['http://a.test/'])
+        self.assertEqual(self.store.lease('b', 10, 60), [('http://a.test/', 0)])
+
+    def test_asset_claims(self):
+        self.assertTrue(self.store.claim('a', 'http://a.test/app.css', TTL))
+        self.assertFalse(self.store.claim('b', 'http://a.test/app.css', TTL))
+        self.assertEqual(self.store.take_expired_assets('b', 60), [])
+        time.sleep(TTL + 0.1)
+        # The asset of a worker that stopped is handed to the next one that asks, once
+        self.assertEqual(self.store.take_expired_assets('b', 60), ['http://a.test/app.css'])
+        self.assertEqual(self.store.take_expired_assets('c', 60), [])
+        self.store.complete('http://a.test/app.css', (100, 100))
+        self.assertFalse(self.store.claim('c', 'http://a.test/app.css', 60))
+        self.assertEqual(self.store.counts()['files'], 1)
+
+    def test_finished_waits_for_held_leases(self):
+        self.store.add([page('http://a.test/')])
+        self.assertFalse(self.store.finished())
+        self.store.lease('a', 10, 60)
+        self.store.claim('a', 'http://a.test/app.js', 60)
+        self.store.complete('http://a.test/')
+        # No page is left, but worker a still downloads an asset
+        self.assertFalse(self.store.finished())
+        self.store.complete('http://a.test/app.js')
+        self.assertTrue(self.store.finished())
+        self.assertEqual(self.store.visited_urls(), {'http://a.test/', 'http://a.test/app.js'})
+
+    def test_complete_queues_links_found_on_the_page(self):
+        self.store.add([page('http://a.test/')])
+        self.store.lease('a', 10, 60)
+        self.store.complete('http://a.test/', (10, 10), [page('http://a.test/x', 1)])
+        self.assertFalse(self.store.finished())
+        self.assertEqual(self.store.lease('a', 10, 60), [('http://a.test/x', 1)])
+
+    def test_errors_page(self):
+        for i in range(5):
+            self.store.add_error(f'http://a.test/{i}', f'error {i}')
+        self.assertEqual(self.store.errors(), [f'error {i}' for i in range(5)])
+        self.assertEqual(self.store.errors(1, 2), ['error 1', 'error 2'])
+        self.assertEqual(self.store.errors(4, 10), ['error 4'])
+
+    def test_cancel_stops_leasing(self):
+        self.store.add([page('http://a.test/')])
+        self.store.cancel()
+        self.assertEqual(self.store.lease('a', 10, 60), [])
+        self.assertTrue(self.store.finished())
+
+    def test_two_workers_crawl_like_one(self):
+        with SiteServer(SITE) as server:
+            single = WebsiteScraper(server.url, os.path.join(self.dir, 'single'), max_depth=3, delay=0,
+                                    keep_visited_urls=True)
+            single.start_scraping()
+
+            output_dir = os.path.join(self.dir, 'shared')
+            workers = [WebsiteScraper(server.url, output_dir, max_depth=3, delay=0,
+                                      frontier=DistributedFrontier(self.open_store(), batch_size=4))
+                       for _ in range(2)]
+            threads = [threading.Thread(target=worker.start_scraping) for worker in workers]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(60)
+
+            self.assertEqual(self.store.visited_urls(), single.visited_urls)
+            self.assertEqual([name for _, name in archive_files(output_dir)],
+                             [name for _, name in archive_files(os.path.join(self.dir, 'single'))])
+            self.assertTrue(all(worker.files_downloaded for worker in workers))
+            self.assertEqual(sum(worker.files_downloaded for worker in workers), single.files_downloaded)
+
+class SqliteLeaseStoreTest(LeaseStoreTests, unittest.TestCase):
+    def open_store(self):
+        return SqliteLeaseStore(os.path.join(self.dir, 'frontier.sqlite'))
+
+@unittest.skipUnless(HAVE_FAKEREDIS, "needs fakeredis and lupa")
+class RedisLeaseStoreTest(LeaseStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        super().setUp()
+
+    def open_store(self):
+        with mock.patch('redis.Redis.from_url', lambda url: fakeredis.FakeRedis(server=self.server)):
+            return RedisLeaseStore('redis://fake', prefix='archiver:test')
+
+if __name__ == '__main__':
+    unittest.main()
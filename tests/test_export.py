@@ -0,0 +1,111 @@
+import io
+import os
+import sys
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+import uuid
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from export import stream_bundle  # noqa: E402
+
+FILES = {
+    'index.html': b'<html><body>home</body></html>',
+    'about/index.html': b'<html><body>about</body></html>',
+    'assets/app.js': os.urandom(200000),
+}
+
+def write_archive(directory):
+    for name, body in FILES.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+    # Crawler temp files stay out of bundles
+    with open(os.path.join(directory, '.page.part'), 'wb') as f:
+        f.write(b'partial')
+
+class StreamBundleTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.dir, 'archive')
+        write_archive(self.archive)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_zip_round_trip(self):
+        cache_path = os.path.join(self.dir, 'exports', 'task.zip')
+        body = b''.join(stream_bundle(self.archive, 'zip', 'task', cache_path))
+        with zipfile.ZipFile(io.BytesIO(body)) as bundle:
+            self.assertIsNone(bundle.testzip())
+            self.assertEqual({name: bundle.read(name) for name in bundle.namelist()},
+                             {f'task/{name}': data for name, data in FILES.items()})
+        with open(cache_path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+
+    def test_tar_gz_round_trip(self):
+        body = b''.join(stream_bundle(self.archive, 'tar.gz', 'task'))
+        with tarfile.open(fileobj=io.BytesIO(body), mode='r:gz') as bundle:
+            self.assertEqual({member.name: bundle.extractfile(member).read() for member in bundle},
+                             {f'task/{name}': data for name, data in FILES.items()})
+
+    def test_failed_bundle_raises_and_is_not_cached(self):
+        os.symlink(os.path.join(self.dir, 'missing'), os.path.join(self.archive, 'zz-broken.html'))
+        cache_path = os.path.join(self.dir, 'exports', 'task.zip')
+        chunks = []
+        with self.assertRaises(OSError):
+            for chunk in stream_bundle(self.archive, 'zip', 'task', cache_path):
+                chunks.append(chunk)
+        self.assertFalse(os.path.exists(cache_path))
+        self.assertEqual(os.listdir(os.path.dirname(cache_path)), [])
+
+class DownloadRouteTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.state_dir = tempfile.mkdtemp()
+        os.environ['ARCHIVER_STATE_DIR'] = cls.state_dir
+        os.environ['ARCHIVER_EXTERNAL_WORKER'] = '1'
+        import app
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.state_dir)
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        os.chdir(REPO_DIR)
+        self.task_id = f'test-{uuid.uuid4()}'
+        self.archive = os.path.join('static', 'downloads', self.task_id)
+        write_archive(self.archive)
+        self.app.task_store.add(self.task_id, 'http://example.test/', {'max_depth': 1}, status='completed')
+        self.client = self.app.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.archive)
+        os.chdir(self.cwd)
+
+    def test_range_is_served_once_the_bundle_is_cached(self):
+        url = f'/download/{self.task_id}/zip'
+        # Before the cache holds the bundle, Range is ignored
+        first = self.client.get(url, headers={'Range': 'bytes=0-99'})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers['Accept-Ranges'], 'none')
+        body = first.data
+
+        partial = self.client.get(url, headers={'Range': 'bytes=100-199'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.data, body[100:200])
+        self.assertEqual(self.client.get(url).data, body)
+
+    def test_unfinished_task_is_refused(self):
+        self.app.task_store.set_status(self.task_id, 'running')
+        self.assertEqual(self.client.get(f'/download/{self.task_id}/tar.gz').status_code, 409)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fingerprints  # noqa: E402
+from fingerprints import BloomFilter, BloomSet, FingerprintSet, fingerprint  # noqa: E402
+
+class HashedUrl(str):
+    """URL with a chosen hash(), to place fingerprints in given slots"""
+    def __new__(cls, url, hash_value):
+        self = super().__new__(cls, url)
+        self.hash_value = hash_value
+        return self
+
+    def __hash__(self):
+        return self.hash_value
+
+class FingerprintSetTest(unittest.TestCase):
+    def test_add_reports_new_urls_once(self):
+        urls = FingerprintSet()
+        self.assertTrue(urls.add('http://example.test/a'))
+        self.assertFalse(urls.add('http://example.test/a'))
+        self.assertIn('http://example.test/a', urls)
+        self.assertNotIn('http://example.test/b', urls)
+        self.assertEqual(len(urls), 1)
+
+    def test_grows_past_max_load_and_keeps_members(self):
+        urls = FingerprintSet()
+        count = int(fingerprints.INITIAL_SLOTS * fingerprints.MAX_LOAD) + 1
+        for i in range(count):
+            urls.add(f'http://example.test/{i}')
+        self.assertEqual(len(urls), count)
+        self.assertEqual(urls.memory_bytes(), 2 * fingerprints.INITIAL_SLOTS * 8)
+        self.assertTrue(all(f'http://example.test/{i}' in urls for i in range(count)))
+
+    def test_colliding_slots_are_probed(self):
+        urls = FingerprintSet()
+        slots = fingerprints.INITIAL_SLOTS
+        # Same low bits, so all three start probing at slot 5
+        colliding = [HashedUrl(f'http://example.test/{i}', 5 + i * slots) for i in range(3)]
+        for url in colliding:
+            self.assertTrue(urls.add(url))
+        for url in colliding:
+            self.assertIn(url, urls)
+            self.assertFalse(urls.add(url))
+        self.assertNotIn(HashedUrl('http://example.test/other', 5 + 3 * slots), urls)
+
+    def test_zero_hash_does_not_look_like_an_empty_slot(self):
+        zero = HashedUrl('http://example.test/zero', 0)
+        self.assertEqual(fingerprint(zero), 1)
+        urls = FingerprintSet()
+        self.assertNotIn(zero, urls)
+        self.assertTrue(urls.add(zero))
+        self.assertIn(zero, urls)
+        self.assertFalse(urls.add(zero))
+
+class BloomTest(unittest.TestCase):
+    def test_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        fps = [fingerprint(f'http://example.test/{i}') for i in range(1000)]
+        for fp in fps:
+            bloom.add(fp)
+        self.assertTrue(all(fp in bloom for fp in fps))
+        false_positives = sum(fingerprint(f'http://other.test/{i}') in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_set_only_looks_up_urls_the_filter_may_have_seen(self):
+        stored = set()
+        lookups = []
+
+        def lookup(url):
+            lookups.append(url)
+            return url in stored
+
+        urls = BloomSet(lookup, 1000)
+        self.assertTrue(urls.add('http://example.test/a'))
+        stored.add('http://example.test/a')
+        self.assertEqual(lookups, [])
+        self.assertFalse(urls.add('http://example.test/a'))
+        self.assertEqual(lookups, ['http://example.test/a'])
+
+    def test_false_positives_fall_back_to_the_store(self):
+        stored = set()
+        urls = BloomSet(lambda url: url in stored, 1000)
+        first = HashedUrl('http://example.test/first', 12345)
+        twin = HashedUrl('http://example.test/twin', 12345)  # Same fingerprint, so the filter says maybe
+        urls.add(first)
+        stored.add(first)
+        self.assertNotIn(twin, urls)
+        self.assertTrue(urls.add(twin))
+        self.assertEqual(len(urls), 2)
+
+    def test_preload_marks_stored_urls(self):
+        stored = {'http://example.test/a', 'http://example.test/b'}
+        urls = BloomSet(lambda url: url in stored, 1000)
+        urls.preload(stored)
+        self.assertEqual(len(urls), 2)
+        self.assertIn('http://example.test/a', urls)
+        self.assertFalse(urls.add('http://example.test/b'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from frontier import Frontier  # noqa: E402
+from scraper import WebsiteScraper  # noqa: E402
+from sitegen import SiteServer  # noqa: E402
+
+SITE = {'pages': 30, 'asset_pool': 5, 'page_bytes': 2000}
+
+class InMemoryFrontierTest(unittest.TestCase):
+    def test_visited_urls_lists_popped_and_claimed_urls(self):
+        frontier = Frontier(keep_urls=True)
+        frontier.push('http://example.test/', 0)
+        frontier.push('http://example.test/a', 1)
+        self.assertEqual(frontier.pop(), ('http://example.test/', 0))
+        self.assertTrue(frontier.claim('http://example.test/style.css'))
+        self.assertFalse(frontier.claim('http://example.test/style.css'))
+        self.assertEqual(frontier.visited_urls(), {'http://example.test/', 'http://example.test/style.css'})
+
+    def test_only_fingerprints_are_kept_by_default(self):
+        frontier = Frontier()
+        frontier.push('http://example.test/', 0)
+        frontier.pop()
+        self.assertIsNone(frontier.visited_urls())
+        self.assertTrue(frontier.is_visited('http://example.test/'))
+        self.assertFalse(frontier.push('http://example.test/', 0))
+
+    def test_visited_urls_after_in_memory_crawl(self):
+        with SiteServer(SITE) as server, tempfile.TemporaryDirectory() as output_dir:
+            def crawl(name, **options):
+                scraper = WebsiteScraper(server.url, os.path.join(output_dir, name), max_depth=2, delay=0, **options)
+                scraper.start_scraping()
+                return scraper
+
+            listed = crawl('listed', keep_visited_urls=True).visited_urls
+            # Read back from the manifest, as the frontier only holds fingerprints
+            default = crawl('default', concurrency=4)
+
+            self.assertIn(server.url, listed)
+            self.assertEqual(default.visited_urls, listed)
+            self.assertEqual(default.frontier.visited_count(), len(listed))
+
+if __name__ == '__main__':
+    unittest.main()
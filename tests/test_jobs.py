@@ -0,0 +1,128 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JobScheduler, run_task, run_worker  # noqa: E402
+from tasks import TaskStore  # noqa: E402
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+class FakeScraper:
+    cancelled = False
+
+    def __init__(self, release=None):
+        self.release = release
+
+    def start_scraping(self):
+        if self.release is not None:
+            self.release.wait(5)
+
+    def stats(self):
+        return {'files_downloaded': 3}
+
+    def cancel(self):
+        self.cancelled = True
+
+class JobSchedulerTest(unittest.TestCase):
+    def test_runs_at_most_workers_jobs_at_once(self):
+        scheduler = JobScheduler(2)
+        lock = threading.Lock()
+        release = threading.Event()
+        running, peak, done = [0], [0], []
+
+        def job(i):
+            def run():
+                with lock:
+                    running[0] += 1
+                    peak[0] = max(peak[0], running[0])
+                release.wait(5)
+                with lock:
+                    running[0] -= 1
+                    done.append(i)
+            return run
+
+        for i in range(6):
+            scheduler.submit(f'job-{i}', job(i))
+        wait_for(lambda: scheduler.stats()['running'] == 2)
+        self.assertEqual(scheduler.stats(), {'workers': 2, 'queued': 4, 'running': 2})
+        release.set()
+        wait_for(lambda: len(done) == 6)
+        self.assertEqual(peak[0], 2)
+
+    def test_position_follows_priority_then_submission(self):
+        scheduler = JobScheduler(1)
+        release = threading.Event()
+        scheduler.submit('running', lambda: release.wait(5))
+        wait_for(lambda: scheduler.position('running') == 0)
+        scheduler.submit('low', lambda: None, priority=5)
+        scheduler.submit('first', lambda: None)
+        scheduler.submit('second', lambda: None)
+        self.assertEqual([scheduler.position(job) for job in ('first', 'second', 'low')], [1, 2, 3])
+        self.assertIsNone(scheduler.position('unknown'))
+        release.set()
+
+    def test_cancel_drops_a_queued_job_and_stops_a_running_one(self):
+        scheduler = JobScheduler(1)
+        release = threading.Event()
+        ran = []
+        scheduler.submit('running', lambda: release.wait(5), cancel=release.set)
+        wait_for(lambda: scheduler.position('running') == 0)
+        scheduler.submit('queued', lambda: ran.append('queued'))
+        scheduler.submit('after', lambda: ran.append('after'))
+
+        self.assertEqual(scheduler.cancel('queued'), 'queued')
+        self.assertIsNone(scheduler.position('queued'))
+        self.assertEqual(scheduler.cancel('running'), 'running')
+        wait_for(lambda: ran == ['after'])
+        self.assertIsNone(scheduler.cancel('queued'))
+
+class RunTaskTest(unittest.TestCase):
+    def test_reports_status_and_stats(self):
+        statuses, stats = [], {}
+        run_task('t', FakeScraper, lambda task_id, status: statuses.append(status), stats.__setitem__)
+        self.assertEqual(statuses, ['running', 'completed'])
+        self.assertEqual(stats['t'], {'files_downloaded': 3})
+
+    def test_fails_the_task_when_the_scraper_cannot_be_built(self):
+        statuses, stats = [], {}
+
+        def build():
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            run_task('t', build, lambda task_id, status: statuses.append(status), stats.__setitem__)
+        self.assertEqual(statuses, ['failed'])
+        self.assertEqual(stats['t']['error_count'], 1)
+        self.assertIn('disk full', stats['t']['error'])
+
+class RunWorkerTest(unittest.TestCase):
+    def test_keeps_polling_after_a_scraper_cannot_be_built(self):
+        with tempfile.TemporaryDirectory() as state_dir:
+            store = TaskStore(os.path.join(state_dir, 'tasks.sqlite'))
+            store.add('broken', 'http://broken.test/', {'max_depth': 1})
+            store.add('working', 'http://working.test/', {'max_depth': 1})
+
+            def create_scraper(task_id, url, options, join=False):
+                if task_id == 'broken':
+                    raise OSError("disk full")
+                return FakeScraper()
+
+            threading.Thread(target=run_worker, args=(store, create_scraper),
+                             kwargs={'workers': 1, 'poll_interval': 0.05}, daemon=True).start()
+            wait_for(lambda: store.get('working')['status'] == 'completed')
+            broken = store.get('broken')
+            self.assertEqual(broken['status'], 'failed')
+            self.assertIn('disk full', broken['stats']['error'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from manifest import Manifest  # noqa: E402
+from postprocess import OptimizedStore, PostProcessor, minify_css, minify_html  # noqa: E402
+
+PAGE = b'<html>\n  <body>\n    <!-- nav -->\n    <p>Hello   world</p>\n    <pre>  kept  </pre>\n  </body>\n</html>\n'
+STYLE = b'/* theme */\nbody {\n  color : red ;\n  content: "a  b";\n}\n'
+# Nothing to take out, so the file is left alone
+TIGHT = b'<p>x</p>'
+
+def archive(root, name, files):
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    manifest = Manifest(os.path.join(root, f'{name}.sqlite'), root=directory)
+    for path, content_type, body in files:
+        with open(os.path.join(directory, path), 'wb') as f:
+            f.write(body)
+        manifest.record(f'http://a.test/{path}', path, 200, content_type, len(body), hashlib.sha256(body).hexdigest())
+    return manifest
+
+class MinifyTest(unittest.TestCase):
+    def test_html_keeps_verbatim_blocks(self):
+        # The whitespace on each side of the dropped comment collapses separately
+        self.assertEqual(minify_html(PAGE),
+                         b'<html>\n<body>\n\n<p>Hello world</p>\n<pre>  kept  </pre>\n</body>\n</html>\n')
+
+    def test_css_keeps_strings(self):
+        self.assertEqual(minify_css(STYLE), b'body{color : red;content: "a  b"}')
+
+class PostProcessorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.store = OptimizedStore(os.path.join(self.dir.name, 'optimized'))
+        self.processor = PostProcessor(self.store, workers=1, kinds={'html', 'css'})
+        self.files = [('index.html', 'text/html', PAGE), ('site.css', 'text/css', STYLE),
+                      ('tight.html', 'text/html; charset=utf-8', TIGHT)]
+
+    def tearDown(self):
+        self.processor.close()
+        self.dir.cleanup()
+
+    def run_counting(self, manifest):
+        """The report of a run, and how many files were sent to the workers"""
+        with mock.patch.object(self.processor._executor, 'submit', wraps=self.processor._executor.submit) as submit:
+            report = self.processor.run(manifest)
+        return report, submit.call_count
+
+    def test_second_run_reuses_cached_results(self):
+        first = archive(self.dir.name, 'first', self.files)
+        report, submitted = self.run_counting(first)
+        self.assertEqual(submitted, 3)
+        self.assertEqual(report['html']['files'], 1)
+        self.assertEqual(report['css']['files'], 1)
+
+        # The same bodies in another archive come from the cache
+        second = archive(self.dir.name, 'second', self.files)
+        report, submitted = self.run_counting(second)
+        self.assertEqual(submitted, 0)
+        self.assertEqual(report['html']['cached'], 2)
+        self.assertEqual(report['css']['cached'], 1)
+        self.assertEqual(report['html']['files'], 1)
+        self.assertEqual(json.loads(second.get_meta('postprocess')), report)
+        with open(os.path.join(self.dir.name, 'second', 'index.html'), 'rb') as f:
+            self.assertEqual(f.read(), minify_html(PAGE))
+
+        # Files already replaced are skipped
+        report, submitted = self.run_counting(second)
+        self.assertEqual(submitted, 0)
+        self.assertEqual(report['html']['files'] + report['html']['cached'], 1)
+
+    def test_only_smaller_bodies_replace_files(self):
+        manifest = archive(self.dir.name, 'first', self.files)
+        self.processor.run(manifest)
+        tight = manifest.get('http://a.test/tight.html')
+        self.assertIsNone(tight['stored_sha256'])
+        self.assertEqual(self.store.get(tight['sha256']), (None, None, len(TIGHT)))
+        with open(manifest.file_path(tight), 'rb') as f:
+            self.assertEqual(f.read(), TIGHT)
+
+        page = manifest.get('http://a.test/index.html')
+        self.assertEqual(page['sha256'], hashlib.sha256(PAGE).hexdigest())
+        self.assertEqual(page['stored_size'], len(minify_html(PAGE)))
+        self.assertLess(page['stored_size'], page['size'])
+        self.assertEqual(page['stored_sha256'], hashlib.sha256(minify_html(PAGE)).hexdigest())
+
+if __name__ == '__main__':
+    unittest.main()
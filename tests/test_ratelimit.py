@@ -0,0 +1,128 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from urllib.robotparser import RobotFileParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ratelimit  # noqa: E402
+from ratelimit import HostLimiter, parse_retry_after  # noqa: E402
+
+class FakeClock:
+    """Stands in for the time module: sleeping only moves the clock"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def robots(*lines):
+    parser = RobotFileParser()
+    parser.parse(['User-agent: *', *lines])
+    return parser
+
+class HostLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(ratelimit, 'time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sent_at(self, limiter, count):
+        """Clock readings at which count requests were let through"""
+        times = []
+        for _ in range(count):
+            limiter.wait_turn()
+            times.append(self.clock.now)
+        return times
+
+    def test_delay_paces_requests(self):
+        limiter = HostLimiter('example.test', 4, 0.5)
+        times = self.sent_at(limiter, 3)
+        self.assertEqual([round(b - a, 6) for a, b in zip(times, times[1:])], [0.5, 0.5])
+
+    def test_crawl_delay_caps_the_rate(self):
+        limiter = HostLimiter('example.test', 4, 0.1, burst=5)
+        limiter.set_robots(robots('Crawl-delay: 2'), '*')
+        self.assertEqual(limiter.rate, 0.5)
+        self.assertEqual(limiter.burst, 1)
+        times = self.sent_at(limiter, 3)
+        self.assertEqual([round(b - a, 6) for a, b in zip(times, times[1:])], [2.0, 2.0])
+        # Healthy responses never take the rate past the crawl delay
+        for _ in range(50):
+            limiter.record(200, 0.05)
+        self.assertEqual(limiter.rate, 0.5)
+
+    def test_request_rate_caps_the_rate(self):
+        limiter = HostLimiter('example.test', 4, 0)
+        limiter.set_robots(robots('Request-rate: 1/4'), '*')
+        self.assertEqual(limiter.max_rate, 0.25)
+        self.assertEqual(limiter.rate, 0.25)
+
+    def test_throttling_halves_the_rate_once_per_cooldown(self):
+        limiter = HostLimiter('example.test', 4, 0.1)
+        limiter.record(503, 0.05)
+        self.assertEqual(limiter.rate, 5.0)
+        limiter.record(429, 0.05)
+        self.assertEqual(limiter.rate, 5.0)
+        self.clock.sleep(ratelimit.BACKOFF_COOLDOWN)
+        limiter.record(429, 0.05)
+        self.assertEqual(limiter.rate, 2.5)
+        self.assertEqual(limiter.throttled, 3)
+
+    def test_retry_after_pauses_the_host(self):
+        limiter = HostLimiter('example.test', 4, 0)
+        limiter.wait_turn()
+        limiter.record(429, 0.05, retry_after='7')
+        self.assertTrue(limiter.stats()['paused'])
+        start = self.clock.now
+        limiter.wait_turn()
+        self.assertGreaterEqual(self.clock.now - start, 7)
+        self.assertFalse(limiter.stats()['paused'])
+
+    def test_ramps_up_after_successes_then_creeps_back_after_trouble(self):
+        limiter = HostLimiter('example.test', 4, 1.0)
+        limiter.record(200, 0.05)
+        self.assertAlmostEqual(limiter.rate, ratelimit.RAMP_UP)
+        limiter.record(503, 0.05)
+        backed_off = limiter.rate
+        self.assertAlmostEqual(backed_off, ratelimit.RAMP_UP * ratelimit.BACK_OFF)
+        limiter.record(200, 0.05)
+        limiter.record(200, 0.05)
+        self.assertAlmostEqual(limiter.rate, backed_off + 2 * ratelimit.RATE_STEP)
+
+    def test_fast_host_becomes_unlimited(self):
+        limiter = HostLimiter('example.test', 4, 0.01)
+        for _ in range(100):
+            limiter.record(200, 0.01)
+        self.assertIsNone(limiter.rate)
+
+    def test_errors_and_slow_responses_back_off(self):
+        limiter = HostLimiter('example.test', 4, 0.1)
+        for _ in range(3):
+            limiter.record(None, 0)
+        self.assertEqual(limiter.rate, 5.0)
+
+        limiter = HostLimiter('example.test', 4, 0.1)
+        for _ in range(ratelimit.LATENCY_WARMUP):
+            limiter.record(200, 0.05)
+        rate = limiter.rate
+        limiter.record(200, 2.0)
+        self.assertAlmostEqual(limiter.rate, rate * ratelimit.BACK_OFF)
+
+class RetryAfterTest(unittest.TestCase):
+    def test_seconds_and_dates(self):
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+if __name__ == '__main__':
+    unittest.main()
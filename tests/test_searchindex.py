@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import searchindex  # noqa: E402
+from searchindex import SearchIndex, fts_query, page_text  # noqa: E402
+
+PAGES = [
+    ('http://a.test/', 'Home', 'Welcome to the archive of <b>distributed</b> crawling notes'),
+    ('http://a.test/redis', 'Redis leases', 'Workers lease pages AND assets from a shared queue'),
+    ('http://a.test/near', 'Near misses', 'Bloom filters NEAR capacity answer more lookups'),
+]
+
+class FtsQueryTest(unittest.TestCase):
+    def test_words_are_quoted_and_the_last_is_a_prefix(self):
+        self.assertEqual(fts_query('lease pag'), '"lease" "pag"*')
+        self.assertEqual(fts_query('"shared queue" workers'), '"shared queue" "workers"*')
+        self.assertEqual(fts_query('"shared queue"'), '"shared queue"')
+
+    def test_operators_and_punctuation_are_searched_as_text(self):
+        self.assertEqual(fts_query('pages AND -assets*'), '"pages" "AND" "assets"*')
+        self.assertEqual(fts_query('a NEAR(b)'), '"a" "NEAR" "b"*')
+        self.assertIsNone(fts_query('"" - * ()'))
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.dir.name, 'search.sqlite'))
+        writer = self.index.writer('task-1')
+        for url, title, html in PAGES:
+            soup = BeautifulSoup(f'<html><head><title>{title}</title></head><body><p>{html}</p>'
+                                 f'<script>var hidden = "secret";</script></body></html>', 'html.parser')
+            writer.add(url, *page_text(soup))
+        writer.flush()
+
+    def tearDown(self):
+        self.index.close()
+        self.dir.cleanup()
+
+    def urls(self, query, **kwargs):
+        return [hit['url'] for hit in self.index.search(query, **kwargs)]
+
+    def test_query_syntax_does_not_raise(self):
+        for query in ('"unbalanced quote', 'lease - pages', 'pages AND', 'NEAR', 'bloom*', 'x:y', '-', '"',
+                      'col:umn "a" OR NOT'):
+            self.index.search(query)
+        self.assertEqual(self.urls('"shared queue" -workers'), ['http://a.test/redis'])
+        self.assertEqual(self.urls('pages AND assets'), ['http://a.test/redis'])
+        self.assertEqual(self.urls('NEAR capacity'), ['http://a.test/near'])
+
+    def test_prefix_and_stemming(self):
+        self.assertEqual(self.urls('distrib'), ['http://a.test/'])
+        self.assertEqual(self.urls('leasing'), ['http://a.test/redis'])
+
+    def test_script_text_is_not_indexed(self):
+        self.assertEqual(self.urls('secret'), [])
+
+    def test_snippet_marks_matches_and_escapes_html(self):
+        writer = self.index.writer('task-2')
+        writer.add('http://b.test/', 'Markup', 'Use <mark> & <script> tags carefully')
+        writer.flush()
+        hit = self.index.search('carefully', task_ids=['task-2'])[0]
+        self.assertIn('<mark>carefully</mark>', hit['snippet'])
+        self.assertIn('&lt;script&gt;', hit['snippet'])
+        self.assertNotIn(searchindex.MATCH_START, hit['snippet'])
+
+    def test_title_matches_rank_first_and_tasks_filter(self):
+        writer = self.index.writer('task-2')
+        writer.add('http://b.test/redis', 'Unrelated', 'mentions redis once in the body')
+        writer.flush()
+        self.assertEqual(self.urls('redis'), ['http://a.test/redis', 'http://b.test/redis'])
+        self.assertEqual(self.urls('redis', task_ids=['task-2']), ['http://b.test/redis'])
+
+    def test_crawling_a_page_again_replaces_its_text(self):
+        writer = self.index.writer('task-1')
+        writer.add('http://a.test/', 'Home', 'Rewritten welcome page')
+        writer.flush()
+        self.assertEqual(self.urls('distributed'), [])
+        self.assertEqual(self.urls('rewritten'), ['http://a.test/'])
+        self.assertEqual(self.index.count('task-1'), len(PAGES))
+
+if __name__ == '__main__':
+    unittest.main()
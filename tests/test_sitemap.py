@@ -0,0 +1,75 @@
+import os
+import sys
+import gzip
+import tempfile
+import unittest
+
+import requests
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+from frontier import Frontier, SqliteFrontier  # noqa: E402
+from sitegen import SiteServer  # noqa: E402
+from sitemap import SitemapEntry, iter_sitemap, parse_lastmod, read_sitemaps, sitemap_chunks  # noqa: E402
+
+SITE = {'pages': 30, 'sitemap': True, 'sitemap_size': 8}
+
+class ChunkedResponse:
+    def __init__(self, body, chunk_size):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+class SitemapParsingTest(unittest.TestCase):
+    def test_gzipped_sitemap_is_read_across_chunks(self):
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+               '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+               '<url><loc>http://a.test/x</loc><priority>0.8</priority><lastmod>2024-05-01</lastmod></url>'
+               '<url><loc> http://a.test/y </loc><priority>7</priority></url>'
+               '<url><priority>0.5</priority></url>'
+               '</urlset>')
+        items = list(iter_sitemap(sitemap_chunks(ChunkedResponse(gzip.compress(xml.encode()), 7))))
+        self.assertEqual(items, [('url', SitemapEntry('http://a.test/x', 0.8, parse_lastmod('2024-05-01'))),
+                                 ('url', SitemapEntry('http://a.test/y', 1.0, None))])
+
+    def test_index_lists_sitemaps(self):
+        xml = (b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+               b'<sitemap><loc>http://a.test/s1.xml.gz</loc></sitemap>'
+               b'<sitemap><loc>http://a.test/s2.xml</loc><lastmod>2024-01-01</lastmod></sitemap>'
+               b'</sitemapindex>')
+        self.assertEqual(list(iter_sitemap([xml])),
+                         [('sitemap', 'http://a.test/s1.xml.gz'), ('sitemap', 'http://a.test/s2.xml')])
+
+    def test_lastmod_formats(self):
+        self.assertEqual(parse_lastmod('2024-05-01T02:00:00+02:00'), parse_lastmod('2024-05-01'))
+        self.assertEqual(parse_lastmod('2024-05-01T00:00:00Z'), parse_lastmod('2024-05-01'))
+        self.assertIsNone(parse_lastmod('yesterday'))
+
+class SitemapSeedingTest(unittest.TestCase):
+    def test_gzipped_index_orders_the_frontier(self):
+        with SiteServer(SITE) as server, tempfile.TemporaryDirectory() as state_dir:
+            session = requests.Session()
+            entries = list(read_sitemaps(lambda url: session.get(url, stream=True), lambda response: response.close(),
+                                         [server.url + 'sitemap-index.xml']))
+            self.assertEqual(len(entries), SITE['pages'])
+            self.assertEqual(len(set(entry.url for entry in entries)), SITE['pages'])
+            self.assertTrue(all(entry.priority is not None and entry.lastmod for entry in entries))
+
+            # Highest priority first, then the freshest, then in sitemap order
+            expected = [entries[index].url for index, _ in sorted(
+                enumerate(entries), key=lambda item: (-item[1].priority, -item[1].lastmod, item[0]))]
+            for frontier in (Frontier(), SqliteFrontier(os.path.join(state_dir, 'frontier.sqlite'))):
+                frontier.push(server.url + 'deeper', 2, 1.0)
+                for entry in entries:
+                    frontier.push(entry.url, 1, entry.priority, entry.lastmod)
+                order = [frontier.pop()[0] for _ in range(len(entries) + 1)]
+                self.assertEqual(order, expected + [server.url + 'deeper'])
+                frontier.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from manifest import Manifest, url_segments  # noqa: E402
+from snapshotdiff import diff_manifests, text_diff  # noqa: E402
+
+SITE = 'http://a.test/'
+
+def site_urls():
+    """A few hundred URLs spread over nested directories"""
+    urls = [SITE, SITE + 'about?lang=en']
+    for section in range(8):
+        for sub in range(5):
+            urls += [f'{SITE}s{section}/d{sub}/page{i}.html' for i in range(6)]
+    return urls
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def snapshot(urls, changed=None):
+    manifest = Manifest()
+    for url in urls:
+        body = 'new' if url == changed else url
+        manifest.record(url, url[len(SITE):] or 'index.html', 200, 'text/html', len(body), digest(body))
+    return manifest
+
+class TreeSpy:
+    """Records the directories a diff lists"""
+    def __init__(self, manifest):
+        self.listed = []
+        self._children = manifest.tree_children
+        manifest.tree_children = self
+
+    def __call__(self, parent):
+        self.listed.append(parent)
+        return self._children(parent)
+
+class DiffManifestsTest(unittest.TestCase):
+    def test_url_segments_join_back_to_the_url(self):
+        for url in ('http://a.test/', 'http://a.test/x/y/z.html', 'http://a.test/x/?q=a/b', 'http://a.test:8080/x'):
+            self.assertEqual(''.join(url_segments(url)), url)
+
+    def test_identical_snapshots_compare_nothing(self):
+        report = diff_manifests(snapshot(site_urls()), snapshot(site_urls()))
+        self.assertEqual(report, {'added': [], 'removed': [], 'changed': [], 'directories_compared': 0})
+
+    def test_only_the_path_to_a_changed_file_is_compared(self):
+        urls = site_urls()
+        deep = f'{SITE}s3/d2/page4.html'
+        old, new = snapshot(urls), snapshot(urls, changed=deep)
+        spy = TreeSpy(new)
+        report = diff_manifests(old, new)
+        self.assertEqual(report['changed'], [deep])
+        self.assertEqual(report['added'] + report['removed'], [])
+        self.assertEqual(spy.listed, ['', SITE, SITE + 's3/', SITE + 's3/d2/'])
+        self.assertEqual(report['directories_compared'], 4)
+
+    def test_added_and_removed_subtrees_are_listed_without_descending(self):
+        urls = site_urls()
+        gone = [url for url in urls if '/s7/' in url]
+        added = [f'{SITE}s9/x/page{i}.html' for i in range(3)] + [f'{SITE}s0/d0/extra.html']
+        old = snapshot(urls)
+        new = snapshot([url for url in urls if url not in gone] + added)
+        spy = TreeSpy(new)
+        report = diff_manifests(old, new)
+        self.assertEqual(report['removed'], sorted(gone))
+        self.assertEqual(report['added'], sorted(added))
+        self.assertEqual(report['changed'], [])
+        self.assertEqual(sorted(spy.listed), ['', SITE, SITE + 's0/', SITE + 's0/d0/'])
+
+    def test_status_changes_count_as_changes(self):
+        old = snapshot([SITE])
+        new = Manifest()
+        new.record(SITE, 'index.html', 404, 'text/html', len(SITE), digest(SITE))
+        self.assertEqual(diff_manifests(old, new)['changed'], [SITE])
+
+    def test_tree_is_rebuilt_after_new_entries(self):
+        manifest = snapshot([SITE])
+        first = manifest.build_tree()
+        self.assertEqual(manifest.build_tree(), first)
+        manifest.record(SITE + 'x', 'x', 200, 'text/html', 1, digest('x'))
+        self.assertNotEqual(manifest.build_tree(), first)
+
+class TextDiffTest(unittest.TestCase):
+    def test_diff_of_a_saved_page(self):
+        with tempfile.TemporaryDirectory() as root:
+            manifests = []
+            for name, body in (('old', '<p>one</p>\n<p>two</p>\n'), ('new', '<p>one</p>\n<p>three</p>\n')):
+                os.makedirs(os.path.join(root, name))
+                with open(os.path.join(root, name, 'index.html'), 'w') as f:
+                    f.write(body)
+                manifest = Manifest(root=os.path.join(root, name))
+                manifest.record(SITE, 'index.html', 200, 'text/html; charset=utf-8', len(body), digest(body))
+                manifests.append(manifest)
+            diff = text_diff(*manifests, SITE)
+            self.assertIn('-<p>two</p>', diff)
+            self.assertIn('+<p>three</p>', diff)
+            self.assertIsNone(text_diff(*manifests, SITE + 'missing'))
+
+if __name__ == '__main__':
+    unittest.main()
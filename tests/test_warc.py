@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import gzip
+import json
+import zlib
+import hashlib
+import zipfile
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from warc import INDEX_FILENAME, WARC_FILENAME, WarcWriter, surt  # noqa: E402
+
+def fake_response(status=200, content_type='text/html'):
+    headers = {'Content-Type': content_type, 'Content-Encoding': 'gzip', 'ETag': '"abc"'}
+    return SimpleNamespace(status_code=status, reason=None, headers=headers,
+                           raw=SimpleNamespace(version=11, headers=headers))
+
+def write(writer, url, body, **kwargs):
+    return writer.write_response(url, fake_response(**kwargs), io.BytesIO(body), len(body),
+                                 hashlib.sha256(body).hexdigest(), page=True)
+
+def read_record(path, offset, length):
+    """One record, read through its own gzip member"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return zlib.decompress(f.read(length), 31)
+
+class WarcWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, WARC_FILENAME)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_records_are_read_back_through_cdxj_offsets(self):
+        writer = WarcWriter(self.dir.name, 'http://example.test/')
+        write(writer, 'http://example.test/', b'<html>home</html>')
+        writer.close()
+        # Appending after a restart keeps the warcinfo record
+        writer = WarcWriter(self.dir.name)
+        write(writer, 'http://example.test/about', b'<html>about</html>')
+        writer.finish()
+
+        with open(os.path.join(self.dir.name, INDEX_FILENAME), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines, sorted(lines))
+        for line, body in zip(lines, (b'<html>home</html>', b'<html>about</html>')):
+            key, timestamp, fields = line.split(' ', 2)
+            fields = json.loads(fields)
+            self.assertEqual(key, surt(fields['url']))
+            record = read_record(self.path, int(fields['offset']), int(fields['length']))
+            head, http_head, payload = record.split(b'\r\n\r\n', 2)
+            self.assertTrue(head.startswith(b'WARC/1.1\r\nWARC-Type: response'))
+            self.assertIn(f"WARC-Target-URI: {fields['url']}".encode(), head)
+            self.assertIn(b'WARC-Warcinfo-ID', head)
+            self.assertTrue(http_head.startswith(b'HTTP/1.1 200 OK'))
+            self.assertNotIn(b'Content-Encoding', http_head)
+            self.assertEqual(payload, body + b'\r\n\r\n')
+            self.assertEqual(fields['digest'], f'sha256:{hashlib.sha256(body).hexdigest()}')
+
+        # Read whole, the gzip members make up one WARC: warcinfo and two responses
+        with gzip.open(self.path, 'rb') as f:
+            self.assertEqual(f.read().count(b'WARC/1.1\r\n'), 3)
+
+    def test_torn_record_is_cut_off_on_reopen(self):
+        writer = WarcWriter(self.dir.name)
+        write(writer, 'http://example.test/', b'<html>home</html>')
+        writer.close()
+        complete = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'\x1f\x8b\x08 half a record')
+
+        writer = WarcWriter(self.dir.name)
+        self.assertEqual(os.path.getsize(self.path), complete)
+        write(writer, 'http://example.test/next', b'<html>next</html>')
+        writer.close()
+        entry = writer.entries()[-1]
+        self.assertEqual(entry['offset'], complete)
+        self.assertIn(b'<html>next</html>', read_record(self.path, entry['offset'], entry['length']))
+
+    def test_wacz_layout(self):
+        writer = WarcWriter(self.dir.name, 'http://example.test/')
+        write(writer, 'http://example.test/', b'<html>home</html>')
+        write(writer, 'http://example.test/missing', b'gone', status=404)
+        wacz_path = writer.finish(wacz=True, title='Example')
+
+        with zipfile.ZipFile(wacz_path) as wacz:
+            self.assertEqual(sorted(wacz.namelist()), ['archive/data.warc.gz', 'datapackage.json',
+                                                       'indexes/index.cdxj', 'pages/pages.jsonl'])
+            # Stored, so replay tools can seek into the WARC
+            self.assertEqual(wacz.getinfo('archive/data.warc.gz').compress_type, zipfile.ZIP_STORED)
+            datapackage = json.loads(wacz.read('datapackage.json'))
+            for resource in datapackage['resources']:
+                data = wacz.read(resource['path'])
+                self.assertEqual(resource['bytes'], len(data))
+                self.assertEqual(resource['hash'], f'sha256:{hashlib.sha256(data).hexdigest()}')
+            pages = [json.loads(line) for line in wacz.read('pages/pages.jsonl').decode().splitlines()]
+        self.assertEqual(datapackage['title'], 'Example')
+        self.assertEqual(datapackage['mainPageUrl'], 'http://example.test/')
+        # Only pages that loaded are listed, after the header line
+        self.assertEqual([page.get('url') for page in pages], [None, 'http://example.test/'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlparse, unquote, parse_qsl, urlencode
+
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+# What clean() does with query strings: drop them (the archive stores one file
+# per path), keep them as they are, or keep them with parameters sorted
+QUERY_POLICIES = ('drop', 'keep', 'sort')
+
+DEFAULT_CACHE_SIZE = 65536
+
+# Rewrites applied to the path of matching hosts; the first rule whose pattern
+# matches wins. host matches as a substring of the URL's host.
+RewriteRule = namedtuple('RewriteRule', 'host pattern replacement')
+
+def rewrite_rule(host, pattern, replacement):
+    return RewriteRule(host, re.compile(pattern), replacement)
+
+# Webflow sites serve pages without /index.html, and some templates from a
+# different directory than they link to
+DEFAULT_REWRITE_RULES = [
+    rewrite_rule('webflow.io', re.escape(f'/{page}/index.html'), f'/{section}/{page}')
+    for section, pages in (('home-pages', ('home-v2', 'home-v3')),
+                           ('blog-pages', ('blog-v1', 'blog-v2', 'blog-v3')),
+                           ('contact-pages', ('contact-v1', 'contact-v2', 'contact-v3')))
+    for page in pages
+] + [rewrite_rule('webflow.io', r'/index\.html$', '')]
+
+def load_rewrite_rules(path):
+    """Read rewrite rules from a JSON list of {"host", "pattern", "replacement"} objects"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [rewrite_rule(rule.get('host', ''), rule['pattern'], rule.get('replacement', ''))
+                for rule in json.load(f)]
+
+def normalize_netloc(scheme, netloc):
+    """Lowercase the host and drop the scheme's default port"""
+    userinfo, at, hostport = netloc.rpartition('@')
+    host, port = hostport, ''
+    if ':' in hostport and not hostport.endswith(']'):
+        host, _, port = hostport.rpartition(':')
+    if port == DEFAULT_PORTS.get(scheme):
+        port = ''
+    return f"{userinfo}{at}{host.lower()}{':' + port if port else ''}"
+
+def remove_dot_segments(path):
+    """Resolve . and .. path segments (RFC 3986, section 5.2.4)"""
+    if '/.' not in path and not path.startswith('.'):
+        return path
+    segments = path.split('/')
+    output = []
+    for segment in segments:
+        if segment == '.':
+            continue
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+            continue
+        output.append(segment)
+    if segments[-1] in ('.', '..'):
+        output.append('')
+    return '/'.join(output) or '/'
+
+def cache_stats(cached):
+    info = cached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': round(info.hits / lookups, 3) if lookups else None,
+    }
+
+class UrlNormalizer:
+    """Canonical form of the URLs the crawler queues and fetches, memoized.
+
+    clean() lowercases the scheme and host, drops default ports and the
+    fragment, resolves dot segments, applies the query policy and the first
+    matching rewrite rule, all in one parse of the URL.
+    """
+    def __init__(self, rewrite_rules=None, query_policy='drop', cache_size=DEFAULT_CACHE_SIZE):
+        if query_policy not in QUERY_POLICIES:
+            raise ValueError(f"query_policy must be one of {', '.join(QUERY_POLICIES)}")
+        self.rewrite_rules = DEFAULT_REWRITE_RULES if rewrite_rules is None else list(rewrite_rules)
+        self.query_policy = query_policy
+        self.clean = lru_cache(maxsize=cache_size)(self._clean)
+
+    def _clean(self, url):
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        netloc = normalize_netloc(scheme, parsed.netloc)
+        path = remove_dot_segments(parsed.path)
+
+        host = netloc.rpartition('@')[2]
+        for rule in self.rewrite_rules:
+            if rule.host in host and rule.pattern.search(path):
+                path = rule.pattern.sub(rule.replacement, path)
+                break
+
+        query = ''
+        if parsed.query and self.query_policy == 'keep':
+            query = '?' + parsed.query
+        elif parsed.query and self.query_policy == 'sort':
+            query = '?' + urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+        return f"{scheme}://{netloc}{path}{query}"
+
+    def cache_stats(self):
+        return {'clean': cache_stats(self.clean)}
+
+class PathMapper:
+    """Memoized mapping of URLs to files in the archive and to relative links between them"""
+    def __init__(self, output_dir, cache_size=DEFAULT_CACHE_SIZE):
+        self.output_dir = output_dir
+        self.site_path = lru_cache(maxsize=cache_size)(self._site_path)
+        self.locate = lru_cache(maxsize=cache_size)(self._locate)
+        self.file_path = lru_cache(maxsize=cache_size)(self._file_path)
+        # Keyed by directory rather than page, so pages in one directory share entries
+        self._relative = lru_cache(maxsize=cache_size)(self._relative_path)
+
+    def _site_path(self, path):
+        """Map a URL path to the file it is saved as, relative to the archive root"""
+        path = path.strip('/')
+
+        # If the path is empty, it's the root
+        if not path:
+            return 'index.html'
+        # Add index.html for directory paths
+        if '.' not in os.path.basename(path):
+            return os.path.join(path, 'index.html')
+        return path
+
+    def _locate(self, url):
+        """(normalized host, site path) of a URL"""
+        parsed = urlparse(url)
+        return normalize_netloc(parsed.scheme, parsed.netloc), self.site_path(parsed.path)
+
+    def _file_path(self, url):
+        """Convert a URL to a local file path"""
+        # Decode URL-encoded characters
+        return os.path.join(self.output_dir, unquote(self.locate(url)[1]))
+
+    def relative_path(self, from_url, to_url):
+        """Calculate the relative path from one URL to another"""
+        from_netloc, from_path = self.locate(from_url)
+        to_netloc, to_path = self.locate(to_url)
+
+        # If different domains, keep the absolute URL
+        if from_netloc != to_netloc:
+            return to_url
+        return self._relative(os.path.dirname(from_path), to_path)
+
+    def _relative_path(self, from_dir, to_path):
+        to_dir = os.path.dirname(to_path)
+        if from_dir == to_dir:
+            return os.path.basename(to_path)
+
+        # Find the common prefix of the two directories
+        from_parts = from_dir.split('/')
+        to_parts = to_dir.split('/')
+        common_prefix = 0
+        for i in range(min(len(from_parts), len(to_parts))):
+            if from_parts[i] != to_parts[i]:
+                break
+            common_prefix += 1
+
+        # Go up to the common directory, then down to the target
+        up_dirs = ['..'] * (len(from_parts) - common_prefix)
+        down_dirs = to_parts[common_prefix:]
+
+        rel_path = '/'.join(up_dirs + down_dirs)
+        if rel_path:
+            rel_path += '/'
+        return rel_path + os.path.basename(to_path)
+
+    def cache_stats(self):
+        return {
+            'site_path': cache_stats(self.site_path),
+            'locate': cache_stats(self.locate),
+            'file_path': cache_stats(self.file_path),
+            'relative_path': cache_stats(self._relative),
+        }
@@ -0,0 +1,258 @@
+import os
+import json
+import uuid
+import zlib
+import hashlib
+import zipfile
+import threading
+import logging
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+WARC_FILENAME = 'data.warc.gz'
+INDEX_FILENAME = 'index.cdxj'
+WACZ_FILENAME = 'archive.wacz'
+
+# The stored payload is the decoded body, so headers describing the wire encoding are replaced
+HOP_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+REASONS = {200: 'OK', 301: 'Moved Permanently', 302: 'Found', 304: 'Not Modified',
+           403: 'Forbidden', 404: 'Not Found', 500: 'Internal Server Error'}
+
+def surt(url):
+    """Sort-friendly URL key used by CDX indexes: com,example)/path?query"""
+    parsed = urlsplit(url)
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    key = ','.join(reversed(host.split('.')))
+    if parsed.port and parsed.port != {'http': 80, 'https': 443}.get(parsed.scheme):
+        key += f':{parsed.port}'
+    key += ')' + (parsed.path or '/').lower()
+    if parsed.query:
+        key += '?' + '&'.join(sorted(parsed.query.split('&'))).lower()
+    return key
+
+def warc_date(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class WarcWriter:
+    """Appends fetched responses to a single gzip-compressed WARC file.
+
+    Every record is its own gzip member, so the file can be read from any
+    record offset and appended to after a restart. Each record's location
+    also goes to a small JSON-lines sidecar; it marks how far the WARC is
+    known to be complete (a record torn by a crash is cut off on reopen)
+    and becomes the CDXJ index in finish().
+    """
+    def __init__(self, directory, base_url=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, WARC_FILENAME)
+        self._log_path = os.path.join(directory, f'.{INDEX_FILENAME}.log')
+        self._lock = threading.Lock()
+
+        end = 0
+        self.warcinfo_id = None
+        for entry in self._read_log():
+            end = max(end, entry['offset'] + entry['length'])
+            if entry['type'] == 'warcinfo':
+                self.warcinfo_id = entry['record_id']
+        self._file = open(self.path, 'ab')
+        if self._file.tell() > end:
+            logger.info(f"Truncating {self.path} to its last complete record at {end}")
+            self._file.truncate(end)
+            self._file.seek(end)
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+
+        if self.warcinfo_id is None:
+            self.warcinfo_id = self._write_warcinfo(base_url)
+
+    def _read_log(self):
+        entries = []
+        if os.path.exists(self._log_path):
+            with open(self._log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break  # Torn last line
+        return entries
+
+    def _record_id(self):
+        return f'<urn:uuid:{uuid.uuid4()}>'
+
+    def _write_warcinfo(self, base_url):
+        fields = 'software: Website-Archiver\r\nformat: WARC File Format 1.1\r\n'
+        if base_url:
+            fields += f'isPartOf: {base_url}\r\n'
+        body = fields.encode('utf-8')
+        record_id = self._record_id()
+        headers = {
+            'WARC-Type': 'warcinfo',
+            'WARC-Record-ID': record_id,
+            'WARC-Date': warc_date(datetime.now(timezone.utc)),
+            'WARC-Filename': WARC_FILENAME,
+            'Content-Type': 'application/warc-fields',
+            'Content-Length': str(len(body)),
+        }
+        with self._lock:
+            offset, length = self._append(headers, [body])
+            self._write_log({'type': 'warcinfo', 'record_id': record_id, 'offset': offset, 'length': length})
+        return record_id
+
+    def write_response(self, url, response, payload, size, digest, page=False):
+        """Append a response record whose body is read from the payload file object.
+
+        size and digest (sha256 hex) describe the payload, which must be the
+        decoded body. Returns the number of bytes the WARC grew by.
+        """
+        version = {10: '1.0', 11: '1.1'}.get(getattr(response.raw, 'version', 11), '1.1')
+        reason = response.reason or REASONS.get(response.status_code, '')
+        lines = [f'HTTP/{version} {response.status_code} {reason}']
+        raw_headers = getattr(response.raw, 'headers', None) or response.headers
+        for name, value in raw_headers.items():
+            if name.lower() not in HOP_HEADERS:
+                lines.append(f'{name}: {value}')
+        lines.append(f'Content-Length: {size}')
+        http_head = ('\r\n'.join(lines) + '\r\n\r\n').encode('iso-8859-1', errors='replace')
+
+        moment = datetime.now(timezone.utc)
+        headers = {
+            'WARC-Type': 'response',
+            'WARC-Record-ID': self._record_id(),
+            'WARC-Date': warc_date(moment),
+            'WARC-Target-URI': url,
+            'WARC-Payload-Digest': f'sha256:{digest}',
+            'Content-Type': 'application/http; msgtype=response',
+            'Content-Length': str(len(http_head) + size),
+        }
+        if self.warcinfo_id:
+            headers['WARC-Warcinfo-ID'] = self.warcinfo_id
+
+        def blocks():
+            yield http_head
+            while True:
+                chunk = payload.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+        with self._lock:
+            offset, length = self._append(headers, blocks())
+            self._write_log({
+                'type': 'response',
+                'url': url,
+                'timestamp': moment.strftime('%Y%m%d%H%M%S'),
+                'status': response.status_code,
+                'mime': (response.headers.get('Content-Type') or '').split(';')[0].strip(),
+                'digest': f'sha256:{digest}',
+                'offset': offset,
+                'length': length,
+                'page': page,
+            })
+        return length
+
+    def _write_log(self, entry):
+        self._log.write(json.dumps(entry) + '\n')
+        self._log.flush()
+
+    def _append(self, headers, blocks):
+        """Write one record as a gzip member, returning its (offset, length)"""
+        offset = self._file.tell()
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        head = 'WARC/1.1\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+        self._file.write(compressor.compress(head.encode('utf-8')))
+        for block in blocks:
+            self._file.write(compressor.compress(block))
+        self._file.write(compressor.compress(b'\r\n\r\n'))
+        self._file.write(compressor.flush())
+        self._file.flush()
+        return offset, self._file.tell() - offset
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._log.close()
+
+    def entries(self):
+        """Index entries of every complete response record, in the order they were written"""
+        return [entry for entry in self._read_log() if entry['type'] == 'response']
+
+    def finish(self, wacz=False, title=None):
+        """Close the WARC, write its CDXJ index and optionally package both as a WACZ.
+
+        Returns the path of the WACZ, or of the WARC when no package was asked for.
+        """
+        self.close()
+        entries = self.entries()
+        index_path = os.path.join(self.directory, INDEX_FILENAME)
+        write_cdxj(entries, index_path)
+        if not wacz:
+            return self.path
+        return package_wacz(self.path, index_path, entries, os.path.join(self.directory, WACZ_FILENAME), title)
+
+def write_cdxj(entries, index_path):
+    """Write a sorted CDXJ index (`surt timestamp {json}` per line) for WARC entries"""
+    lines = []
+    for entry in entries:
+        fields = {
+            'url': entry['url'],
+            'mime': entry['mime'],
+            'status': str(entry['status']),
+            'digest': entry['digest'],
+            'length': str(entry['length']),
+            'offset': str(entry['offset']),
+            'filename': WARC_FILENAME,
+        }
+        lines.append(f"{surt(entry['url'])} {entry['timestamp']} {json.dumps(fields)}\n")
+    lines.sort()
+    temp_path = f'{index_path}.part'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+    os.replace(temp_path, index_path)
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def package_wacz(warc_path, index_path, entries, wacz_path, title=None):
+    """Bundle a WARC and its CDXJ index into a WACZ (a zip laid out per the WACZ 1.1 spec)"""
+    pages = [{'format': 'json-pages-1.0', 'id': 'pages', 'title': 'All Pages'}]
+    for entry in entries:
+        if entry['page'] and entry['status'] == 200:
+            ts = datetime.strptime(entry['timestamp'], '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+            pages.append({'url': entry['url'], 'ts': warc_date(ts)})
+    pages_data = ''.join(json.dumps(page) + '\n' for page in pages).encode('utf-8')
+
+    resources = [
+        ('archive/' + WARC_FILENAME, os.path.getsize(warc_path), _file_digest(warc_path)),
+        ('indexes/' + INDEX_FILENAME, os.path.getsize(index_path), _file_digest(index_path)),
+        ('pages/pages.jsonl', len(pages_data), hashlib.sha256(pages_data).hexdigest()),
+    ]
+    datapackage = {
+        'profile': 'data-package',
+        'wacz_version': '1.1.1',
+        'software': 'Website-Archiver',
+        'created': warc_date(datetime.now(timezone.utc)),
+        'title': title or 'Website archive',
+        'resources': [{'name': os.path.basename(path), 'path': path, 'hash': f'sha256:{digest}', 'bytes': size}
+                      for path, size, digest in resources],
+    }
+    if len(pages) > 1:
+        datapackage['mainPageUrl'] = pages[1]['url']
+
+    temp_path = f'{wacz_path}.part'
+    # The WARC is already compressed, so members are stored to keep it seekable inside the zip
+    with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as wacz:
+        wacz.write(warc_path, 'archive/' + WARC_FILENAME)
+        wacz.write(index_path, 'indexes/' + INDEX_FILENAME)
+        wacz.writestr('pages/pages.jsonl', pages_data)
+        wacz.writestr('datapackage.json', json.dumps(datapackage, indent=2))
+    os.replace(temp_path, wacz_path)
+    return wacz_path
@@ -0,0 +1,25 @@
+import os
+import argparse
+import logging
+
+# This process is the external worker, so the imported web app must not start its own pool
+os.environ.setdefault('ARCHIVER_EXTERNAL_WORKER', '1')
+
+from app import WORKERS, create_scraper, task_store
+from jobs import join_task, run_worker
+
+logger = logging.getLogger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run queued archiving tasks outside the web process")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="number of tasks crawled at once")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="seconds between queue and progress updates")
+    parser.add_argument('--join', metavar='TASK_ID',
+                        help="help crawl one running task through its shared frontier (ARCHIVER_SHARED_FRONTIER), then exit")
+    args = parser.parse_args()
+    
+    if args.join:
+        join_task(task_store, create_scraper, args.join)
+        raise SystemExit
+    
+    run_worker(task_store, create_scraper, workers=args.workers, poll_interval=args.poll_interval)